@@ -3,6 +3,7 @@ package com.example.helloworld.service;
 import org.slf4j.Logger;
 import org.slf4j.LoggerFactory;
 import org.springframework.dao.EmptyResultDataAccessException;
+import org.springframework.jdbc.BadSqlGrammarException;
 import org.springframework.jdbc.core.JdbcTemplate;
 import org.springframework.stereotype.Service;
 
@@ -56,8 +57,23 @@ public class OrganizationService {
     }
 
     private String findLatestTable() {
-        // Ищем все таблицы в схеме, которые соответствуют шаблону t_PPI_число
+        // Текущая таблица берётся из реестра загруженных таблиц (одно чтение по индексу)
         logger.debug("Поиск таблицы в схеме: {}", ORGANIZATION_SCHEMA);
+        String registrySql = String.format(
+                "SELECT table_name FROM \"%s\".t_loaded_tables WHERE is_current", ORGANIZATION_SCHEMA);
+        try {
+            return jdbcTemplate.queryForObject(registrySql, String.class);
+        } catch (EmptyResultDataAccessException e) {
+            return null;
+        } catch (BadSqlGrammarException e) {
+            // Схема ещё не загружалась новым загрузчиком - реестра нет
+            logger.debug("Реестр таблиц в схеме {} не найден, поиск по каталогу", ORGANIZATION_SCHEMA);
+            return findLatestTableInCatalog();
+        }
+    }
+
+    private String findLatestTableInCatalog() {
+        // Ищем все таблицы в схеме, которые соответствуют шаблону t_PPI_число
         String sql = "SELECT table_name FROM information_schema.tables " +
                 "WHERE table_schema = ? AND table_name ~ '^t_" + ORGANIZATION_SCHEMA + "_\\d+$' " +
                 "ORDER BY substring(table_name from '_(\\d+)$')::integer DESC " +
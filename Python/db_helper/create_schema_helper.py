@@ -4,6 +4,9 @@ from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 import re
 from db_config import user, password, host, port, database, SCHEMA_NAME
 
+MNEMONIC_RE = re.compile(r'^[a-zA-Z0-9_]{1,8}$')  # Мнемокод: до 8 символов (буквы, цифры, подчеркивание)
+MNEMONIC_EXISTS_QUERY = sql.SQL("SELECT 1 FROM main.t_organizations WHERE code_mnemonic = %s LIMIT 1")
+
 
 class SchemaCreator:
     def __init__(self, db_params):
@@ -34,14 +37,26 @@ class SchemaCreator:
             self.connection.close()
             print("Соединение с базой данных закрыто.")
 
-    def is_valid_mnemonic(self, mnemonic):
+    @staticmethod
+    def is_valid_mnemonic(mnemonic):
         """
         Проверка валидности мнемокода
         :param mnemonic: мнемокод (строка)
         :return: True если валидный, False если нет
         """
         # Проверяем длину (8 символов) и допустимые символы (буквы, цифры, подчеркивание)
-        return bool(re.match(r'^[a-zA-Z0-9_]{1,8}$', mnemonic))
+        return bool(MNEMONIC_RE.match(mnemonic))
+
+    @staticmethod
+    def find_mnemonic(cursor, mnemonic):
+        """
+        Поиск мнемокода в таблице t_organizations курсором вызывающего
+        :param cursor: курсор открытого соединения
+        :param mnemonic: мнемокод (строка)
+        :return: True если существует, False если нет
+        """
+        cursor.execute(MNEMONIC_EXISTS_QUERY, (mnemonic,))
+        return bool(cursor.fetchone())
 
     def mnemonic_exists(self, mnemonic):
         """
@@ -50,9 +65,7 @@ class SchemaCreator:
         :return: True если существует, False если нет
         """
         try:
-            query = sql.SQL("SELECT 1 FROM main.t_organizations WHERE code_mnemonic = %s LIMIT 1")
-            self.cursor.execute(query, (mnemonic,))
-            return bool(self.cursor.fetchone())
+            return self.find_mnemonic(self.cursor, mnemonic)
         except Exception as e:
             print(f"Ошибка при проверке мнемокода: {e}")
             raise
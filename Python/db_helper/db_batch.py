@@ -0,0 +1,145 @@
+import argparse
+import os
+import time
+import psycopg2
+from db_copy7 import (
+    COPY_FORMATS, DB_PARAMS, DUPLICATES_POLICIES, DUPLICATES_POLICY, PARALLEL_WORKERS, PARTITION_MODE,
+    PIPELINE_MODE, REJECTS_MODE, STAGING_MODE,
+    ensure_log_tables_exist, load_file, print_db_info, print_system_info
+)
+
+DATA_FILE_EXTENSIONS = ('.tsv', '.txt', '.csv')  # Расширения файлов выгрузок при обходе каталога
+
+
+def collect_files(source):
+    """Собирает список файлов для загрузки.
+
+    Источник - каталог с подкаталогами по мнемокодам организаций (<каталог>/<схема>/<файл>)
+    или файл-манифест со строками "<схема><TAB><путь к файлу>" (пустые строки и строки
+    с # пропускаются, относительные пути считаются от каталога манифеста).
+
+    Returns:
+        list: Пары (путь к файлу, имя схемы).
+    """
+    files = []
+    if os.path.isdir(source):
+        for schema_name in sorted(os.listdir(source)):
+            schema_dir = os.path.join(source, schema_name)
+            if not os.path.isdir(schema_dir):
+                continue
+            for file_name in sorted(os.listdir(schema_dir)):
+                if file_name.lower().endswith(DATA_FILE_EXTENSIONS):
+                    files.append((os.path.join(schema_dir, file_name), schema_name))
+    else:
+        base_dir = os.path.dirname(os.path.abspath(source))
+        with open(source, 'r', encoding='utf-8') as f:
+            for line_num, line in enumerate(f, 1):
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                parts = line.split('\t')
+                if len(parts) != 2:
+                    raise ValueError(f"Строка {line_num} манифеста должна содержать схему и путь к файлу.")
+                schema_name, file_path = parts
+                files.append((os.path.join(base_dir, file_path), schema_name))
+    return files
+
+
+def load_batch(files, checksum=False, workers=PARALLEL_WORKERS, staging=STAGING_MODE, rejects=REJECTS_MODE,
+               copy_format=None, duplicates_policy=DUPLICATES_POLICY, resume=False, pipeline=PIPELINE_MODE,
+               partitioned=PARTITION_MODE):
+    """Загружает набор файлов разных организаций через одно соединение.
+
+    Проверка таблиц логов и реестра выполняется один раз на схему.
+
+    Returns:
+        dict: Итоги пакетной загрузки (файлы, строки, байты, время, скорости).
+    """
+    print(f"\n=== ПАКЕТНАЯ ЗАГРУЗКА: {len(files)} файлов ===")
+    start_time = time.time()
+    checked_schemas = set()
+    loaded, failed = [], []
+
+    conn = psycopg2.connect(**DB_PARAMS)
+    conn.autocommit = False
+    try:
+        print_db_info(conn)
+        for file_path, schema_name in files:
+            print(f"\n=== ФАЙЛ {file_path} (схема {schema_name}) ===")
+            try:
+                if schema_name not in checked_schemas:
+                    ensure_log_tables_exist(conn, schema_name)
+                    checked_schemas.add(schema_name)
+                result = load_file(conn, file_path, schema_name, checksum=checksum, workers=workers,
+                                   staging=staging, rejects=rejects, copy_format=copy_format,
+                                   duplicates_policy=duplicates_policy, resume=resume, pipeline=pipeline,
+                                   partitioned=partitioned)
+                loaded.append(result)
+            except Exception as e:
+                print(f"Файл {file_path} не загружен: {str(e)}")
+                conn.rollback()
+                failed.append(file_path)
+    finally:
+        conn.close()
+
+    elapsed = time.time() - start_time
+    total_rows = sum(item['rows'] for item in loaded)
+    rejected_rows = sum(item['rejected_rows'] for item in loaded)
+    total_mb = sum(item['bytes'] for item in loaded) / 1024 / 1024
+    summary = {
+        "files": len(loaded),
+        "failed": len(failed),
+        "rows": total_rows,
+        "rejected_rows": rejected_rows,
+        "mb": total_mb,
+        "seconds": elapsed,
+        "files_per_sec": len(loaded) / elapsed if elapsed else 0.0,
+        "rows_per_sec": total_rows / elapsed if elapsed else 0.0,
+        "mb_per_sec": total_mb / elapsed if elapsed else 0.0
+    }
+
+    print("\n=== ИТОГИ ПАКЕТНОЙ ЗАГРУЗКИ ===")
+    print(f"Загружено файлов: {summary['files']}, с ошибкой: {summary['failed']}")
+    for file_path in failed:
+        print(f"  не загружен: {file_path}")
+    if rejected_rows:
+        print(f"Отведено ошибочных строк: {rejected_rows}")
+    print(f"Строк: {total_rows}, объём: {total_mb:.2f} МБ, время: {elapsed:.2f} сек.")
+    print(f"Скорость: {summary['files_per_sec']:.2f} файлов/сек, {summary['rows_per_sec']:.0f} строк/сек, "
+          f"{summary['mb_per_sec']:.2f} МБ/сек")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетная загрузка файлов задолженности нескольких организаций")
+    parser.add_argument("source", help="Каталог с подкаталогами по схемам или файл-манифест (схема<TAB>путь)")
+    parser.add_argument("--workers", type=int, default=PARALLEL_WORKERS, help="Число параллельных потоков COPY")
+    parser.add_argument("--checksum", action="store_true", help="Сверять сумму debt после загрузки")
+    parser.add_argument("--staging", action="store_true", default=STAGING_MODE,
+                        help="Загружать через UNLOGGED-таблицу с публикацией")
+    parser.add_argument("--rejects", choices=('report', 'divert'), default=REJECTS_MODE,
+                        help="Собирать все ошибочные строки в отчёт (report) или отводить их в таблицу отказов (divert)")
+    parser.add_argument("--copy-format", choices=COPY_FORMATS,
+                        help="Формат COPY для всех файлов (по умолчанию - настройка организации)")
+    parser.add_argument("--duplicates", choices=DUPLICATES_POLICIES, default=DUPLICATES_POLICY,
+                        help="Повторяющиеся счета: отклонить файл (reject), оставить последнюю строку (keep_last) "
+                             "или отвести повторы в таблицу отказов (divert)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Продолжать незавершённые загрузки тех же файлов с первого невыполненного этапа")
+    parser.add_argument("--pipeline", action="store_true", default=PIPELINE_MODE,
+                        help="Проверять строки во время COPY (конвейер) вместо предварительного прохода")
+    parser.add_argument("--partitioned", action="store_true", default=PARTITION_MODE,
+                        help="Загружать в секции таблицы t_<ORG>, создав её при необходимости "
+                             "(схемы, где она уже есть, загружаются в секции и без флага)")
+    args = parser.parse_args()
+
+    print_system_info()
+    summary = load_batch(collect_files(args.source), checksum=args.checksum, workers=args.workers,
+                         staging=args.staging, rejects=args.rejects, copy_format=args.copy_format,
+                         duplicates_policy=args.duplicates, resume=args.resume, pipeline=args.pipeline,
+                         partitioned=args.partitioned)
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
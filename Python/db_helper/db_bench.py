@@ -0,0 +1,188 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import uuid
+from datetime import datetime
+import psycopg2
+from psycopg2 import sql
+import db_copy7
+from db_copy7 import DB_PARAMS, LoadMetrics, ensure_log_tables_exist, load_file, validate_file
+
+# Данные генерирует test_utils/geck.py (каталог рядом с db_helper, не пакет)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'test_utils'))
+import geck  # noqa: E402
+
+# Масштабы наборов данных: число строк; None - заполнить файл почти до MAX_FILE_SIZE
+BENCH_SCALES = {
+    '10k': 10_000,
+    '1m': 1_000_000,
+    '10m': 10_000_000,
+    'max': None
+}
+BENCH_SEED = 42  # Зерно генератора по умолчанию
+BENCH_DATA_DIR = 'bench_data'  # Каталог сгенерированных наборов (переиспользуются между запусками)
+BENCH_RESULTS_FILE = 'bench_results.jsonl'  # Файл результатов, по одной строке JSON на прогон
+MAX_SCALE_MARGIN = 1024 * 1024  # Запас до MAX_FILE_SIZE для масштаба 'max'
+MAX_SCALE_SAMPLE_ROWS = 10_000  # Строк пробного набора для оценки числа строк масштаба 'max'
+MAX_SCALE_OVERSHOOT = 1.01  # Строк генерируется с запасом, лишний хвост отрезается по границе строки
+
+
+def generate_dataset(file_path, rows=None, seed=BENCH_SEED, max_bytes=None):
+    """Детерминированно генерирует файл выгрузки генератором geck: rows строк или почти max_bytes байт.
+
+    Для max_bytes число строк оценивается по пробному набору того же зерна, файл
+    генерируется с запасом и обрезается по последней целой строке в пределах max_bytes.
+
+    Returns:
+        int: Число строк данных (без заголовка).
+    """
+    if rows is not None:
+        geck.generate_file(file_path, rows, seed)
+        return rows
+
+    geck.generate_file(file_path, MAX_SCALE_SAMPLE_ROWS, seed, processes=1)
+    with open(file_path, 'rb') as f:
+        header_size = len(f.readline())
+    bytes_per_row = (os.path.getsize(file_path) - header_size) / MAX_SCALE_SAMPLE_ROWS
+    rows = int((max_bytes - header_size) / bytes_per_row * MAX_SCALE_OVERSHOOT)
+    geck.generate_file(file_path, rows, seed)
+    if os.path.getsize(file_path) > max_bytes:
+        with open(file_path, 'r+b') as f:
+            f.seek(max_bytes - MAX_SCALE_MARGIN)
+            data = f.read(MAX_SCALE_MARGIN + 1)
+            cut = max_bytes - MAX_SCALE_MARGIN + data.rfind(b'\n', 0, MAX_SCALE_MARGIN) + 1
+            f.seek(cut)
+            while True:
+                chunk = f.read(db_copy7.READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                rows -= chunk.count(b'\n')
+            f.truncate(cut)
+    return rows
+
+
+def get_dataset(scale, seed=BENCH_SEED, data_dir=BENCH_DATA_DIR):
+    """Возвращает путь к набору данных масштаба scale, генерируя его при отсутствии."""
+    os.makedirs(data_dir, exist_ok=True)
+    file_path = os.path.join(data_dir, f"geck_{scale}_{seed}.tsv")
+    if os.path.exists(file_path):
+        print(f"Используется готовый набор {file_path}")
+        return file_path
+
+    print(f"Генерация набора {file_path}...")
+    start_time = time.time()
+    rows = BENCH_SCALES[scale]
+    max_bytes = db_copy7.MAX_FILE_SIZE - MAX_SCALE_MARGIN if rows is None else None
+    written_rows = generate_dataset(file_path + '.part', rows, seed, max_bytes)
+    os.replace(file_path + '.part', file_path)
+    print(f"Сгенерировано строк: {written_rows}, размер: {os.path.getsize(file_path)} байт. "
+          f"Время: {time.time() - start_time:.2f} сек.")
+    return file_path
+
+
+def run_benchmark(scale, seed=BENCH_SEED, data_dir=BENCH_DATA_DIR, workers=db_copy7.PARALLEL_WORKERS,
+                  staging=db_copy7.STAGING_MODE, keep_schema=False, copy_format=db_copy7.COPY_FORMAT,
+                  pipeline=db_copy7.PIPELINE_MODE):
+    """Проверяет и загружает набор данных в одноразовую схему и возвращает показатели этапов."""
+    file_path = get_dataset(scale, seed, data_dir)
+    file_size = os.path.getsize(file_path)
+    # Суффикс из uuid: одновременные замеры (в том числе с разных машин) не делят схему
+    schema_name = f"bench_{datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
+    # Наборы больше лимита выгрузки тоже должны проходить проверку размера
+    saved_max_file_size = db_copy7.MAX_FILE_SIZE
+    if file_size > db_copy7.MAX_FILE_SIZE:
+        print(f"Размер набора ({file_size} байт) больше MAX_FILE_SIZE, лимит на время замера снят")
+        db_copy7.MAX_FILE_SIZE = file_size
+
+    metrics = LoadMetrics()
+    conn = psycopg2.connect(**DB_PARAMS)
+    conn.autocommit = False
+    try:
+        file_info = validate_file(file_path, metrics, pipeline=pipeline)
+        with conn.cursor() as cursor:
+            cursor.execute(sql.SQL("CREATE SCHEMA {schema}").format(schema=sql.Identifier(schema_name)))
+        conn.commit()
+        ensure_log_tables_exist(conn, schema_name)
+        result = load_file(conn, file_path, schema_name, file_info=file_info, workers=workers, staging=staging,
+                           metrics=metrics, copy_format=copy_format)
+    finally:
+        db_copy7.MAX_FILE_SIZE = saved_max_file_size
+        conn.rollback()
+        if not keep_schema:
+            with conn.cursor() as cursor:
+                cursor.execute(sql.SQL("DROP SCHEMA IF EXISTS {schema} CASCADE").format(
+                    schema=sql.Identifier(schema_name)))
+            conn.commit()
+        conn.close()
+
+    return {
+        "run_time": datetime.now().isoformat(timespec='seconds'),
+        "host": platform.node(),
+        "scale": scale,
+        "seed": seed,
+        "rows": result['rows'],
+        "bytes": file_size,
+        "workers": workers,
+        "staging": staging,
+        "copy_format": copy_format,
+        "pipeline": pipeline,
+        "seconds": round(result['seconds'], 3),
+        "stages": metrics.stages
+    }
+
+
+def print_result(result):
+    mode = f"COPY {result['copy_format']}" + (", конвейер" if result.get('pipeline') else "")
+    print(f"\n=== РЕЗУЛЬТАТ {result['scale']} ({mode}): {result['rows']} строк, "
+          f"{result['seconds']:.2f} сек. ===")
+    for stage in result['stages']:
+        rows_per_sec = f"{stage['rows_per_sec']:.0f}" if stage['rows_per_sec'] else '-'
+        peak_rss = f"{stage['peak_rss_mb']:.1f}" if stage['peak_rss_mb'] is not None else '-'
+        print(f"{stage['stage']:<20}{stage['seconds']:>10.3f} сек.{rows_per_sec:>12} строк/сек"
+              f"{peak_rss:>10} МБ RSS")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер скорости проверки и загрузки на синтетических данных")
+    parser.add_argument("--scales", default='10k', help=f"Масштабы через запятую: {', '.join(BENCH_SCALES)}")
+    parser.add_argument("--seed", type=int, default=BENCH_SEED, help="Зерно генератора данных")
+    parser.add_argument("--repeat", type=int, default=1, help="Число повторов каждого масштаба")
+    parser.add_argument("--workers", type=int, default=db_copy7.PARALLEL_WORKERS, help="Число потоков COPY")
+    parser.add_argument("--staging", action="store_true", default=db_copy7.STAGING_MODE,
+                        help="Загружать через UNLOGGED-таблицу")
+    parser.add_argument("--data-dir", default=BENCH_DATA_DIR, help="Каталог наборов данных")
+    parser.add_argument("--results", default=BENCH_RESULTS_FILE, help="Файл результатов (JSON Lines)")
+    parser.add_argument("--keep-schema", action="store_true", help="Не удалять схему с загруженными данными")
+    parser.add_argument("--pipeline", action="store_true", default=db_copy7.PIPELINE_MODE,
+                        help="Проверять строки во время COPY (конвейер) вместо предварительного прохода")
+    parser.add_argument("--copy-formats", default=db_copy7.COPY_FORMAT,
+                        help=f"Форматы COPY через запятую для сравнения на одном наборе: "
+                             f"{', '.join(db_copy7.COPY_FORMATS)}")
+    args = parser.parse_args()
+
+    scales = [scale.strip() for scale in args.scales.split(',') if scale.strip()]
+    unknown = [scale for scale in scales if scale not in BENCH_SCALES]
+    if unknown:
+        parser.error(f"Неизвестные масштабы: {', '.join(unknown)}")
+    copy_formats = [copy_format.strip() for copy_format in args.copy_formats.split(',') if copy_format.strip()]
+    unknown = [copy_format for copy_format in copy_formats if copy_format not in db_copy7.COPY_FORMATS]
+    if unknown:
+        parser.error(f"Неизвестные форматы COPY: {', '.join(unknown)}")
+
+    for scale in scales:
+        for _ in range(args.repeat):
+            for copy_format in copy_formats:
+                result = run_benchmark(scale, args.seed, args.data_dir, args.workers, args.staging, args.keep_schema,
+                                       copy_format, args.pipeline)
+                with open(args.results, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(result, ensure_ascii=False) + '\n')
+                print_result(result)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
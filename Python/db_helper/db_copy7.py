@@ -1,15 +1,36 @@
 import psycopg2
 import time
 import os
+import re
 import chardet
 import platform
 import socket
 import getpass
+import io
+import json
+import csv
+import hashlib
+import heapq
+import operator
+import queue
+import struct
+import tempfile
+import threading
+from array import array
+from itertools import chain, repeat
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from psycopg2 import sql
+from psycopg2 import sql, pool
+from chardet.universaldetector import UniversalDetector
 from db_config import user, password, host, port, database
 from functools import wraps
 
+try:
+    import resource  # Нет в Windows: пиковый RSS тогда не записывается
+except ImportError:
+    resource = None
+
 
 def with_transaction(func):
     @wraps(func)
@@ -31,16 +52,93 @@ MIN_FILE_SIZE = 33  # 33 байт размер мин строки
 MAX_LINE_LENGTH = 10000  # Максимальная длина строки
 MIN_LINE_LENGTH = 33  # Минимальная длина строки
 EXPECTED_FIELDS = 7  # Ожидаемое число полей в строке
+# Правила значений полей - требования к выгрузке, а не ограничения типов столбцов; до перехода
+# на типизированные столбцы они не проверялись, поэтому по умолчанию допускают всё, что вмещают столбцы.
+# Строгие правила выгрузки: ACCOUNT_NUMBER_MIN_LENGTH = ACCOUNT_NUMBER_LENGTH = 9, PERIOD_YEAR_RANGE = (1990, 2100)
+ACCOUNT_NUMBER_MAX_DIGITS = 18  # Предел ACCOUNT_NUMBER_LENGTH: ключ поиска повторов '1' + номер - 64 бита
+ACCOUNT_NUMBER_LENGTH = ACCOUNT_NUMBER_MAX_DIGITS  # Наибольшая длина номера счета в цифрах (столбец VARCHAR этой длины)
+ACCOUNT_NUMBER_MIN_LENGTH = 1  # Наименьшая длина номера счета в цифрах (равна наибольшей - ровно столько цифр)
+assert ACCOUNT_NUMBER_LENGTH <= ACCOUNT_NUMBER_MAX_DIGITS, "ACCOUNT_NUMBER_LENGTH больше ACCOUNT_NUMBER_MAX_DIGITS"
+PERIOD_YEAR_RANGE = (-32_768, 32_767)  # Допустимый год периода (SMALLINT)
+PERIOD_MONTH_RANGE = (1, 12)  # Допустимый месяц периода (SMALLINT)
+METER_READING_RANGE = (0, 2_147_483_647)  # Допустимое показание счетчика (хранится текстом как в файле, с ведущими нулями)
+DEBT_RANGE = (-9_223_372_036_854_775_808, 9_223_372_036_854_775_807)  # Допустимая задолженность в копейках (BIGINT)
 ALLOWED_CHARS = set(
     "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 ,.-_()\"\'\t\n/"
     "абвгдеёжзийклмнопрстуфхцчшщъыьэюяАБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ"
 )
+# Регулярное выражение для поиска первого недопустимого символа в строке
+DISALLOWED_CHARS_RE = re.compile('[^' + re.escape(''.join(sorted(ALLOWED_CHARS))) + ']')
+READ_CHUNK_SIZE = 1024 * 1024  # Размер блока при потоковом чтении файла (1 МБ)
+ENCODING_SAMPLE_SIZE = 256 * 1024  # Бюджет байт на выборки для определения кодировки
+INDEX_MAINTENANCE_WORK_MEM = '256MB'  # maintenance_work_mem на время построения индексов
+ACCOUNT_INDEX_UNIQUE = False  # Строить уникальный индекс по account_number
+# Включать в индекс возвращаемые поиском столбцы (INCLUDE). Выключено: full_name и address ограничены только
+# MAX_LINE_LENGTH, а запись индекса btree - около 2.7 КБ, и длинная строка сорвала бы построение индекса
+ACCOUNT_INDEX_COVERING = False
+# Столбцы данных выгрузки в порядке полей файла
+DATA_COLUMNS = ('account_number', 'full_name', 'address', 'period_year', 'period_month', 'meter_reading', 'debt')
+# Заголовки полей файла выгрузки (в порядке DATA_COLUMNS)
+UPLOAD_HEADER = ('Счет', 'ФИО', 'Адрес', 'Период год', 'Период месяц', 'Показание счетчика', 'Задолженность')
+# Столбцы, возвращаемые поиском по счёту (OrganizationService.getAccountInfo);
+# порядок для INCLUDE индекса: сначала фиксированной ширины по убыванию выравнивания, затем переменной длины
+LOOKUP_COLUMNS = ('debt', 'period_year', 'period_month', 'meter_reading', 'full_name', 'address')
+REGISTRY_TABLE = 't_loaded_tables'  # Реестр загруженных таблиц схемы
+REGISTRY_SEQUENCE = 's_table_number'  # Последовательность номеров таблиц t_<ORG>_N
+PUBLISH_CHANNEL = 'debt_table_published'  # Канал NOTIFY о новой текущей таблице (payload - JSON со схемой и таблицей)
+STAGING_MODE = False  # Загружать в UNLOGGED-таблицу и публиковать её переименованием
+STAGING_KEEP_UNLOGGED = False  # Оставлять опубликованную таблицу UNLOGGED (без SET LOGGED)
+STAGING_SUFFIX = '_stage'  # Суффикс имени таблицы на время загрузки
+# Секционированное хранение: одна таблица t_<ORG> со списочным секционированием по номеру загрузки,
+# каждая загрузка - секция t_<ORG>_N с общей последовательностью id. None - по наличию такой таблицы
+# в схеме, True - создать её при необходимости, False - отдельные таблицы
+PARTITION_MODE = None
+PARTITION_KEY = 'table_number'  # Столбец секционирования (номер таблицы из реестра)
+PARALLEL_WORKERS = 1  # Число параллельных потоков COPY (1 - загрузка одним COPY)
+# Параллельные COPY фиксируются двухфазно (PREPARE TRANSACTION): на сервере нужен
+# max_prepared_transactions не меньше числа потоков, иначе загрузка идёт одним COPY
+PARALLEL_GID_PREFIX = 'db_copy7'  # Префикс идентификаторов подготовленных транзакций: <префикс>:<схема>.<таблица>:<поток>
+ENCODING_MIN_CONFIDENCE = 0.8  # Ниже этой уверенности кодировка определяется по всему файлу
+# Режим ошибочных строк: None - остановка на первой ошибке, 'report' - собрать все ошибки в отчёт и отказать,
+# 'divert' - загрузить корректные строки, а ошибочные отвести в таблицу <таблица>_rejects
+REJECTS_MODE = None
+REJECTS_MAX_ERRORS = 1000  # Сколько ошибок записывать в отчёт (подсчёт идёт по всему файлу)
+REJECTS_SNIPPET_LENGTH = 80  # Длина фрагмента строки в отчёте
+REJECTS_REPORT_SUFFIX = '.rejects.tsv'  # Отчёт об ошибках пишется рядом с файлом: <файл><суффикс>
+REJECTS_TABLE_SUFFIX = '_rejects'  # Суффикс таблицы отведённых строк загрузки
+REJECTS_SPOOL_SIZE = 8 * 1024 * 1024  # Отведённые строки держатся в памяти до этого объёма, затем на диске
+# Повторяющиеся номера счетов: None - не проверять, 'reject' - отказ в загрузке файла,
+# 'keep_last' - загрузить последнее вхождение счёта, 'divert' - загрузить первое, повторы отвести в таблицу отказов
+DUPLICATES_POLICY = 'reject'
+DUPLICATES_POLICIES = ('reject', 'keep_last', 'divert')
+DUPLICATES_RUN_SIZE = 1_000_000  # Номеров счетов в одной сортировке в памяти; сверх этого - части во временных файлах
+DUPLICATES_REPORT_LIMIT = 10  # Сколько повторяющихся счетов (и строк каждого) перечислять в сообщении
+
+COPY_FORMAT = 'csv'  # Формат COPY по умолчанию: csv - текст разбирает сервер, binary - строки кодирует загрузчик
+# Формат COPY для отдельных организаций (схема -> формат), выбирается по замерам db_bench.py --copy-formats
+COPY_FORMAT_BY_SCHEMA = {}
+COPY_FORMATS = ('csv', 'binary')
+# Конвейерная загрузка: строки проверяются потоком-производителем одновременно с COPY, без предварительного прохода
+PIPELINE_MODE = False
+PIPELINE_QUEUE_SIZE = 8  # Блоков (по READ_CHUNK_SIZE) в очереди между проверкой и COPY
 
 # Константы для этапов загрузки (битовые флаги)
 LOAD_STAGES = {
     'create_table': 1,  # 2^0
     'copy_data': 2,  # 2^1
-    'finalize': 4  # 2^2
+    'finalize': 4,  # 2^2
+    'build_indexes': 8  # 2^3
+}
+LOAD_STAGE_ORDER = ('create_table', 'copy_data', 'build_indexes', 'finalize')  # Порядок выполнения этапов
+FILE_HASH_ALGORITHM = 'sha256'  # Хеш содержимого файла: по нему находятся прежние загрузки того же файла
+
+# Параметры подключения к БД
+DB_PARAMS = {
+    'user': user,
+    'password': password,
+    'host': host,
+    'port': port,
+    'database': database
 }
 
 
@@ -59,19 +157,273 @@ def print_system_info():
     print(f"Логические ядер CPU: {os.cpu_count()}")
 
 
-def check_file_encoding(file_path):
-    """Проверяет кодировку файла."""
+def get_process_peak_rss_mb():
+    """Возвращает пиковый RSS процесса за всё время работы в МБ или None, если платформа его не сообщает."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux сообщает КБ, macOS - байты
+    return peak / 1024 / 1024 if platform.system() == 'Darwin' else peak / 1024
+
+
+def reset_peak_rss():
+    """Сбрасывает пиковый RSS процесса (VmHWM) записью в /proc/self/clear_refs (Linux).
+
+    Returns:
+        bool: True, если сброс выполнен.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def get_peak_rss_mb():
+    """Возвращает пиковый RSS процесса с последнего сброса (VmHWM) в МБ или None вне Linux."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class LoadMetrics:
+    """Показатели этапов одной загрузки: время, байты, строки, скорость и пиковый RSS.
+
+    peak_rss_mb - пик RSS за этап (VmHWM сбрасывается в начале этапа; только Linux, иначе None;
+    при нескольких одновременных загрузках в одном процессе пик общий для них),
+    process_peak_rss_mb - наибольший пик с начала замеров (вне Linux - пик процесса за всё время
+    по ru_maxrss; на Linux ru_maxrss тоже сбрасывается вместе с VmHWM, поэтому пик копится здесь).
+    """
+
+    def __init__(self):
+        self.stages = []
+        self.process_peak_rss_mb = None
+
+    @contextmanager
+    def stage(self, name, bytes_count=None, rows=None):
+        """Замеряет этап; объём и строки можно уточнить через возвращаемый словарь."""
+        record = {"stage": name, "bytes": bytes_count, "rows": rows}
+        peak_reset = reset_peak_rss()
+        start_time = time.time()
+        try:
+            yield record
+        finally:
+            elapsed = time.time() - start_time
+            record["seconds"] = round(elapsed, 4)
+            record["rows_per_sec"] = round(record["rows"] / elapsed, 1) if record["rows"] and elapsed else None
+            record["mb_per_sec"] = (round(record["bytes"] / 1024 / 1024 / elapsed, 3)
+                                    if record["bytes"] and elapsed else None)
+            stage_peak = get_peak_rss_mb() if peak_reset else None
+            process_peak = stage_peak if peak_reset else get_process_peak_rss_mb()
+            if process_peak is not None:
+                self.process_peak_rss_mb = max(self.process_peak_rss_mb or 0, process_peak)
+            record["peak_rss_mb"] = stage_peak
+            record["process_peak_rss_mb"] = self.process_peak_rss_mb
+            self.stages.append(record)
+
+    def to_json(self):
+        return json.dumps(self.stages)
+
+
+def read_encoding_samples(file_path, sample_size=ENCODING_SAMPLE_SIZE):
+    """Читает выборки из начала, середины и конца файла в пределах бюджета байт.
+
+    Выборки обрезаются по границам строк, чтобы не разрезать многобайтовые символы.
+    Если файл не больше бюджета, возвращается его полное содержимое.
+    """
+    file_size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as f:
+        if sample_size <= 0 or file_size <= sample_size:
+            return [f.read()]
+
+        part_size = sample_size // 3
+        samples = []
+        for offset in (0, (file_size - part_size) // 2, file_size - part_size):
+            f.seek(offset)
+            data = f.read(part_size)
+            if offset > 0:
+                # Отбрасываем неполную строку в начале выборки
+                data = data[data.find(b'\n') + 1:]
+            if offset + part_size < file_size:
+                # Отбрасываем неполную строку в конце выборки
+                data = data[:data.rfind(b'\n') + 1]
+            if data:
+                samples.append(data)
+        return samples
+
+
+def detect_sample_encoding(samples):
+    """Быстрая проверка выборок на UTF-8 и cp1251.
+
+    Returns:
+        tuple: (кодировка, уверенность) или None, если быстрый путь не подошёл.
+    """
+    try:
+        for data in samples:
+            data.decode('utf-8')
+        return 'utf-8', 1.0
+    except UnicodeDecodeError:
+        pass
+
+    # cp1251 декодирует почти любые байты, поэтому дополнительно требуем,
+    # чтобы в тексте были только допустимые для выгрузки символы
+    try:
+        for data in samples:
+            text = data.decode('cp1251').replace('\r', '')
+            if DISALLOWED_CHARS_RE.search(text):
+                return None
+        return 'cp1251', 1.0
+    except UnicodeDecodeError:
+        return None
+
+
+def detect_full_encoding(file_path, chunk_size=READ_CHUNK_SIZE):
+    """Определяет кодировку инкрементальным UniversalDetector по всему файлу."""
+    detector = UniversalDetector()
+    with open(file_path, 'rb') as f:
+        while not detector.done:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            detector.feed(chunk)
+    result = detector.close()
+    return result['encoding'], result['confidence']
+
+
+def check_file_encoding(file_path, sample_size=ENCODING_SAMPLE_SIZE):
+    """Проверяет кодировку файла по выборкам из начала, середины и конца.
+
+    Сначала проверяются UTF-8 и cp1251, затем chardet по выборкам; полный проход
+    UniversalDetector выполняется только при низкой уверенности.
+
+    Returns:
+        tuple: (кодировка, уверенность, способ определения).
+    """
     print(f"\nПроверка кодировки файла {file_path}...")
     start_time = time.time()
-    with open(file_path, 'rb') as f:
-        raw_data = f.read()
-        result = chardet.detect(raw_data)
-        encoding = result['encoding']
-        confidence = result['confidence']
-        end_time = time.time()
-        print(
-            f"Определена кодировка: {encoding} (уверенность: {confidence * 100:.2f}%). Время: {end_time - start_time:.2f} сек.")
-        return encoding
+
+    samples = read_encoding_samples(file_path, sample_size)
+    method = 'fast'
+    result = detect_sample_encoding(samples)
+    if result is None:
+        method = 'sample'
+        detected = chardet.detect(b''.join(samples))
+        result = detected['encoding'], detected['confidence']
+    if result[0] is None or result[1] < ENCODING_MIN_CONFIDENCE:
+        method = 'full'
+        result = detect_full_encoding(file_path)
+    encoding, confidence = result
+    if encoding is None:
+        raise ValueError("Не удалось определить кодировку файла.")
+
+    end_time = time.time()
+    print(
+        f"Определена кодировка: {encoding} (уверенность: {confidence * 100:.2f}%, способ: {method}). "
+        f"Время: {end_time - start_time:.2f} сек.")
+    return encoding, confidence, method
+
+
+def migrate_table_registry(conn, schema_name):
+    """Однократно переносит в пустой реестр таблицы, созданные до его появления.
+
+    Последовательность номеров продолжается с максимального номера в каталоге,
+    текущей отмечается последняя опубликованная таблица.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(sql.SQL("SELECT is_called FROM {schema}.{seq_name}").format(
+            schema=sql.Identifier(schema_name),
+            seq_name=sql.Identifier(REGISTRY_SEQUENCE)
+        ))
+        if cursor.fetchone()[0]:
+            return
+
+        base_table_name = get_base_table_name(schema_name)
+        max_number = get_catalog_table_number(conn, schema_name, base_table_name)
+        if not max_number:
+            return
+        print(f"Перенос существующих таблиц схемы {schema_name} в реестр...")
+        cursor.execute(sql.SQL("SELECT setval({seq}, %s)").format(
+            seq=sql.Literal(f"{sql_quote_ident(schema_name)}.{REGISTRY_SEQUENCE}")), (max_number,))
+        cursor.execute(sql.SQL("""
+            INSERT INTO {schema}.{registry} (table_number, table_name, status)
+            SELECT REGEXP_REPLACE(table_name, %s, %s)::INT, table_name, 1
+            FROM information_schema.tables
+            WHERE table_schema = %s AND table_name ~ %s
+            ON CONFLICT (table_number) DO NOTHING
+        """).format(
+            schema=sql.Identifier(schema_name),
+            registry=sql.Identifier(REGISTRY_TABLE)
+        ), (f'^{base_table_name}_([0-9]+)$', r'\1', schema_name, f'^{base_table_name}_[0-9]+$'))
+        cursor.execute(sql.SQL("""
+            UPDATE {schema}.{registry} SET is_current = TRUE, date_publish = CURRENT_TIMESTAMP
+            WHERE table_number = (SELECT MAX(table_number) FROM {schema}.{registry})
+        """).format(
+            schema=sql.Identifier(schema_name),
+            registry=sql.Identifier(REGISTRY_TABLE)
+        ))
+
+
+def set_registry_status(conn, schema_name, table_name, status, row_count=None):
+    """Обновляет статус таблицы в реестре (0 - загружается, 1 - загружена, 2 - ошибка, 3 - архивирована).
+
+    При status=1 таблица становится текущей, если её номер не меньше номера текущей таблицы
+    (завершившаяся позже старая загрузка не вытесняет более новую): признак снимается
+    с предыдущей, и в канал PUBLISH_CHANNEL отправляется уведомление (доставляется
+    слушателям при фиксации). Смена текущей таблицы выполняется под транзакционной
+    рекомендательной блокировкой схемы, поэтому параллельные финализации в одной схеме
+    не нарушают уникальность признака is_current.
+    Изменения не фиксируются: они входят в транзакцию вызывающего этапа.
+    """
+    with conn.cursor() as cursor:
+        is_current = False
+        if status == 1:
+            # Блокировка держится до конца транзакции; после неё запросы видят зафиксированную смену
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (f"{schema_name}.{REGISTRY_TABLE}",))
+            cursor.execute(sql.SQL("""
+                SELECT
+                    (SELECT table_number FROM {schema}.{registry} WHERE table_name = %s),
+                    (SELECT table_number FROM {schema}.{registry} WHERE is_current)
+            """).format(
+                schema=sql.Identifier(schema_name),
+                registry=sql.Identifier(REGISTRY_TABLE)
+            ), (table_name,))
+            table_number, current_number = cursor.fetchone()
+            is_current = current_number is None or (table_number is not None and table_number >= current_number)
+            if is_current:
+                cursor.execute(sql.SQL("""
+                    UPDATE {schema}.{registry} SET is_current = FALSE WHERE is_current
+                """).format(
+                    schema=sql.Identifier(schema_name),
+                    registry=sql.Identifier(REGISTRY_TABLE)
+                ))
+            else:
+                print(f"Таблица {schema_name}.{table_name} старше текущей (номер {current_number}), "
+                      f"текущая таблица не меняется")
+        cursor.execute(sql.SQL("""
+            UPDATE {schema}.{registry}
+            SET status = %(status)s,
+                row_count = COALESCE(%(row_count)s, row_count),
+                is_current = %(is_current)s,
+                date_publish = CASE WHEN %(is_current)s THEN CURRENT_TIMESTAMP ELSE date_publish END
+            WHERE table_name = %(table_name)s
+        """).format(
+            schema=sql.Identifier(schema_name),
+            registry=sql.Identifier(REGISTRY_TABLE)
+        ), {
+            'status': status,
+            'row_count': row_count,
+            'is_current': is_current,
+            'table_name': table_name
+        })
+        if is_current:
+            cursor.execute("SELECT pg_notify(%s, %s)", (
+                PUBLISH_CHANNEL, json.dumps({"schema": schema_name, "table": table_name})))
 
 
 def ensure_log_tables_exist(conn, schema_name):
@@ -92,6 +444,60 @@ def ensure_log_tables_exist(conn, schema_name):
                 )
             """).format(schema=sql.Identifier(schema_name)))
 
+            # Сведения об архивировании таблицы (задание хранения, db_retention.py)
+            # и показатели этапов загрузки (LoadMetrics, отчёт db_metrics_report.py)
+            cursor.execute(sql.SQL("""
+                ALTER TABLE {schema}.t_load_stages
+                    ADD COLUMN IF NOT EXISTS archive_time TIMESTAMP,
+                    ADD COLUMN IF NOT EXISTS archive_location TEXT,
+                    ADD COLUMN IF NOT EXISTS metrics JSONB
+            """).format(schema=sql.Identifier(schema_name)))
+
+            # Хеш содержимого и путь загружаемого файла (продолжение загрузки, отказ в повторной)
+            cursor.execute(sql.SQL("""
+                ALTER TABLE {schema}.t_load_stages
+                    ADD COLUMN IF NOT EXISTS file_hash VARCHAR(128),
+                    ADD COLUMN IF NOT EXISTS file_path TEXT
+            """).format(schema=sql.Identifier(schema_name)))
+            cursor.execute(sql.SQL("""
+                CREATE INDEX IF NOT EXISTS {index_name} ON {schema}.t_load_stages (file_hash)
+            """).format(
+                index_name=sql.Identifier("ix_t_load_stages_file_hash"),
+                schema=sql.Identifier(schema_name)
+            ))
+
+            # Реестр загруженных таблиц и последовательность их номеров
+            cursor.execute(sql.SQL("""
+                CREATE SEQUENCE IF NOT EXISTS {schema}.{seq_name}
+            """).format(
+                schema=sql.Identifier(schema_name),
+                seq_name=sql.Identifier(REGISTRY_SEQUENCE)
+            ))
+            cursor.execute(sql.SQL("""
+                CREATE TABLE IF NOT EXISTS {schema}.{registry} (
+                    table_number INTEGER PRIMARY KEY,
+                    table_name VARCHAR(255) NOT NULL,
+                    row_count BIGINT,
+                    status SMALLINT NOT NULL DEFAULT 0,
+                    is_current BOOLEAN NOT NULL DEFAULT FALSE,
+                    date_insert TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    date_publish TIMESTAMP
+                )
+            """).format(
+                schema=sql.Identifier(schema_name),
+                registry=sql.Identifier(REGISTRY_TABLE)
+            ))
+            # Не более одной текущей таблицы; индекс же обслуживает поиск текущей таблицы
+            cursor.execute(sql.SQL("""
+                CREATE UNIQUE INDEX IF NOT EXISTS {index_name} ON {schema}.{registry} (is_current)
+                WHERE is_current
+            """).format(
+                index_name=sql.Identifier(f"ux_{REGISTRY_TABLE}_current"),
+                schema=sql.Identifier(schema_name),
+                registry=sql.Identifier(REGISTRY_TABLE)
+            ))
+            migrate_table_registry(conn, schema_name)
+
             conn.commit()
             print("Таблица логов успешно проверена/создана")
         except Exception as e:
@@ -100,18 +506,18 @@ def ensure_log_tables_exist(conn, schema_name):
             raise
 
 
-def create_load_stage_log(conn, schema_name, table_name):
-    """Создает запись в логе этапов загрузки"""
+def create_load_stage_log(conn, schema_name, table_name, file_hash=None, file_path=None):
+    """Создает запись в логе этапов загрузки (с хешем содержимого файла, если задан)"""
     print(f"\nСоздание лога этапов для таблицы {table_name}...")
     try:
         with conn.cursor() as cursor:
             cursor.execute(sql.SQL("""
                 INSERT INTO {schema}.t_load_stages 
-                (table_name, stage_bitmap, status_code)
-                VALUES (%s, %s, 0)
+                (table_name, stage_bitmap, status_code, file_hash, file_path)
+                VALUES (%s, %s, 0, %s, %s)
                 RETURNING id
             """).format(schema=sql.Identifier(schema_name)),
-                           (table_name, 0))  # Изначально все этапы = 0
+                           (table_name, 0, file_hash, file_path))  # Изначально все этапы = 0
             log_id = cursor.fetchone()[0]
             print(f"Лог этапов создан, ID: {log_id}")
             return log_id
@@ -156,7 +562,7 @@ def update_stage_status(conn, schema_name, stage_log_id, stage_name, success=Tru
             if not success:
                 update_query += sql.SQL(", status_code = 2, error_message = %(error_message)s")
                 update_data['error_message'] = error_message
-            elif new_bitmap == sum(LOAD_STAGES.values()):  # Все этапы выполнены (1+2+4=7)
+            elif new_bitmap == sum(LOAD_STAGES.values()):  # Все этапы выполнены (1+2+4+8=15)
                 update_query += sql.SQL(", status_code = 1, end_time = CURRENT_TIMESTAMP")
 
             update_query += sql.SQL(" WHERE id = %(stage_log_id)s")
@@ -182,107 +588,1013 @@ def check_file_size(file_path):
     print(f"Размер файла в допустимых пределах: {file_size} байт. Время: {end_time - start_time:.2f} сек.")
 
 
-def check_line_lengths(file_path, encoding):
-    """Проверяет длину строк в файле."""
-    print(f"\nПроверка длины строк в файле {file_path}...")
-    start_time = time.time()
-    with open(file_path, 'r', encoding=encoding) as f:
+def check_line_length(line, line_num):
+    """Проверяет длину одной строки."""
+    line_length = len(line.strip())
+    if line_length > MAX_LINE_LENGTH:
+        raise ValueError(f"Строка {line_num} превышает максимальную длину ({MAX_LINE_LENGTH} символов).")
+    if line_length < MIN_LINE_LENGTH:
+        raise ValueError(f"Строка {line_num} короче минимальной длины ({MIN_LINE_LENGTH} символов).")
+
+
+def check_line_fields(line, line_num, delimiter='\t'):
+    """Проверяет число полей в одной строке."""
+    fields = line.strip().split(delimiter)
+    if len(fields) != EXPECTED_FIELDS:
+        raise ValueError(f"Строка {line_num} содержит {len(fields)} полей, ожидается {EXPECTED_FIELDS}.")
+
+
+def check_line_chars(line, line_num):
+    """Проверяет допустимые символы в одной строке."""
+    match = DISALLOWED_CHARS_RE.search(line)
+    if match:
+        raise ValueError(f"Недопустимый символ '{match.group()}' в строке {line_num}.")
+
+
+def parse_int_field(value, field_name, line_num, value_range):
+    """Преобразует поле строки в целое число и проверяет диапазон столбца."""
+    low, high = value_range
+    if not value.lstrip('-').isdigit():
+        raise ValueError(f"Строка {line_num}: поле {field_name} '{value}' не является целым числом.")
+    number = int(value)
+    if not low <= number <= high:
+        raise ValueError(f"Строка {line_num}: поле {field_name} '{value}' вне диапазона [{low}, {high}].")
+    return number
+
+
+def is_valid_account_number(account_number):
+    """Проверяет номер счета: только цифры, длина от ACCOUNT_NUMBER_MIN_LENGTH до ACCOUNT_NUMBER_LENGTH."""
+    return (ACCOUNT_NUMBER_MIN_LENGTH <= len(account_number) <= ACCOUNT_NUMBER_LENGTH
+            and account_number.isdigit())
+
+
+def get_account_number_rule():
+    """Описание правила номера счета для сообщений об ошибках."""
+    if ACCOUNT_NUMBER_MIN_LENGTH == ACCOUNT_NUMBER_LENGTH:
+        return f"{ACCOUNT_NUMBER_LENGTH} цифр"
+    return f"{ACCOUNT_NUMBER_MIN_LENGTH}-{ACCOUNT_NUMBER_LENGTH} цифр"
+
+
+def check_line_values(line, line_num, delimiter='\t'):
+    """Проверяет значения полей строки данных по типам и диапазонам столбцов таблицы.
+
+    Строки с неверным числом полей пропускаются: их отвергает check_line_fields.
+    """
+    fields = line.strip().split(delimiter)
+    if len(fields) != EXPECTED_FIELDS:
+        return
+    account_number, _, _, period_year, period_month, meter_reading, debt = (
+        field.strip().strip('"') for field in fields)
+    if not is_valid_account_number(account_number):
+        raise ValueError(
+            f"Строка {line_num}: номер счета '{account_number}' должен состоять из {get_account_number_rule()}.")
+    parse_int_field(period_year, 'period_year', line_num, PERIOD_YEAR_RANGE)
+    parse_int_field(period_month, 'period_month', line_num, PERIOD_MONTH_RANGE)
+    parse_int_field(meter_reading, 'meter_reading', line_num, METER_READING_RANGE)
+    parse_int_field(debt, 'debt', line_num, DEBT_RANGE)
+
+
+def get_line_errors(line, line_num, delimiter='\t', check_values=True):
+    """Проверяет строку всеми правилами, не останавливаясь на первом нарушении.
+
+    Значения полей (check_line_values) проверяются только при check_values=True (не для заголовка).
+
+    Returns:
+        list: Пары (правило, сообщение); пустой список для корректной строки.
+    """
+    errors = []
+    try:
+        check_line_length(line, line_num)
+    except ValueError as e:
+        errors.append(('line_length', str(e)))
+    try:
+        check_line_fields(line, line_num, delimiter)
+    except ValueError as e:
+        errors.append(('field_count', str(e)))
+    try:
+        check_line_chars(line, line_num)
+    except ValueError as e:
+        errors.append(('allowed_chars', str(e)))
+    if check_values:
+        try:
+            check_line_values(line, line_num, delimiter)
+        except ValueError as e:
+            errors.append(('values', str(e)))
+    return errors
+
+
+def get_error_snippet(line, rule):
+    """Возвращает фрагмент строки для отчёта: окрестность недопустимого символа или начало строки."""
+    line = line.strip()
+    start = 0
+    if rule == 'allowed_chars':
+        match = DISALLOWED_CHARS_RE.search(line)
+        if match:
+            start = max(match.start() - REJECTS_SNIPPET_LENGTH // 2, 0)
+    return line[start:start + REJECTS_SNIPPET_LENGTH]
+
+
+def get_decode_error(file_path, encoding, error, start=0, end=None):
+    """Преобразует UnicodeDecodeError чтения файла в ошибку проверки с номером строки.
+
+    Декодер текстового потока не знает номера строки, поэтому файл (или байтовый
+    диапазон [start, end)) перечитывается построчно до первой недекодируемой строки;
+    это происходит только при ошибке. Строки нумеруются с 1 от начала диапазона.
+    """
+    with io.BufferedReader(FileByteRange(file_path, start, end)) as f:
         for line_num, line in enumerate(f, 1):
-            line_length = len(line.strip())
-            if line_length > MAX_LINE_LENGTH:
-                raise ValueError(f"Строка {line_num} превышает максимальную длину ({MAX_LINE_LENGTH} символов).")
-            if line_length < MIN_LINE_LENGTH:
-                raise ValueError(f"Строка {line_num} короче минимальной длины ({MIN_LINE_LENGTH} символов).")
-    end_time = time.time()
-    print(f"Длина всех строк в допустимых пределах. Время: {end_time - start_time:.2f} сек.")
+            try:
+                line.decode(encoding)
+            except UnicodeDecodeError as e:
+                return ValueError(f"Строка {line_num} не декодируется в кодировке {encoding}: {e.reason}.")
+    return ValueError(f"Файл не декодируется в кодировке {encoding}: {error.reason}.")
 
 
-def check_field_count(file_path, encoding, delimiter='\t'):
-    """Проверяет число полей в каждой строке."""
-    print(f"\nПроверка количества полей в файле {file_path}...")
-    start_time = time.time()
+def iter_file_lines(file_path, encoding, chunk_size=READ_CHUNK_SIZE, strict=True):
+    """Потоково читает файл блоками фиксированного размера и отдаёт пары (номер строки, строка).
+
+    Память ограничена размером блока и максимальной длиной строки: незавершённый
+    хвост длиннее MAX_LINE_LENGTH отвергается сразу, не дожидаясь конца строки.
+    При strict=False длинная строка дочитывается целиком и проверяется вызывающим.
+    Байты, не декодируемые в encoding (кодировка определяется по выборкам), отвергаются
+    ValueError с номером строки (get_decode_error).
+    """
     with open(file_path, 'r', encoding=encoding) as f:
-        for line_num, line in enumerate(f, 1):
-            fields = line.strip().split(delimiter)
-            if len(fields) != EXPECTED_FIELDS:
-                raise ValueError(f"Строка {line_num} содержит {len(fields)} полей, ожидается {EXPECTED_FIELDS}.")
+        line_num = 0
+        tail = ''
+        while True:
+            try:
+                chunk = f.read(chunk_size)
+            except UnicodeDecodeError as e:
+                raise get_decode_error(file_path, encoding, e) from None
+            if not chunk:
+                break
+            lines = (tail + chunk).split('\n')
+            tail = lines.pop()
+            for line in lines:
+                line_num += 1
+                yield line_num, line
+            if strict and len(tail) > MAX_LINE_LENGTH and len(tail.strip()) > MAX_LINE_LENGTH:
+                raise ValueError(f"Строка {line_num + 1} превышает максимальную длину ({MAX_LINE_LENGTH} символов).")
+        if tail:
+            yield line_num + 1, tail
+
+
+class AccountDuplicateFinder:
+    """Поиск повторяющихся номеров счетов в ограниченной памяти.
+
+    Номер счета хранится 64-битным числом (array 'Q'), номер строки - 32-битным (array 'I'),
+    12 байт на строку; к номеру счета приписывается ведущая 1, чтобы номера с ведущими нулями
+    разной длины не совпадали (поэтому номер не длиннее ACCOUNT_NUMBER_MAX_DIGITS цифр).
+    Каждые run_size пар сортируются и сбрасываются во временный файл, в конце части
+    сливаются (heapq.merge) - внешняя сортировка; файл целиком в памяти не держится.
+    """
+
+    def __init__(self, run_size=DUPLICATES_RUN_SIZE, delimiter='\t'):
+        self.run_size = run_size
+        self.delimiter = delimiter
+        self._accounts = array('Q')
+        self._lines = array('I')
+        self._runs = []
+
+    def add(self, line, line_num):
+        """Учитывает номер счета строки данных (нечисловые номера пропускаются - их отвергают проверки)."""
+        account_number = line.split(self.delimiter, 1)[0].strip().strip('"')
+        if account_number.isdigit() and len(account_number) <= ACCOUNT_NUMBER_LENGTH:
+            self._accounts.append(int('1' + account_number))
+            self._lines.append(line_num)
+            if len(self._accounts) >= self.run_size:
+                self._flush()
+
+    def _sorted_keys(self):
+        """Пары в памяти как числа (номер счета << 32 | номер строки) по возрастанию."""
+        return sorted(map(operator.or_, map(operator.lshift, self._accounts, repeat(32)), self._lines))
+
+    def _flush(self):
+        # Часть пишется парами 64-битных чисел (номер счета, номер строки)
+        run = tempfile.TemporaryFile()
+        array('Q', chain.from_iterable(map(divmod, self._sorted_keys(), repeat(1 << 32)))).tofile(run)
+        run.seek(0)
+        self._runs.append(run)
+        self._accounts = array('Q')
+        self._lines = array('I')
+
+    @staticmethod
+    def _read_run(run, block_size=65536):
+        while True:
+            block = array('Q')
+            try:
+                block.fromfile(run, block_size * 2)
+            except EOFError:
+                pass  # Последний неполный блок уже прочитан в block
+            if not block:
+                return
+            yield from map(operator.or_, map(operator.lshift, block[::2], repeat(32)), block[1::2])
+
+    def finish(self):
+        """Завершает поиск.
+
+        Returns:
+            dict: Номер счета (строка цифр как в файле) -> номера строк по возрастанию,
+                  только для счетов, встретившихся более одного раза.
+        """
+        if self._runs:
+            if self._accounts:
+                self._flush()
+            keys = heapq.merge(*(self._read_run(run) for run in self._runs))
+        else:
+            keys = self._sorted_keys()
+        duplicates = {}
+        previous_account, previous_line = None, None
+        for key in keys:
+            account, line_num = key >> 32, key & 0xFFFFFFFF
+            if account == previous_account:
+                duplicates.setdefault(str(account)[1:], [previous_line]).append(line_num)
+            previous_account, previous_line = account, line_num
+        for run in self._runs:
+            run.close()
+        self._runs = []
+        self._accounts = array('Q')
+        self._lines = array('I')
+        return duplicates
+
+
+def check_file_lines(file_path, encoding, delimiter='\t', chunk_size=READ_CHUNK_SIZE, duplicates=None):
+    """Проверяет длину, число полей, допустимые символы и значения всех строк за один проход по файлу.
+
+    Если передан AccountDuplicateFinder, в него же добавляются номера счетов строк данных.
+    """
+    print(f"\nПроверка строк файла {file_path} (длина, число полей, символы, значения)...")
+    start_time = time.time()
+    line_count = 0
+    for line_num, line in iter_file_lines(file_path, encoding, chunk_size):
+        check_line_length(line, line_num)
+        check_line_fields(line, line_num, delimiter)
+        check_line_chars(line, line_num)
+        if line_num > 1:  # Первая строка - заголовок
+            check_line_values(line, line_num, delimiter)
+            if duplicates is not None:
+                duplicates.add(line, line_num)
+        line_count = line_num
     end_time = time.time()
-    print(f"Все строки содержат корректное число полей ({EXPECTED_FIELDS}). Время: {end_time - start_time:.2f} сек.")
+    print(f"Все строки ({line_count}) прошли проверку. Время: {end_time - start_time:.2f} сек.")
+    return line_count
+
+
+def get_rejects_report_path(file_path):
+    """Возвращает путь к отчёту об ошибочных строках файла."""
+    return f"{file_path}{REJECTS_REPORT_SUFFIX}"
+
 
+def write_rejects_report(report_path, rejects):
+    """Записывает отчёт об ошибочных строках (TSV: номер строки, правило, сообщение, фрагмент строки).
 
-def check_allowed_chars(file_path, encoding):
-    """Проверяет допустимые символы в файле."""
-    print(f"\nПроверка допустимых символов в файле {file_path}...")
+    Устаревший отчёт от прошлой проверки удаляется, если записей нет.
+
+    Returns:
+        str: Путь к отчёту или None, если записей нет.
+    """
+    if rejects:
+        with open(report_path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f, delimiter='\t')
+            writer.writerow(('line', 'rule', 'message', 'snippet'))
+            writer.writerows(rejects)
+        return report_path
+    if os.path.exists(report_path):
+        os.remove(report_path)
+    return None
+
+
+def collect_file_errors(file_path, encoding, delimiter='\t', max_errors=REJECTS_MAX_ERRORS,
+                        chunk_size=READ_CHUNK_SIZE, duplicates=None, write_report=True):
+    """Проверяет все строки файла за один проход, собирая ошибки вместо остановки на первой.
+
+    Первые max_errors нарушений записываются в отчёт get_rejects_report_path(...)
+    (write_rejects_report), остальные только считаются. При write_report=False отчёт
+    не пишется: записи возвращаются, чтобы дополнить их и записать отчёт позже.
+    Номера счетов корректных строк данных добавляются в duplicates (AccountDuplicateFinder), если он передан.
+
+    Returns:
+        dict: Число строк, число нарушений, число ошибочных строк данных (без заголовка),
+              записи отчёта и путь к отчёту.
+    """
+    print(f"\nПроверка строк файла {file_path} со сбором ошибок (не более {max_errors} в отчёте)...")
     start_time = time.time()
-    with open(file_path, 'r', encoding=encoding) as f:
-        for line_num, line in enumerate(f, 1):
-            for char in line:
-                if char not in ALLOWED_CHARS:
-                    raise ValueError(f"Недопустимый символ '{char}' в строке {line_num}.")
+    report_path = get_rejects_report_path(file_path)
+    line_count = 0
+    error_count = 0
+    rejected_rows = 0
+    rejects = []
+    for line_num, line in iter_file_lines(file_path, encoding, chunk_size, strict=False):
+        line_count = line_num
+        errors = get_line_errors(line, line_num, delimiter, check_values=line_num > 1)
+        if not errors:
+            if duplicates is not None and line_num > 1:
+                duplicates.add(line, line_num)
+            continue
+        error_count += len(errors)
+        if line_num > 1:
+            rejected_rows += 1
+        for rule, message in errors:
+            if len(rejects) < max_errors:
+                rejects.append((line_num, rule, message, get_error_snippet(line, rule)))
+
+    if write_report:
+        write_rejects_report(report_path, rejects)
+
     end_time = time.time()
-    print(f"Все символы в файле допустимы. Время: {end_time - start_time:.2f} сек.")
+    if error_count:
+        print(f"Найдено нарушений: {error_count} в {rejected_rows} строках данных из {line_count - 1}"
+              f"{f', отчёт: {report_path}' if write_report else ''}. Время: {end_time - start_time:.2f} сек.")
+    else:
+        print(f"Все строки ({line_count}) прошли проверку. Время: {end_time - start_time:.2f} сек.")
+    return {
+        "line_count": line_count,
+        "error_count": error_count,
+        "rejected_rows": rejected_rows,
+        "rejects": rejects,
+        "report_path": report_path if rejects and write_report else None
+    }
+
+
+def get_file_hash(file_path, chunk_size=READ_CHUNK_SIZE):
+    """Считает хеш содержимого файла (FILE_HASH_ALGORITHM) потоковым чтением."""
+    print(f"\nРасчёт хеша файла {file_path}...")
+    start_time = time.time()
+    file_hash = hashlib.new(FILE_HASH_ALGORITHM)
+    with open(file_path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            file_hash.update(chunk)
+    print(f"Хеш файла: {file_hash.hexdigest()}. Время: {time.time() - start_time:.2f} сек.")
+    return file_hash.hexdigest()
+
+
+def get_duplicates_message(duplicates):
+    """Формирует сообщение о повторяющихся номерах счетов с первыми DUPLICATES_REPORT_LIMIT примерами."""
+    examples = '; '.join(
+        f"{account_number} (строки {', '.join(map(str, line_nums[:DUPLICATES_REPORT_LIMIT]))}"
+        f"{', ...' if len(line_nums) > DUPLICATES_REPORT_LIMIT else ''})"
+        for account_number, line_nums in list(duplicates.items())[:DUPLICATES_REPORT_LIMIT])
+    return (f"Повторяющихся номеров счетов: {len(duplicates)} "
+            f"(лишних строк: {sum(len(line_nums) - 1 for line_nums in duplicates.values())}): {examples}")
+
+
+def get_duplicate_rejects(duplicates, max_rows=REJECTS_MAX_ERRORS):
+    """Записи отчёта об ошибках для повторных строк счетов (первая строка счета не включается)."""
+    rejects = []
+    for account_number, line_nums in duplicates.items():
+        for line_num in line_nums[1:]:
+            if len(rejects) >= max_rows:
+                return rejects
+            rejects.append((line_num, 'duplicate_account',
+                            f"Строка {line_num}: номер счета {account_number} уже встречался в строке {line_nums[0]}",
+                            account_number))
+    return rejects
+
+
+def check_duplicates(duplicates, policy=DUPLICATES_POLICY):
+    """Сообщает о повторяющихся номерах счетов; при policy='reject' отказывает в загрузке."""
+    if not duplicates:
+        print("Повторяющихся номеров счетов нет")
+        return
+    message = get_duplicates_message(duplicates)
+    if policy == 'reject':
+        raise ValueError(message)
+    print(f"{message}. Политика: {policy}")
+
+
+def get_duplicate_line_sets(duplicates, policy=DUPLICATES_POLICY):
+    """Определяет по политике, какие строки с повторяющимися счетами пропустить и какие отвести.
 
+    Returns:
+        tuple: (множество пропускаемых строк, множество отводимых в таблицу отказов строк).
+    """
+    if policy == 'keep_last':
+        return {line_num for line_nums in duplicates.values() for line_num in line_nums[:-1]}, set()
+    if policy == 'divert':
+        return set(), {line_num for line_nums in duplicates.values() for line_num in line_nums[1:]}
+    return set(), set()
+
+
+def validate_file(file_path, metrics=None, rejects=REJECTS_MODE, duplicates_policy=DUPLICATES_POLICY,
+                  pipeline=PIPELINE_MODE):
+    """Выполняет все проверки файла перед загрузкой.
+
+    Если передан LoadMetrics, каждая проверка записывается в него отдельным этапом.
+    Правила длины, числа полей и символов выполняются одним проходом и замеряются вместе.
+    При rejects='report' или 'divert' строки проверяются со сбором всех ошибок
+    (collect_file_errors); в режиме 'report' найденные ошибки приводят к отказу, в режиме
+    'divert' файл допускается к загрузке, а ошибочные строки отводятся при COPY.
+    Тем же проходом ищутся повторяющиеся номера счетов (если задана duplicates_policy);
+    при политике 'reject' они приводят к отказу. При сборе ошибок повторные строки счетов
+    тоже попадают в отчёт, а отказ по ошибочным строкам и повторам выдаётся одной ошибкой
+    после записи отчёта.
+    При pipeline=True проход по строкам не выполняется: строки и повторы счетов проверяются
+    во время загрузки (load_file). Режим rejects='report' и политики keep_last/divert
+    требуют предварительного прохода, с ними конвейер отключается.
 
-def validate_file(file_path):
-    """Выполняет все проверки файла перед загрузкой."""
+    Returns:
+        dict: Кодировка, уверенность её определения, число строк файла,
+              число отведённых строк данных, путь к отчёту об ошибках,
+              повторяющиеся счета и политика их обработки, хеш содержимого,
+              режимы rejects и pipeline (число строк при конвейере - None).
+    """
     print(f"\n=== ВАЛИДАЦИЯ ФАЙЛА {file_path} ===")
     start_time = time.time()
+    metrics = metrics or LoadMetrics()
+    file_size = os.path.getsize(file_path)
 
-    encoding = check_file_encoding(file_path)
-    check_file_size(file_path)
-    check_line_lengths(file_path, encoding)
-    check_field_count(file_path, encoding)
-    check_allowed_chars(file_path, encoding)
+    # Размер проверяется до чтения содержимого, чтобы не сканировать заведомо негодный файл
+    with metrics.stage('check_file_size'):
+        check_file_size(file_path)
+    with metrics.stage('detect_encoding') as record:
+        encoding, confidence, method = check_file_encoding(file_path)
+        record['bytes'] = file_size if method == 'full' else min(file_size, ENCODING_SAMPLE_SIZE)
+    if pipeline and (rejects == 'report' or duplicates_policy in ('keep_last', 'divert')):
+        print("\nКонвейерная проверка несовместима с rejects='report' и политиками keep_last/divert, "
+              "строки проверяются заранее")
+        pipeline = False
+    errors = {"error_count": 0, "rejected_rows": 0, "rejects": []}
+    finder = AccountDuplicateFinder() if duplicates_policy and not pipeline else None
+    if pipeline:
+        print("\nСтроки файла будут проверены во время загрузки (конвейер)")
+        line_count = None
+    else:
+        with metrics.stage('check_file_lines', file_size) as record:
+            if rejects:
+                errors = collect_file_errors(file_path, encoding, duplicates=finder, write_report=False)
+                line_count = errors['line_count']
+            else:
+                line_count = check_file_lines(file_path, encoding, duplicates=finder)
+            record['rows'] = line_count
+    duplicates = {}
+    duplicates_message = None
+    if finder is not None:
+        with metrics.stage('check_duplicates', rows=line_count - 1):
+            duplicates = finder.finish()
+            if rejects and duplicates_policy == 'reject':
+                # Отказ откладывается до записи отчёта, в который попадают и повторы
+                duplicates_message = get_duplicates_message(duplicates) if duplicates else None
+                if not duplicates:
+                    print("Повторяющихся номеров счетов нет")
+            else:
+                check_duplicates(duplicates, duplicates_policy)
+    report_path = None
+    if rejects:
+        report_rows = errors['rejects'] + (get_duplicate_rejects(duplicates) if duplicates_message else [])
+        report_rows.sort(key=lambda row: row[0])
+        report_path = write_rejects_report(get_rejects_report_path(file_path), report_rows[:REJECTS_MAX_ERRORS])
+    with metrics.stage('file_hash', file_size):
+        file_hash = get_file_hash(file_path)
 
     end_time = time.time()
-    print(f"\nВсе проверки пройдены успешно. Общее время проверки: {end_time - start_time:.2f} сек.")
+    failures = []
+    if errors['error_count'] and rejects != 'divert':
+        failures.append(f"ошибочные строки ({errors['error_count']} нарушений)")
+    if duplicates_message:
+        failures.append(duplicates_message)
+    if failures:
+        raise ValueError(f"Файл отклонён: {'; '.join(failures)}. Отчёт: {report_path}")
+    if errors['rejected_rows']:
+        print(f"\nПроверки пройдены, ошибочных строк к отведению: {errors['rejected_rows']}. "
+              f"Общее время проверки: {end_time - start_time:.2f} сек.")
+    else:
+        print(f"\nВсе проверки пройдены успешно. Общее время проверки: {end_time - start_time:.2f} сек.")
+    return {
+        "encoding": encoding,
+        "confidence": confidence,
+        "encoding_method": method,
+        "line_count": line_count,
+        "rejected_rows": errors['rejected_rows'],
+        "rejects_report": report_path,
+        "duplicates": duplicates,
+        "duplicates_policy": duplicates_policy,
+        "file_hash": file_hash,
+        "rejects": rejects,
+        "pipeline": pipeline
+    }
+
+
+class FileByteRange(io.RawIOBase):
+    """Байтовый диапазон [start, end) файла как поток только для чтения."""
+
+    def __init__(self, file_path, start=0, end=None):
+        super().__init__()
+        self._file = open(file_path, 'rb')
+        self._file.seek(start)
+        self._remaining = (end if end is not None else os.path.getsize(file_path)) - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._remaining <= 0:
+            return 0
+        view = memoryview(buffer)[:self._remaining]
+        count = self._file.readinto(view)
+        self._remaining -= count
+        return count
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def split_file_ranges(file_path, parts):
+    """Делит файл на parts байтовых диапазонов по границам строк.
+
+    Returns:
+        list: Пары (start, end); пустые диапазоны отбрасываются.
+    """
+    file_size = os.path.getsize(file_path)
+    bounds = [0]
+    with open(file_path, 'rb') as f:
+        for i in range(1, parts):
+            f.seek(max(file_size * i // parts, bounds[-1]))
+            if f.tell() > 0:
+                f.readline()  # Дочитываем до конца текущей строки
+            bounds.append(min(f.tell(), file_size))
+    bounds.append(file_size)
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+
+# Двоичный формат COPY: сигнатура, флаги, длина расширения заголовка; признак конца данных
+BINARY_COPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('!ii', 0, 0)
+BINARY_COPY_TRAILER = struct.pack('!h', -1)
+BINARY_FIELD_LENGTH = struct.Struct('!i')
+# Число полей строки и поля фиксированной ширины (длина, значение): period_year и period_month, debt
+BINARY_ROW_START = struct.pack('!h', len(DATA_COLUMNS))
+BINARY_ROW_PERIOD = struct.Struct('!ihih')
+BINARY_ROW_DEBT = struct.Struct('!iq')
+
+
+def unquote_csv_field(value):
+    """Снимает CSV-кавычки с поля (удвоенные кавычки внутри заменяются одной)."""
+    value = value.strip()
+    if len(value) >= 2 and value[0] == '"' and value[-1] == '"':
+        return value[1:-1].replace('""', '"')
+    return value
+
+
+def encode_binary_row(line, line_num, delimiter='\t', text_encoding='utf-8'):
+    """Кодирует строку файла в строку двоичного COPY для столбцов DATA_COLUMNS.
+
+    Числовые поля преобразуются и проверяются по диапазонам столбцов (как в check_line_values),
+    текстовые (и показание счетчика, хранимое текстом) передаются в кодировке сервера text_encoding.
+    """
+    line = line.strip()
+    fields = None
+    if line[:1] == '"' and line[-1:] == '"' and '""' not in line:
+        # Все поля в кавычках без экранирования (обычный случай): кавычки снимаются одним разбиением
+        fields = line[1:-1].split(f'"{delimiter}"')
+    if fields is None or len(fields) != EXPECTED_FIELDS:
+        fields = [unquote_csv_field(field) for field in line.split(delimiter)]
+    if len(fields) != EXPECTED_FIELDS:
+        raise ValueError(f"Строка {line_num} содержит {len(fields)} полей, ожидается {EXPECTED_FIELDS}.")
+    account_number, full_name, address, period_year, period_month, meter_reading, debt = fields
+    if (period_year.isdigit() and period_month.isdigit() and meter_reading.isdigit()
+            and debt.lstrip('-').isdigit()):
+        numbers = (int(period_year), int(period_month), int(meter_reading), int(debt))
+    else:
+        numbers = ()
+    if not (numbers
+            and PERIOD_YEAR_RANGE[0] <= numbers[0] <= PERIOD_YEAR_RANGE[1]
+            and PERIOD_MONTH_RANGE[0] <= numbers[1] <= PERIOD_MONTH_RANGE[1]
+            and METER_READING_RANGE[0] <= numbers[2] <= METER_READING_RANGE[1]
+            and DEBT_RANGE[0] <= numbers[3] <= DEBT_RANGE[1]):
+        # Медленный путь только ради сообщения о первом неверном поле
+        numbers = (parse_int_field(period_year, 'period_year', line_num, PERIOD_YEAR_RANGE),
+                   parse_int_field(period_month, 'period_month', line_num, PERIOD_MONTH_RANGE),
+                   parse_int_field(meter_reading, 'meter_reading', line_num, METER_READING_RANGE),
+                   parse_int_field(debt, 'debt', line_num, DEBT_RANGE))
+    account_number = account_number.encode(text_encoding)
+    full_name = full_name.encode(text_encoding)
+    address = address.encode(text_encoding)
+    meter_reading = meter_reading.encode(text_encoding)
+    return b''.join((
+        BINARY_ROW_START,
+        BINARY_FIELD_LENGTH.pack(len(account_number)), account_number,
+        BINARY_FIELD_LENGTH.pack(len(full_name)), full_name,
+        BINARY_FIELD_LENGTH.pack(len(address)), address,
+        BINARY_ROW_PERIOD.pack(2, numbers[0], 2, numbers[1]),
+        BINARY_FIELD_LENGTH.pack(len(meter_reading)), meter_reading,
+        BINARY_ROW_DEBT.pack(8, numbers[3])
+    ))
+
+
+def parse_debt(line, line_num, delimiter='\t'):
+    """Извлекает значение debt (последнее поле, возможно в кавычках) из строки файла."""
+    value = line.strip().rsplit(delimiter, 1)[-1].strip().strip('"')
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"Строка {line_num} содержит некорректную задолженность '{value}'.")
+
+
+class CopySourceStream:
+    """Файлоподобный адаптер исходного файла для cursor.copy_expert.
+
+    Читает файл один раз блоками, пропускает заголовок, отдаёт в COPY только
+    целые строки и считает их. При validate=True каждая строка проверяется
+    теми же правилами, что и в validate_file, прямо во время загрузки.
+    При checksum=True накапливается сумма поля debt для сверки после COPY.
+    Параметры start/end ограничивают чтение байтовым диапазоном файла
+    (для параллельной загрузки); номера строк в ошибках тогда считаются от начала диапазона.
+    При divert=True ошибочные строки не прерывают COPY, а отводятся в rejects_file
+    (CSV с разделителем TAB: номер строки, правила, сообщения, строка) для загрузки в таблицу отказов.
+    Строки с номерами из skip_lines не загружаются, из duplicate_lines - отводятся туда же
+    с правилом duplicate_account (политики DUPLICATES_POLICY). Если передан duplicates
+    (AccountDuplicateFinder), в него добавляются номера счетов загружаемых строк.
+    При copy_format='binary' строки преобразуются в двоичный формат COPY (encode_binary_row)
+    и read() отдаёт байты; текстовые поля кодируются в text_encoding (кодировка сервера).
+    """
+
+    def __init__(self, file_path, encoding='utf-8', skip_header=True, validate=False,
+                 checksum=False, delimiter='\t', chunk_size=READ_CHUNK_SIZE, start=0, end=None, divert=False,
+                 copy_format=COPY_FORMAT, text_encoding='utf-8', skip_lines=None, duplicate_lines=None,
+                 duplicates=None):
+        self.file_path = file_path
+        self.encoding = encoding
+        self.validate = validate
+        self.checksum = checksum
+        self.delimiter = delimiter
+        self.chunk_size = chunk_size
+        self.rows = 0  # Число строк данных, переданных в COPY
+        self.lines = 0  # Число прочитанных строк данных (с отведёнными)
+        self.rejected = 0  # Число отведённых строк (ошибочных и повторов)
+        self.skipped = 0  # Число пропущенных строк (skip_lines)
+        self.divert = divert
+        self.skip_lines = skip_lines or set()
+        self.duplicate_lines = duplicate_lines or set()
+        self.duplicates = duplicates
+        self._filtering = bool(divert or self.skip_lines or self.duplicate_lines)
+        self.rejects_file = None
+        self._rejects_writer = None
+        if divert or self.duplicate_lines:
+            self.rejects_file = tempfile.SpooledTemporaryFile(REJECTS_SPOOL_SIZE, mode='w+', encoding='utf-8',
+                                                              newline='')
+            self._rejects_writer = csv.writer(self.rejects_file, delimiter='\t')
+        self.debt_sum = 0  # Сумма debt по переданным строкам (при checksum=True)
+        self.error = None  # Ошибка проверки, прервавшая COPY
+        self.binary = copy_format == 'binary'
+        self.text_encoding = text_encoding
+        self._binary_header_pending = self.binary
+        self._binary_trailer_pending = self.binary
+        self._header_pending = skip_header
+        self._line_offset = 1 if skip_header else 0  # Сдвиг номера строки для сообщений об ошибках
+        self._tail = ''
+        self._range = (start, end)
+        if start or end is not None:
+            self._file = io.TextIOWrapper(io.BufferedReader(FileByteRange(file_path, start, end)),
+                                          encoding=encoding)
+        else:
+            self._file = open(file_path, 'r', encoding=encoding)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+        if self.rejects_file is not None and not self.rejects_file.closed:
+            self.rejects_file.close()
+
+    def _next_block(self):
+        """Возвращает очередной блок целых строк или None, если в буфере нет завершённой строки."""
+        try:
+            chunk = self._file.read(self.chunk_size)
+        except UnicodeDecodeError as e:
+            # Недекодируемые байты вне выборок определения кодировки: ошибка проверки с номером строки
+            raise get_decode_error(self.file_path, self.encoding, e, *self._range) from None
+        if not chunk:
+            block, self._tail = self._tail, ''
+            return block
+        data = self._tail + chunk
+        cut = data.rfind('\n')
+        if cut < 0:
+            self._tail = data
+            # При отведении длинная строка дочитывается целиком и уходит в отказы
+            if not self.divert and len(data) > MAX_LINE_LENGTH and len(data.strip()) > MAX_LINE_LENGTH:
+                line_num = self.lines + self._line_offset + 1
+                raise ValueError(f"Строка {line_num} превышает максимальную длину ({MAX_LINE_LENGTH} символов).")
+            return None
+        self._tail = data[cut + 1:]
+        return data[:cut + 1]
+
+    def _process(self, block):
+        """Считает строки блока и при необходимости проверяет их и суммирует debt.
+
+        Returns:
+            str: Блок для COPY (без отведённых и пропущенных строк).
+        """
+        lines = block.split('\n')
+        if lines[-1] == '':
+            lines.pop()
+        first_line_num = self.lines + self._line_offset + 1
+        self.lines += len(lines)
+        numbered = None  # Пары (номер строки, строка) после отбора
+        if self._filtering:
+            numbered = self._filter(lines, first_line_num)
+            lines = [line for _, line in numbered]
+            block = ''.join(line + '\n' for line in lines)
+        if self.validate or self.checksum or self.duplicates is not None:
+            for line_num, line in numbered or enumerate(lines, first_line_num):
+                if self.validate:
+                    check_line_length(line, line_num)
+                    check_line_fields(line, line_num, self.delimiter)
+                    check_line_chars(line, line_num)
+                    check_line_values(line, line_num, self.delimiter)
+                if self.checksum:
+                    self.debt_sum += parse_debt(line, line_num, self.delimiter)
+                if self.duplicates is not None:
+                    self.duplicates.add(line, line_num)
+        self.rows += len(lines)
+        if self.binary:
+            block = b''.join(encode_binary_row(line, line_num, self.delimiter, self.text_encoding)
+                             for line_num, line in numbered or enumerate(lines, first_line_num))
+            if self._binary_header_pending and block:
+                self._binary_header_pending = False
+                block = BINARY_COPY_HEADER + block
+        return block
+
+    def _filter(self, lines, first_line_num):
+        """Пропускает строки skip_lines, отводит в rejects_file повторы и (при divert) ошибочные строки.
+
+        Returns:
+            list: Пары (номер строки, строка) для загрузки.
+        """
+        kept = []
+        for line_num, line in enumerate(lines, first_line_num):
+            if line_num in self.skip_lines:
+                self.skipped += 1
+                continue
+            if line_num in self.duplicate_lines:
+                errors = [('duplicate_account', f"Строка {line_num}: номер счета уже встречался в файле.")]
+            elif self.divert:
+                errors = get_line_errors(line, line_num, self.delimiter)
+            else:
+                errors = None
+            if errors:
+                self._rejects_writer.writerow((
+                    line_num,
+                    ','.join(rule for rule, _ in errors),
+                    ' '.join(message for _, message in errors),
+                    line.rstrip('\r')
+                ))
+                self.rejected += 1
+            else:
+                kept.append((line_num, line))
+        return kept
+
+    def read(self, size=-1):
+        """Отдаёт следующий блок целых строк (размер задаётся chunk_size, а не size)."""
+        while True:
+            try:
+                block = self._next_block()
+            except ValueError as e:
+                self.error = e
+                raise
+            if block is None:
+                continue
+            if not block:
+                if self._binary_trailer_pending:
+                    self._binary_trailer_pending = False
+                    # Пустые данные: сигнатура заголовка всё равно обязательна
+                    return (BINARY_COPY_HEADER if self._binary_header_pending else b'') + BINARY_COPY_TRAILER
+                return b'' if self.binary else ''
+            if self._header_pending:
+                self._header_pending = False
+                block = block[block.find('\n') + 1:] if '\n' in block else ''
+                if not block:
+                    continue
+            try:
+                block = self._process(block)
+            except ValueError as e:
+                # psycopg2 заворачивает исключение из read() в свою ошибку, сохраняем исходное
+                self.error = e
+                raise
+            if not block:
+                continue  # Все строки блока отведены; пустая строка означала бы конец данных
+            return block
+
+
+class PipelinedSource:
+    """Конвейерный источник для COPY: чтение, декодирование и проверка идут в отдельном потоке.
+
+    Поток-производитель вызывает source.read() (обычно CopySourceStream) и кладёт готовые
+    блоки в очередь из queue_size блоков; COPY забирает их через read(). Пока сервер
+    принимает один блок, следующий уже проверяется, а полная очередь притормаживает чтение.
+    Ошибка производителя передаётся через очередь и поднимается в read(), прерывая COPY.
+    close() останавливает производителя и закрывает source.
+    """
+
+    def __init__(self, source, queue_size=PIPELINE_QUEUE_SIZE):
+        self.source = source
+        self.chunk_size = source.chunk_size
+        self.error = None  # Ошибка производителя, прервавшая COPY
+        self._queue = queue.Queue(queue_size)
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._produce, name='copy-producer', daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _put(self, item):
+        # Ожидание с таймаутом, чтобы close() мог остановить производителя при полной очереди
+        while not self._stopped.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _produce(self):
+        try:
+            while not self._stopped.is_set():
+                block = self.source.read()
+                self._put(block)
+                if not block:
+                    return
+        except Exception as e:
+            self._put(e)
+
+    def read(self, size=-1):
+        """Отдаёт следующий проверенный блок (ждёт производителя, если очередь пуста)."""
+        item = self._queue.get()
+        if isinstance(item, Exception):
+            self.error = item
+            raise item
+        return item
+
+    def close(self):
+        self._stopped.set()
+        self._thread.join()
+        self.source.close()
+
+
+def build_copy_sql(schema_name, table_name, copy_format=COPY_FORMAT):
+    """Формирует команду COPY загружаемых столбцов из STDIN (без схемы - для временных таблиц)."""
+    if copy_format == 'binary':
+        options = sql.SQL("FORMAT binary")
+    else:
+        options = sql.SQL("FORMAT csv, DELIMITER '\t'")
+    return sql.SQL("""
+        COPY {table} ({columns}) FROM STDIN WITH ({options})
+    """).format(
+        table=sql.Identifier(schema_name, table_name) if schema_name else sql.Identifier(table_name),
+        columns=sql.SQL(', ').join(map(sql.Identifier, DATA_COLUMNS)),
+        options=options
+    )
+
+
+# Кодировки сервера, для которых двоичный COPY может передавать текстовые поля
+SERVER_TEXT_ENCODINGS = {
+    'UTF8': 'utf-8',
+    'WIN1251': 'cp1251'
+}
+
+
+def get_copy_format(conn, schema_name, copy_format=None):
+    """Определяет формат COPY для организации и кодировку текстовых полей для него.
+
+    Явно заданный формат важнее настройки COPY_FORMAT_BY_SCHEMA. Текст в двоичном COPY
+    передаётся в кодировке сервера, поэтому при неизвестной кодировке сервера выбирается csv.
+
+    Returns:
+        tuple: (формат, кодировка текстовых полей для binary или None).
+    """
+    copy_format = copy_format or COPY_FORMAT_BY_SCHEMA.get(schema_name, COPY_FORMAT)
+    if copy_format not in COPY_FORMATS:
+        raise ValueError(f"Неизвестный формат COPY: {copy_format}")
+    if copy_format != 'binary':
+        return copy_format, None
+    with conn.cursor() as cursor:
+        cursor.execute("SHOW server_encoding")
+        server_encoding = cursor.fetchone()[0]
+    if server_encoding not in SERVER_TEXT_ENCODINGS:
+        print(f"Кодировка сервера {server_encoding} не поддерживается двоичным COPY, используется csv")
+        return 'csv', None
+    return copy_format, SERVER_TEXT_ENCODINGS[server_encoding]
+
+
+def copy_from_stream(cursor, copy_sql, source):
+    """Выполняет COPY ... FROM STDIN из CopySourceStream (или PipelinedSource).
+
+    Если COPY прервала ошибка проверки строки, пробрасывается исходный ValueError.
+
+    Returns:
+        int: Число строк, загруженных командой COPY (cursor.rowcount).
+    """
+    try:
+        cursor.copy_expert(copy_sql, source, size=source.chunk_size)
+    except psycopg2.Error:
+        if source.error is not None:
+            raise source.error
+        raise
+    return cursor.rowcount
+
+
+def get_catalog_table_number(conn, schema_name, base_table_name):
+    """Определяет максимальный номер таблицы схемы по каталогу (для переноса в реестр)."""
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT COALESCE(MAX(
+                NULLIF(
+                    REGEXP_REPLACE(table_name, %s, %s), ''
+                )::INT
+            ), 0)
+            FROM information_schema.tables
+            WHERE table_schema = %s 
+            AND table_name ~ %s
+        """, (
+            f'^{base_table_name}_([0-9]+)({STAGING_SUFFIX})?$',
+            r'\1',
+            schema_name,
+            f'^{base_table_name}_[0-9]+({STAGING_SUFFIX})?$'
+        ))
+        return cursor.fetchone()[0]
 
 
 def get_next_table_number(conn, schema_name, base_table_name):
-    """Безопасное определение следующего номера таблицы с проверкой результата"""
+    """Выделяет следующий номер таблицы из последовательности реестра схемы."""
     with conn.cursor() as cursor:
         try:
-            cursor.execute("""
-                SELECT COALESCE(MAX(
-                    NULLIF(
-                        REGEXP_REPLACE(table_name, %s, %s), ''
-                    )::INT
-                ), 0) + 1
-                FROM information_schema.tables
-                WHERE table_schema = %s 
-                AND table_name ~ %s
-            """, (
-                f'^{base_table_name}_([0-9]+)$',
-                r'\1',
-                schema_name,
-                f'^{base_table_name}_[0-9]+$'
-            ))
-            result = cursor.fetchone()
-            return result[0] if result else 1
+            cursor.execute(sql.SQL("SELECT nextval({seq})").format(
+                seq=sql.Literal(f"{sql_quote_ident(schema_name)}.{REGISTRY_SEQUENCE}")))
+            return cursor.fetchone()[0]
         except Exception as e:
             print(f"Ошибка при определении номера таблицы: {str(e)}")
-            conn.rollback()
-            return 1
+            raise
+
+
+def sql_quote_ident(name):
+    """Заключает идентификатор в двойные кавычки для использования внутри строкового литерала (regclass)."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def staging_table_name(table_name):
+    """Возвращает имя промежуточной таблицы, в которую идёт загрузка до публикации."""
+    return f"{table_name}{STAGING_SUFFIX}"
+
+
+def rejects_table_name(table_name):
+    """Возвращает имя таблицы строк, отведённых при загрузке таблицы table_name."""
+    return f"{table_name}{REJECTS_TABLE_SUFFIX}"
+
+
+def get_base_table_name(schema_name):
+    """Возвращает префикс имён таблиц данных схемы (t_<ORG>)."""
+    return f"t_{schema_name}"
+
+
+def partition_parent_name(schema_name):
+    """Возвращает имя секционированной таблицы данных схемы (t_<ORG>); её секции - таблицы t_<ORG>_N."""
+    return get_base_table_name(schema_name)
+
+
+def has_partitioned_table(conn, schema_name):
+    """Проверяет, есть ли в схеме секционированная таблица данных."""
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT 1 FROM pg_partitioned_table p
+            JOIN pg_class c ON c.oid = p.partrelid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = %s AND c.relname = %s
+        """, (schema_name, partition_parent_name(schema_name)))
+        return cursor.fetchone() is not None
+
+
+def has_partition_key(conn, schema_name, table_name):
+    """Проверяет, создана ли таблица как секция (есть столбец PARTITION_KEY)."""
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = %s AND table_name = %s AND column_name = %s
+        """, (schema_name, table_name, PARTITION_KEY))
+        return cursor.fetchone() is not None
 
 
 @with_transaction
-def create_new_table(conn, schema_name, base_table_name):
-    """Создаёт новую таблицу с проверкой ошибок"""
-    try:
-        table_number = get_next_table_number(conn, schema_name, base_table_name)
-        table_name = f"{base_table_name}_{table_number}"
-        seq_name = f"s_{table_name}_id"
+def ensure_partitioned_table(conn, schema_name):
+    """Создаёт секционированную таблицу данных схемы и общую последовательность id её секций.
 
+    Столбцы те же, что у таблиц t_<ORG>_N (create_new_table), плюс PARTITION_KEY.
+    Индексов у родительской таблицы нет: каждая секция строит свои до присоединения.
+    """
+    parent_name = partition_parent_name(schema_name)
+    seq_name = f"s_{parent_name}_id"
+    try:
         with conn.cursor() as cursor:
-            # Проверяем, не существует ли таблица
-            cursor.execute(sql.SQL("""
-                SELECT 1 FROM information_schema.tables 
-                WHERE table_schema = %s AND table_name = %s
-            """), (schema_name, table_name))
-            if cursor.fetchone():
-                raise ValueError(f"Таблица {schema_name}.{table_name} уже существует")
-
-            # Создаем последовательность
             cursor.execute(sql.SQL("""
                 CREATE SEQUENCE IF NOT EXISTS {schema}.{seq_name}
             """).format(
@@ -290,29 +1602,187 @@ def create_new_table(conn, schema_name, base_table_name):
                 seq_name=sql.Identifier(seq_name)
             ))
 
-            # Создаем таблицу
             cursor.execute(sql.SQL("""
                 CREATE TABLE IF NOT EXISTS {schema}.{table_name} (
                     id BIGINT NOT NULL DEFAULT nextval('{schema}.{seq_name}'::regclass),
-                    status BIGINT NOT NULL DEFAULT 0,
                     date_insert TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                    account_number VARCHAR NOT NULL,
-                    full_name VARCHAR NOT NULL,
-                    address VARCHAR NOT NULL,
-                    period_year VARCHAR NOT NULL,
-                    period_month VARCHAR NOT NULL,
-                    meter_reading VARCHAR NOT NULL,
                     debt BIGINT NOT NULL,
-                    CONSTRAINT {pk_name} PRIMARY KEY (id)
-                )
+                    {partition_key} INTEGER NOT NULL,
+                    status SMALLINT NOT NULL DEFAULT 0,
+                    period_year SMALLINT NOT NULL,
+                    period_month SMALLINT NOT NULL,
+                    account_number VARCHAR({account_length}) NOT NULL,
+                    meter_reading VARCHAR NOT NULL,
+                    full_name VARCHAR NOT NULL,
+                    address VARCHAR NOT NULL
+                ) PARTITION BY LIST ({partition_key})
             """).format(
                 schema=sql.Identifier(schema_name),
-                table_name=sql.Identifier(table_name),
+                table_name=sql.Identifier(parent_name),
                 seq_name=sql.Identifier(seq_name),
-                pk_name=sql.Identifier(f"pk_{table_name}")
+                partition_key=sql.Identifier(PARTITION_KEY),
+                account_length=sql.Literal(ACCOUNT_NUMBER_LENGTH)
             ))
+        print(f"Секционированная таблица {schema_name}.{parent_name} проверена/создана")
+    except Exception as e:
+        print(f"Ошибка при создании секционированной таблицы: {str(e)}")
+        raise
+
 
-            print(f"Успешно создана таблица: {schema_name}.{table_name}")
+def attach_partition(conn, schema_name, table_name):
+    """Присоединяет загруженную таблицу как секцию таблицы данных схемы.
+
+    Ограничение CHECK по PARTITION_KEY, созданное вместе с таблицей, избавляет
+    от проверочного прохода по строкам. Изменения не фиксируются: они входят
+    в транзакцию этапа finalize.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(sql.SQL("SELECT table_number FROM {schema}.{registry} WHERE table_name = %s").format(
+            schema=sql.Identifier(schema_name),
+            registry=sql.Identifier(REGISTRY_TABLE)
+        ), (table_name,))
+        table_number = cursor.fetchone()[0]
+        cursor.execute(sql.SQL("""
+            ALTER TABLE {schema}.{parent} ATTACH PARTITION {schema}.{table} FOR VALUES IN ({value})
+        """).format(
+            schema=sql.Identifier(schema_name),
+            parent=sql.Identifier(partition_parent_name(schema_name)),
+            table=sql.Identifier(table_name),
+            value=sql.Literal(table_number)
+        ))
+    print(f"Таблица {schema_name}.{table_name} присоединена как секция")
+
+
+def detach_partition(conn, schema_name, table_name):
+    """Отсоединяет таблицу от секционированной таблицы схемы, если она её секция.
+
+    Returns:
+        bool: True, если таблица была секцией.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT parent.relname FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            JOIN pg_class parent ON parent.oid = i.inhparent
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = %s AND c.relname = %s AND c.relispartition
+        """, (schema_name, table_name))
+        row = cursor.fetchone()
+        if row is None:
+            return False
+        cursor.execute(sql.SQL("ALTER TABLE {schema}.{parent} DETACH PARTITION {schema}.{table}").format(
+            schema=sql.Identifier(schema_name),
+            parent=sql.Identifier(row[0]),
+            table=sql.Identifier(table_name)
+        ))
+    return True
+
+
+@with_transaction
+def create_new_table(conn, schema_name, base_table_name, staging=False, table_number=None, partitioned=False):
+    """Создаёт новую таблицу с проверкой ошибок.
+
+    Таблица создаётся без первичного ключа и индексов: они строятся после загрузки
+    данных функцией build_table_indexes. Столбцы типизированы (значения из файла
+    преобразует сервер при COPY, диапазоны проверяет check_line_values) и расположены
+    для плотной упаковки кортежа. При staging=True создаётся UNLOGGED-таблица
+    с именем staging_table_name(...), которая становится видимой под итоговым
+    именем только после publish_table. Номер таблицы можно передать в table_number,
+    иначе он определяется get_next_table_number. При partitioned=True таблица создаётся
+    по образцу секционированной таблицы схемы (ensure_partitioned_table) с её общей
+    последовательностью id и ограничением на свой номер; присоединяется она на этапе finalize.
+
+    Returns:
+        str: Итоговое имя таблицы (без суффикса промежуточной таблицы).
+    """
+    try:
+        if table_number is None:
+            table_number = get_next_table_number(conn, schema_name, base_table_name)
+        table_name = f"{base_table_name}_{table_number}"
+        seq_name = f"s_{table_name}_id"
+        physical_name = staging_table_name(table_name) if staging else table_name
+
+        with conn.cursor() as cursor:
+            # Проверяем, не существует ли таблица (в реестре или в каталоге)
+            cursor.execute(sql.SQL("""
+                SELECT 1 FROM {schema}.{registry} WHERE table_number = %s
+            """).format(
+                schema=sql.Identifier(schema_name),
+                registry=sql.Identifier(REGISTRY_TABLE)
+            ), (table_number,))
+            if cursor.fetchone():
+                raise ValueError(f"Таблица {schema_name}.{table_name} уже зарегистрирована")
+            for name in {table_name, physical_name}:
+                cursor.execute("SELECT to_regclass(%s)", (f"{sql_quote_ident(schema_name)}.{sql_quote_ident(name)}",))
+                if cursor.fetchone()[0]:
+                    raise ValueError(f"Таблица {schema_name}.{name} уже существует")
+
+            if partitioned:
+                # Секция: столбцы и значения по умолчанию родительской таблицы, номер загрузки фиксирован
+                cursor.execute(sql.SQL("""
+                    CREATE {unlogged}TABLE {schema}.{table_name} (
+                        LIKE {schema}.{parent} INCLUDING DEFAULTS,
+                        CONSTRAINT {check_name} CHECK ({partition_key} = {value})
+                    )
+                """).format(
+                    unlogged=sql.SQL("UNLOGGED " if staging else ""),
+                    schema=sql.Identifier(schema_name),
+                    table_name=sql.Identifier(physical_name),
+                    parent=sql.Identifier(partition_parent_name(schema_name)),
+                    check_name=sql.Identifier(f"ck_{table_name}_{PARTITION_KEY}"),
+                    partition_key=sql.Identifier(PARTITION_KEY),
+                    value=sql.Literal(table_number)
+                ))
+                cursor.execute(sql.SQL("""
+                    ALTER TABLE {schema}.{table_name} ALTER COLUMN {partition_key} SET DEFAULT {value}
+                """).format(
+                    schema=sql.Identifier(schema_name),
+                    table_name=sql.Identifier(physical_name),
+                    partition_key=sql.Identifier(PARTITION_KEY),
+                    value=sql.Literal(table_number)
+                ))
+            else:
+                # Создаем последовательность
+                cursor.execute(sql.SQL("""
+                    CREATE SEQUENCE IF NOT EXISTS {schema}.{seq_name}
+                """).format(
+                    schema=sql.Identifier(schema_name),
+                    seq_name=sql.Identifier(seq_name)
+                ))
+
+                # Создаем таблицу: столбцы фиксированной ширины по убыванию выравнивания (8, 4, 2 байта),
+                # затем переменной длины - в кортеже нет пустот выравнивания
+                cursor.execute(sql.SQL("""
+                    CREATE {unlogged}TABLE IF NOT EXISTS {schema}.{table_name} (
+                        id BIGINT NOT NULL DEFAULT nextval('{schema}.{seq_name}'::regclass),
+                        date_insert TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                        debt BIGINT NOT NULL,
+                        status SMALLINT NOT NULL DEFAULT 0,
+                        period_year SMALLINT NOT NULL,
+                        period_month SMALLINT NOT NULL,
+                        account_number VARCHAR({account_length}) NOT NULL,
+                        meter_reading VARCHAR NOT NULL,
+                        full_name VARCHAR NOT NULL,
+                        address VARCHAR NOT NULL
+                    )
+                """).format(
+                    unlogged=sql.SQL("UNLOGGED " if staging else ""),
+                    schema=sql.Identifier(schema_name),
+                    table_name=sql.Identifier(physical_name),
+                    seq_name=sql.Identifier(seq_name),
+                    account_length=sql.Literal(ACCOUNT_NUMBER_LENGTH)
+                ))
+
+            # Регистрируем таблицу в той же транзакции (статус 0 - загружается)
+            cursor.execute(sql.SQL("""
+                INSERT INTO {schema}.{registry} (table_number, table_name, status)
+                VALUES (%s, %s, 0)
+            """).format(
+                schema=sql.Identifier(schema_name),
+                registry=sql.Identifier(REGISTRY_TABLE)
+            ), (table_number, table_name))
+
+            print(f"Успешно создана таблица: {schema_name}.{physical_name}")
             return table_name
 
     except Exception as e:
@@ -320,6 +1790,106 @@ def create_new_table(conn, schema_name, base_table_name):
         raise
 
 
+@with_transaction
+def build_table_indexes(conn, schema_name, table_name, unique=ACCOUNT_INDEX_UNIQUE,
+                        covering=ACCOUNT_INDEX_COVERING, maintenance_work_mem=INDEX_MAINTENANCE_WORK_MEM):
+    """Строит первичный ключ и индекс по account_number после загрузки данных.
+
+    Args:
+        unique (bool): Построить уникальный индекс по account_number.
+        covering (bool): Включить в индекс столбцы LOOKUP_COLUMNS для index-only scan; только для
+            выгрузок, где full_name и address вместе короче предела записи btree (около 2.7 КБ).
+        maintenance_work_mem (str): Память на сортировку при построении индексов.
+    """
+    print(f"\nПостроение индексов таблицы {schema_name}.{table_name}...")
+    start_time = time.time()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT set_config('maintenance_work_mem', %s, true)", (maintenance_work_mem,))
+
+            cursor.execute(sql.SQL("""
+                ALTER TABLE {schema}.{table_name} ADD CONSTRAINT {pk_name} PRIMARY KEY (id)
+            """).format(
+                schema=sql.Identifier(schema_name),
+                table_name=sql.Identifier(table_name),
+                pk_name=sql.Identifier(f"pk_{table_name}")
+            ))
+
+            index_sql = sql.SQL("CREATE {unique}INDEX {index_name} ON {schema}.{table_name} (account_number)").format(
+                unique=sql.SQL("UNIQUE " if unique else ""),
+                index_name=sql.Identifier(f"ix_{table_name}_account_number"),
+                schema=sql.Identifier(schema_name),
+                table_name=sql.Identifier(table_name)
+            )
+            if covering:
+                index_sql += sql.SQL(" INCLUDE ({columns})").format(
+                    columns=sql.SQL(', ').join(map(sql.Identifier, LOOKUP_COLUMNS)))
+            cursor.execute(index_sql)
+
+            # Свежая статистика, чтобы планировщик сразу выбирал индекс
+            cursor.execute(sql.SQL("ANALYZE {schema}.{table_name}").format(
+                schema=sql.Identifier(schema_name),
+                table_name=sql.Identifier(table_name)
+            ))
+        print(f"Индексы построены. Время: {time.time() - start_time:.2f} сек.")
+    except Exception as e:
+        print(f"Ошибка при построении индексов: {str(e)}")
+        raise
+
+
+def publish_table(conn, schema_name, stage_log_id, table_name, row_count=None, keep_unlogged=STAGING_KEEP_UNLOGGED,
+                  partitioned=False):
+    """Атомарно публикует промежуточную таблицу под итоговым именем.
+
+    В одной транзакции проверяет, что все этапы кроме finalize отмечены в stage_bitmap,
+    переводит таблицу в LOGGED (если не задан keep_unlogged), переименовывает её
+    вместе с индексами, при partitioned=True присоединяет как секцию (attach_partition),
+    отмечает её текущей в реестре и устанавливает бит finalize.
+    """
+    staging_name = staging_table_name(table_name)
+    print(f"\nПубликация таблицы {schema_name}.{staging_name} как {schema_name}.{table_name}...")
+    required = sum(LOAD_STAGES.values()) & ~LOAD_STAGES['finalize']
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(sql.SQL("""
+                SELECT stage_bitmap FROM {schema}.t_load_stages WHERE id = %s FOR UPDATE
+            """).format(schema=sql.Identifier(schema_name)), (stage_log_id,))
+            bitmap = cursor.fetchone()[0]
+            if bitmap & required != required:
+                raise ValueError(
+                    f"Нельзя опубликовать таблицу {table_name}: не все этапы загрузки завершены "
+                    f"(stage_bitmap={bitmap})")
+
+            if not keep_unlogged:
+                cursor.execute(sql.SQL("ALTER TABLE {schema}.{table} SET LOGGED").format(
+                    schema=sql.Identifier(schema_name),
+                    table=sql.Identifier(staging_name)
+                ))
+            for old_name, new_name in ((f"pk_{staging_name}", f"pk_{table_name}"),
+                                       (f"ix_{staging_name}_account_number", f"ix_{table_name}_account_number")):
+                cursor.execute(sql.SQL("ALTER INDEX IF EXISTS {schema}.{old} RENAME TO {new}").format(
+                    schema=sql.Identifier(schema_name),
+                    old=sql.Identifier(old_name),
+                    new=sql.Identifier(new_name)
+                ))
+            cursor.execute(sql.SQL("ALTER TABLE {schema}.{old} RENAME TO {new}").format(
+                schema=sql.Identifier(schema_name),
+                old=sql.Identifier(staging_name),
+                new=sql.Identifier(table_name)
+            ))
+
+        if partitioned:
+            attach_partition(conn, schema_name, table_name)
+        set_registry_status(conn, schema_name, table_name, 1, row_count)
+        update_stage_status(conn, schema_name, stage_log_id, 'finalize')
+        conn.commit()
+        print(f"Таблица {schema_name}.{table_name} опубликована")
+    except Exception as e:
+        conn.rollback()
+        print(f"Ошибка при публикации таблицы: {str(e)}")
+        raise
+
+
 def get_db_connection_info(conn):
     """Возвращает информацию о подключении к БД"""
     with conn.cursor() as cursor:
@@ -392,8 +1962,159 @@ def get_load_status(conn, schema_name, table_name):
         }
 
 
-def load_data_to_new_table(conn, file_path, schema_name, table_name, encoding='utf-8'):
-    """Загружает данные с проверкой существования таблицы"""
+def find_file_load(conn, schema_name, file_hash):
+    """Находит загрузку файла с хешем содержимого file_hash: завершённую, если есть, иначе последнюю.
+
+    Returns:
+        dict: ID записи лога, имя таблицы, битовая карта этапов, статус и ошибка; None, если загрузок не было.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(sql.SQL("""
+            SELECT id, table_name, stage_bitmap, status_code, error_message
+            FROM {schema}.t_load_stages
+            WHERE file_hash = %s
+            ORDER BY status_code = 1 DESC, id DESC
+            LIMIT 1
+        """).format(schema=sql.Identifier(schema_name)), (file_hash,))
+        result = cursor.fetchone()
+    if not result:
+        return None
+    return dict(zip(('id', 'table_name', 'stage_bitmap', 'status_code', 'error_message'), result))
+
+
+def get_pending_stage(bitmap):
+    """Возвращает первый по порядку выполнения (LOAD_STAGE_ORDER) этап, бит которого не установлен."""
+    for stage_name in LOAD_STAGE_ORDER:
+        if not bitmap & LOAD_STAGES[stage_name]:
+            return stage_name
+    return None
+
+
+@with_transaction
+def prepare_resume(conn, schema_name, load):
+    """Готовит продолжение незавершённой загрузки load (find_file_load) с первого невыполненного этапа.
+
+    Прерванный этап мог оставить частичный результат, поэтому перед повтором он убирается:
+    для copy_data таблица очищается и удаляется таблица отказов, для build_indexes удаляются
+    первичный ключ и индекс. Лог этапов и реестр возвращаются в состояние "загружается".
+
+    Returns:
+        dict: Признаки загрузки через промежуточную таблицу и в секцию, битовая карта выполненных этапов;
+              None, если таблица загрузки уже не существует (удалена или архивирована).
+    """
+    table_name = load['table_name']
+    with conn.cursor() as cursor:
+        physical_name = None
+        for staging, name in ((True, staging_table_name(table_name)), (False, table_name)):
+            cursor.execute("SELECT to_regclass(%s)", (f"{sql_quote_ident(schema_name)}.{sql_quote_ident(name)}",))
+            if cursor.fetchone()[0]:
+                physical_name = name
+                break
+        if physical_name is None:
+            print(f"Таблица {schema_name}.{table_name} незавершённой загрузки не найдена, продолжение невозможно")
+            return None
+
+        bitmap = load['stage_bitmap'] & ~LOAD_STAGES['finalize']
+        pending = get_pending_stage(bitmap)
+        print(f"Продолжение загрузки {schema_name}.{table_name} (лог {load['id']}) с этапа '{pending}'")
+        if pending == 'copy_data':
+            cursor.execute(sql.SQL("TRUNCATE {schema}.{table}").format(
+                schema=sql.Identifier(schema_name),
+                table=sql.Identifier(physical_name)
+            ))
+            cursor.execute(sql.SQL("DROP TABLE IF EXISTS {schema}.{table}").format(
+                schema=sql.Identifier(schema_name),
+                table=sql.Identifier(rejects_table_name(table_name))
+            ))
+        elif pending == 'build_indexes':
+            cursor.execute(sql.SQL("ALTER TABLE {schema}.{table} DROP CONSTRAINT IF EXISTS {pk_name}").format(
+                schema=sql.Identifier(schema_name),
+                table=sql.Identifier(physical_name),
+                pk_name=sql.Identifier(f"pk_{physical_name}")
+            ))
+            cursor.execute(sql.SQL("DROP INDEX IF EXISTS {schema}.{index_name}").format(
+                schema=sql.Identifier(schema_name),
+                index_name=sql.Identifier(f"ix_{physical_name}_account_number")
+            ))
+
+        cursor.execute(sql.SQL("""
+            UPDATE {schema}.t_load_stages
+            SET stage_bitmap = %s, status_code = 0, end_time = NULL, error_message = NULL
+            WHERE id = %s
+        """).format(schema=sql.Identifier(schema_name)), (bitmap, load['id']))
+    set_registry_status(conn, schema_name, table_name, 0)
+    return {
+        "staging": physical_name != table_name,
+        "partitioned": has_partition_key(conn, schema_name, physical_name),
+        "stage_bitmap": bitmap
+    }
+
+
+def count_table_rows(conn, schema_name, table_name):
+    """Считает строки таблицы (когда число строк не известно по проверке файла или отчёту COPY)."""
+    with conn.cursor() as cursor:
+        cursor.execute(sql.SQL("SELECT COUNT(*) FROM {schema}.{table}").format(
+            schema=sql.Identifier(schema_name),
+            table=sql.Identifier(table_name)
+        ))
+        return cursor.fetchone()[0]
+
+
+def check_debt_sum(conn, schema_name, table_name, expected_sum):
+    """Сверяет сумму debt в таблице (видимую в текущей транзакции) с посчитанной по файлу."""
+    with conn.cursor() as cursor:
+        cursor.execute(sql.SQL("""
+            SELECT COALESCE(SUM(debt), 0) FROM {schema}.{table}
+        """).format(
+            schema=sql.Identifier(schema_name),
+            table=sql.Identifier(table_name))
+        )
+        loaded_debt_sum = cursor.fetchone()[0]
+    print(f"Сумма задолженности: в файле {expected_sum}, в таблице {loaded_debt_sum}")
+    if loaded_debt_sum != expected_sum:
+        raise ValueError(
+            f"Несоответствие суммы задолженности (ожидалось: {expected_sum}, "
+            f"загружено: {loaded_debt_sum})")
+
+
+def save_rejected_rows(conn, schema_name, rejects_table, source):
+    """Создаёт таблицу отказов и загружает в неё строки, отведённые CopySourceStream (без фиксации)."""
+    with conn.cursor() as cursor:
+        cursor.execute(sql.SQL("""
+            CREATE TABLE {table} (
+                line_num INTEGER NOT NULL,
+                rules VARCHAR(100) NOT NULL,
+                error_message TEXT,
+                line_text TEXT
+            )
+        """).format(table=sql.Identifier(schema_name, rejects_table)))
+        source.rejects_file.seek(0)
+        cursor.copy_expert(sql.SQL("""
+            COPY {table} (line_num, rules, error_message, line_text) FROM STDIN WITH (FORMAT csv, DELIMITER '\t')
+        """).format(table=sql.Identifier(schema_name, rejects_table)), source.rejects_file)
+    print(f"Отведено ошибочных строк: {source.rejected} (таблица {schema_name}.{rejects_table})")
+
+
+def load_data_to_new_table(conn, file_path, schema_name, table_name, encoding='utf-8', validate=False,
+                           checksum=False, rejects_table=None, copy_format=COPY_FORMAT, text_encoding='utf-8',
+                           skip_lines=None, duplicate_lines=None, pipeline=False, duplicates=None):
+    """Загружает данные с проверкой существования таблицы.
+
+    Файл читается один раз: COPY получает данные через CopySourceStream,
+    который пропускает заголовок, считает строки и при validate=True проверяет их.
+    Число строк сверяется с cursor.rowcount команды COPY; при checksum=True
+    дополнительно сверяется сумма debt, посчитанная при чтении файла.
+    Если задан rejects_table, ошибочные строки не загружаются, а сохраняются в эту таблицу
+    в той же транзакции. Строки skip_lines не загружаются, строки duplicate_lines
+    отводятся в rejects_table как повторы счёта. При copy_format='binary' строки передаются
+    в двоичном формате COPY.
+    При pipeline=True чтение и проверка строк идут в отдельном потоке одновременно с COPY
+    (PipelinedSource). Если передан duplicates (AccountDuplicateFinder), повторяющиеся счета
+    ищутся во время загрузки и при их наличии загрузка отменяется (откат транзакции).
+
+    Returns:
+        dict: Число загруженных и отведённых строк.
+    """
     print("\n=== НАЧАЛО ЗАГРУЗКИ ДАННЫХ ===")
 
     # Извлекаем имя таблицы без схемы (если оно было передано с схемой)
@@ -414,124 +2135,421 @@ def load_data_to_new_table(conn, file_path, schema_name, table_name, encoding='u
             if not cur.fetchone()[0]:
                 raise ValueError(f"Таблица {full_table_name} не существует")
 
-        # 2. Подсчет строк в файле
-        with open(file_path, 'r', encoding=encoding) as f:
-            total_rows = sum(1 for _ in f) - 1  # исключаем заголовок
-        print(f"Всего строк для загрузки: {total_rows}")
+        # 2. Загрузка данных потоком из исходного файла (без временной копии)
+        print("Начало загрузки данных" + (" (конвейер: проверка параллельно с COPY)..." if pipeline else "..."))
+        source = CopySourceStream(file_path, encoding, validate=validate, checksum=checksum,
+                                  divert=rejects_table is not None, copy_format=copy_format,
+                                  text_encoding=text_encoding, skip_lines=skip_lines,
+                                  duplicate_lines=duplicate_lines, duplicates=duplicates)
+        with (PipelinedSource(source) if pipeline else source) as copy_source:
+            with conn.cursor() as cursor:
+                loaded_rows = copy_from_stream(cursor, build_copy_sql(schema_name, table_name_only, copy_format),
+                                               copy_source)
+            if source.rejected:
+                save_rejected_rows(conn, schema_name, rejects_table, source)
+        total_rows = source.rows
+        if source.skipped:
+            print(f"Пропущено строк с повторяющимися счетами: {source.skipped}")
+        print(f"Данные успешно загружены. Строк в файле: {total_rows}")
+
+        # 3. Проверка количества загруженных строк по отчёту COPY (без повторного сканирования таблицы)
+        print(f"Загружено строк: {loaded_rows}")
+        if loaded_rows != total_rows:
+            raise ValueError(
+                f"Несоответствие количества строк (ожидалось: {total_rows}, загружено: {loaded_rows})")
+
+        # 4. Необязательная сверка контрольной суммы debt
+        if checksum:
+            check_debt_sum(conn, schema_name, table_name_only, source.debt_sum)
+
+        # 5. Повторяющиеся счета, найденные во время загрузки, отменяют её до фиксации
+        if duplicates is not None:
+            check_duplicates(duplicates.finish(), 'reject')
 
-        # 3. Создание временного файла без заголовка
-        temp_file_path = f"{file_path}.temp"
-        try:
-            with open(file_path, 'r', encoding=encoding) as src, \
-                    open(temp_file_path, 'w', encoding=encoding) as dst:
-                next(src)  # Пропускаем заголовок
-                for line in src:
-                    dst.write(line)
-
-            # 4. Загрузка данных
-            print("Начало загрузки данных...")
-            with open(temp_file_path, 'r', encoding=encoding) as f:
-                with conn.cursor() as cursor:
-                    cursor.copy_expert(
-                        sql.SQL("""
-                            COPY {schema}.{table} (
-                                account_number, full_name, address, 
-                                period_year, period_month, meter_reading, debt
-                            ) FROM STDIN WITH (FORMAT csv, DELIMITER '\t')
-                        """).format(
-                            schema=sql.Identifier(schema_name),
-                            table=sql.Identifier(table_name_only)
-                        ),
-                        f
-                    )
-            print("Данные успешно загружены")
+        return {
+            "rows": loaded_rows,
+            "rejected_rows": source.rejected
+        }
 
-            # 5. Проверка количества загруженных строк
-            with conn.cursor() as cursor:
-                cursor.execute(sql.SQL("""
-                    SELECT COUNT(*) FROM {schema}.{table}
-                """).format(
-                    schema=sql.Identifier(schema_name),
-                    table=sql.Identifier(table_name_only))
-                )
-                loaded_rows = cursor.fetchone()[0]
-                print(f"Загружено строк: {loaded_rows}")
+    except Exception as e:
+        print(f"Ошибка при загрузке данных: {str(e)}")
+        raise
 
-                if loaded_rows != total_rows:
-                    raise ValueError(
-                        f"Несоответствие количества строк (ожидалось: {total_rows}, загружено: {loaded_rows})")
 
-            return True
+def copy_file_range(conn, file_path, schema_name, table_name, encoding, start, end, worker_num,
+                    checksum=False, copy_format=COPY_FORMAT, text_encoding='utf-8'):
+    """Загружает байтовый диапазон файла в таблицу одним COPY без фиксации транзакции.
+
+    Returns:
+        dict: Номер потока, число строк и байт, время и скорость загрузки диапазона.
+    """
+    start_time = time.time()
+    with CopySourceStream(file_path, encoding, skip_header=(start == 0), checksum=checksum,
+                          start=start, end=end, copy_format=copy_format, text_encoding=text_encoding) as source:
+        with conn.cursor() as cursor:
+            loaded_rows = copy_from_stream(cursor, build_copy_sql(schema_name, table_name, copy_format), source)
+    if loaded_rows != source.rows:
+        raise ValueError(
+            f"Поток {worker_num}: несоответствие количества строк "
+            f"(ожидалось: {source.rows}, загружено: {loaded_rows})")
+    if checksum:
+        # Незафиксированные строки других потоков не видны, сумма считается только по своему диапазону
+        check_debt_sum(conn, schema_name, table_name, source.debt_sum)
+    elapsed = time.time() - start_time
+    return {
+        "worker": worker_num,
+        "rows": loaded_rows,
+        "bytes": end - start,
+        "seconds": elapsed,
+        "rows_per_sec": loaded_rows / elapsed if elapsed else 0.0,
+        "mb_per_sec": (end - start) / 1024 / 1024 / elapsed if elapsed else 0.0
+    }
+
+
+def get_max_prepared_transactions(conn):
+    """Возвращает настройку сервера max_prepared_transactions (0 - двухфазная фиксация недоступна)."""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT current_setting('max_prepared_transactions')::INT")
+        return cursor.fetchone()[0]
+
+
+def get_parallel_gid_prefix(schema_name, table_name):
+    """Префикс идентификаторов подготовленных транзакций параллельной загрузки таблицы."""
+    return f"{PARALLEL_GID_PREFIX}:{schema_name}.{table_name}:"
+
+
+def resolve_prepared_copies(conn, schema_name, table_name, commit):
+    """Завершает подготовленные транзакции прерванной параллельной загрузки таблицы.
+
+    Решение о фиксации записано битом copy_data в t_load_stages: он фиксируется после
+    подготовки всех диапазонов и до их фиксации. Если бит установлен, оставшиеся
+    транзакции фиксируются (commit=True), иначе откатываются. Выполняется вне транзакции.
+
+    Returns:
+        int: Число завершённых подготовленных транзакций.
+    """
+    prefix = get_parallel_gid_prefix(schema_name, table_name)
+    autocommit = conn.autocommit
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT gid FROM pg_prepared_xacts WHERE database = current_database() AND gid LIKE %s",
+                           (prefix.replace('_', r'\_').replace('%', r'\%') + '%',))
+            gids = [row[0] for row in cursor.fetchall()]
+            for gid in gids:
+                cursor.execute(sql.SQL("{action} PREPARED {gid}").format(
+                    action=sql.SQL("COMMIT" if commit else "ROLLBACK"),
+                    gid=sql.Literal(gid)
+                ))
+    finally:
+        conn.autocommit = autocommit
+    if gids:
+        print(f"Подготовленные транзакции прерванной загрузки {schema_name}.{table_name} "
+              f"{'зафиксированы' if commit else 'откачены'}: {len(gids)}")
+    return len(gids)
 
-        finally:
-            if os.path.exists(temp_file_path):
-                os.remove(temp_file_path)
 
+def load_data_parallel(file_path, schema_name, table_name, encoding='utf-8', workers=PARALLEL_WORKERS,
+                       checksum=False, copy_format=COPY_FORMAT, text_encoding='utf-8', on_prepared=None):
+    """Загружает файл в таблицу несколькими COPY по отдельным соединениям.
+
+    Файл делится на диапазоны по границам строк, каждый диапазон загружается своим
+    потоком из пула соединений в двухфазной транзакции. Когда все диапазоны загружены,
+    транзакции подготавливаются (PREPARE TRANSACTION), вызывается on_prepared (запись
+    решения о фиксации) и только затем все фиксируются; при ошибке любого потока до
+    этого момента откатываются все. Транзакции, оставшиеся подготовленными после сбоя,
+    завершает resolve_prepared_copies. Файл должен быть заранее проверен validate_file.
+
+    Returns:
+        dict: Число загруженных строк (отведённых строк при параллельной загрузке нет).
+    """
+    print(f"\n=== ПАРАЛЛЕЛЬНАЯ ЗАГРУЗКА ДАННЫХ ({workers} потоков) ===")
+    start_time = time.time()
+    table_name_only = table_name.split('.')[-1]
+    gid_prefix = get_parallel_gid_prefix(schema_name, table_name_only)
+    ranges = split_file_ranges(file_path, workers)
+    connection_pool = pool.ThreadedConnectionPool(len(ranges), len(ranges), **DB_PARAMS)
+    connections = [connection_pool.getconn() for _ in ranges]
+    decided = False
+    try:
+        for worker_num, conn in enumerate(connections, 1):
+            conn.tpc_begin(f"{gid_prefix}{worker_num}")
+        with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+            futures = [
+                executor.submit(copy_file_range, conn, file_path, schema_name, table_name_only, encoding,
+                                start, end, worker_num, checksum, copy_format, text_encoding)
+                for worker_num, (conn, (start, end)) in enumerate(zip(connections, ranges), 1)
+            ]
+            # result() пробрасывает первую ошибку потока; остальные потоки дорабатывают до выхода из with
+            stats = [future.result() for future in futures]
+        for conn in connections:
+            conn.tpc_prepare()
+        if on_prepared:
+            on_prepared()
+        decided = True
+        # Решение о фиксации записано: оставшиеся при сбое транзакции зафиксирует resolve_prepared_copies
+        for conn in connections:
+            conn.tpc_commit()
     except Exception as e:
-        print(f"Ошибка при загрузке данных: {str(e)}")
+        print(f"Ошибка при параллельной загрузке данных: {str(e)}")
+        if not decided:
+            for conn in connections:
+                try:
+                    conn.tpc_rollback()
+                except Exception as rollback_error:
+                    print(f"Ошибка при откате транзакции потока: {str(rollback_error)}")
         raise
+    finally:
+        for conn in connections:
+            connection_pool.putconn(conn)
+        connection_pool.closeall()
+
+    for item in stats:
+        print(f"Поток {item['worker']}: {item['rows']} строк, {item['bytes']} байт, "
+              f"{item['seconds']:.2f} сек. ({item['rows_per_sec']:.0f} строк/сек, {item['mb_per_sec']:.2f} МБ/сек)")
+    total_rows = sum(item['rows'] for item in stats)
+    elapsed = time.time() - start_time
+    print(f"Загружено строк: {total_rows}. Время: {elapsed:.2f} сек. "
+          f"({total_rows / elapsed if elapsed else 0:.0f} строк/сек)")
+    return {
+        "rows": total_rows,
+        "rejected_rows": 0
+    }
 
 
-def main(file_path, schema_name):
+def save_load_metrics(conn, schema_name, stage_log_id, metrics):
+    """Записывает показатели этапов загрузки в t_load_stages.metrics (без фиксации транзакции)."""
+    with conn.cursor() as cursor:
+        cursor.execute(sql.SQL("""
+            UPDATE {schema}.t_load_stages SET metrics = %s::jsonb WHERE id = %s
+        """).format(schema=sql.Identifier(schema_name)), (metrics.to_json(), stage_log_id))
+
+
+def load_file(conn, file_path, schema_name, file_info=None, checksum=False, workers=PARALLEL_WORKERS,
+              staging=STAGING_MODE, table_number=None, metrics=None, rejects=REJECTS_MODE, copy_format=None,
+              duplicates_policy=DUPLICATES_POLICY, resume=False, pipeline=PIPELINE_MODE, partitioned=PARTITION_MODE):
+    """Загружает файл в новую таблицу схемы через уже открытое соединение.
+
+    Таблицы логов схемы должны существовать (ensure_log_tables_exist).
+    Загрузки файла находятся по хешу содержимого: файл, уже загруженный в схему полностью,
+    отвергается. При resume=True незавершённая загрузка того же файла продолжается
+    в прежнюю таблицу с первого невыполненного этапа (prepare_resume).
+    Если файл проверен в конвейерном режиме (validate_file с pipeline=True), строки проверяются
+    во время COPY одним потоком, а любая ошибка откатывает транзакцию загрузки целиком.
+
+    Args:
+        conn: Соединение с БД.
+        file_path (str): Путь к файлу с данными.
+        schema_name (str): Имя схемы в БД.
+        file_info (dict): Результат validate_file; если не задан, файл проверяется здесь.
+        checksum (bool): Дополнительно сверить сумму debt после загрузки.
+        workers (int): Число параллельных потоков COPY (1 - обычная загрузка).
+        staging (bool): Загружать в UNLOGGED-таблицу и публиковать её после всех этапов.
+        table_number (int): Номер новой таблицы; если не задан, выделяется из последовательности реестра.
+        metrics (LoadMetrics): Сборщик показателей этапов (с уже замеренной валидацией), если есть.
+        rejects (str): Режим ошибочных строк для проверки здесь (см. REJECTS_MODE).
+        copy_format (str): Формат COPY ('csv' или 'binary'); по умолчанию - настройка организации (get_copy_format).
+        duplicates_policy (str): Обработка повторяющихся счетов для проверки здесь (см. DUPLICATES_POLICY).
+        resume (bool): Продолжить незавершённую загрузку этого файла вместо новой.
+        pipeline (bool): Конвейерная проверка для проверки здесь (см. PIPELINE_MODE).
+        partitioned (bool): Загружать в секцию секционированной таблицы схемы (см. PARTITION_MODE).
+
+    Returns:
+        dict: Имя таблицы, число строк, число отведённых и пропущенных строк, размер файла, время загрузки
+              и признаки продолжения прежней загрузки и загрузки в секцию.
+    """
+    start_time = time.time()
+    metrics = metrics or LoadMetrics()
+    if file_info is None:
+        file_info = validate_file(file_path, metrics, rejects, duplicates_policy, pipeline)
+    file_size = os.path.getsize(file_path)
+    pipeline = file_info.get('pipeline', False)
+    skip_lines, duplicate_lines = get_duplicate_line_sets(file_info.get('duplicates', {}),
+                                                          file_info.get('duplicates_policy'))
+    rejected_rows = file_info.get('rejected_rows', 0) + len(duplicate_lines)
+    # без заголовка, отведённых и пропущенных строк; при конвейере известно только после COPY
+    row_count = None if pipeline else file_info['line_count'] - 1 - rejected_rows - len(skip_lines)
+    if (rejected_rows or skip_lines) and workers > 1:
+        # Отбор строк идёт по номерам строк файла, поэтому загрузка идёт одним COPY
+        print("Файл содержит отводимые или пропускаемые строки, загрузка выполняется одним потоком")
+        workers = 1
+    if pipeline and workers > 1:
+        # Проверка всех строк должна завершиться до фиксации, а её ведёт один поток-производитель
+        print("Конвейерная загрузка выполняется одним COPY")
+        workers = 1
+    if workers > 1 and get_max_prepared_transactions(conn) < workers:
+        # Без двухфазной фиксации часть диапазонов могла бы зафиксироваться без остальных
+        print(f"На сервере max_prepared_transactions меньше числа потоков ({workers}), "
+              f"загрузка выполняется одним COPY")
+        workers = 1
+    divert = bool(rejected_rows or (pipeline and file_info.get('rejects') == 'divert'))
+    copy_format, text_encoding = get_copy_format(conn, schema_name, copy_format)
+    file_hash = file_info.get('file_hash') or get_file_hash(file_path)
+    previous_load = find_file_load(conn, schema_name, file_hash)
+    if partitioned is None:
+        partitioned = has_partitioned_table(conn, schema_name)
+    conn.commit()
+    if previous_load and previous_load['status_code'] == 1:
+        message = (f"Файл с тем же содержимым уже загружен в {schema_name}.{previous_load['table_name']} "
+                   f"(лог {previous_load['id']})")
+        print(f"\nОШИБКА: {message}")
+        raise ValueError(message)
+    if previous_load and not resume:
+        print(f"Найдена незавершённая загрузка этого файла в {schema_name}.{previous_load['table_name']} "
+              f"(лог {previous_load['id']}); выполняется новая загрузка")
+    stage_log_id = None
+    completed = 0  # Битовая карта уже выполненных этапов
+
+    try:
+        # 1. Создание таблицы (или подготовка продолжения прежней загрузки)
+        print("\n=== 1. СОЗДАНИЕ ТАБЛИЦЫ ===")
+        if previous_load:
+            # Параллельная загрузка могла прерваться между подготовкой и фиксацией диапазонов
+            for name in (previous_load['table_name'], staging_table_name(previous_load['table_name'])):
+                resolve_prepared_copies(conn, schema_name, name,
+                                        bool(previous_load['stage_bitmap'] & LOAD_STAGES['copy_data']))
+        resumed = prepare_resume(conn, schema_name, previous_load) if previous_load and resume else None
+        if resumed:
+            table_name, stage_log_id = previous_load['table_name'], previous_load['id']
+            staging, partitioned, completed = resumed['staging'], resumed['partitioned'], resumed['stage_bitmap']
+            load_table_name = staging_table_name(table_name) if staging else table_name
+        else:
+            with metrics.stage('create_table'):
+                if partitioned:
+                    ensure_partitioned_table(conn, schema_name)
+                table_name = create_new_table(conn, schema_name, get_base_table_name(schema_name), staging=staging,
+                                              table_number=table_number, partitioned=partitioned)
+                load_table_name = staging_table_name(table_name) if staging else table_name
+                stage_log_id = create_load_stage_log(conn, schema_name, table_name, file_hash, file_path)
+                update_stage_status(conn, schema_name, stage_log_id, 'create_table')
+                conn.commit()
+
+        # 2. Загрузка данных
+        print(f"\n=== 2. ЗАГРУЗКА ДАННЫХ (COPY {copy_format}) ===")
+        if completed & LOAD_STAGES['copy_data']:
+            print("Данные уже загружены, этап пропускается")
+            if row_count is None:
+                row_count = count_table_rows(conn, schema_name, load_table_name)
+        else:
+            def mark_copied():
+                update_stage_status(conn, schema_name, stage_log_id, 'copy_data')
+                conn.commit()
+
+            with metrics.stage('copy_data', file_size, row_count) as record:
+                record['copy_format'] = copy_format
+                record['pipeline'] = pipeline
+                if workers > 1:
+                    # Бит copy_data фиксируется между подготовкой и фиксацией диапазонов - это решение о фиксации
+                    copy_result = load_data_parallel(file_path, schema_name, load_table_name,
+                                                     encoding=file_info['encoding'], workers=workers,
+                                                     checksum=checksum, copy_format=copy_format,
+                                                     text_encoding=text_encoding, on_prepared=mark_copied)
+                else:
+                    copy_result = load_data_to_new_table(
+                        conn, file_path, schema_name, load_table_name, encoding=file_info['encoding'],
+                        validate=pipeline and not divert, checksum=checksum,
+                        rejects_table=rejects_table_name(table_name) if divert else None,
+                        copy_format=copy_format, text_encoding=text_encoding,
+                        skip_lines=skip_lines, duplicate_lines=duplicate_lines, pipeline=pipeline,
+                        duplicates=(AccountDuplicateFinder()
+                                    if pipeline and file_info.get('duplicates_policy') else None))
+                    mark_copied()
+                row_count, rejected_rows = copy_result['rows'], copy_result['rejected_rows']
+                record['rows'] = row_count
+
+        # 3. Построение индексов
+        print("\n=== 3. ПОСТРОЕНИЕ ИНДЕКСОВ ===")
+        if completed & LOAD_STAGES['build_indexes']:
+            print("Индексы уже построены, этап пропускается")
+        else:
+            with metrics.stage('build_indexes', rows=row_count):
+                build_table_indexes(conn, schema_name, load_table_name)
+                update_stage_status(conn, schema_name, stage_log_id, 'build_indexes')
+                conn.commit()
+
+        # 4. Финализация
+        print("\n=== 4. ФИНАЛИЗАЦИЯ ===")
+        with metrics.stage('finalize'):
+            if staging:
+                publish_table(conn, schema_name, stage_log_id, table_name, row_count, partitioned=partitioned)
+            else:
+                if partitioned:
+                    attach_partition(conn, schema_name, table_name)
+                set_registry_status(conn, schema_name, table_name, 1, row_count)
+                update_stage_status(conn, schema_name, stage_log_id, 'finalize')
+                conn.commit()
+        print("Все этапы завершены успешно")
+        save_load_metrics(conn, schema_name, stage_log_id, metrics)
+        conn.commit()
+
+    except Exception as e:
+        print(f"\nОШИБКА: {str(e)}")
+        # Откатываем прерванную транзакцию, иначе запись в лог тоже завершится ошибкой
+        conn.rollback()
+        if stage_log_id is not None:
+            try:
+                set_registry_status(conn, schema_name, table_name, 2)
+                update_stage_status(conn, schema_name, stage_log_id, 'finalize', False, str(e))
+                save_load_metrics(conn, schema_name, stage_log_id, metrics)
+                conn.commit()
+            except Exception as log_error:
+                print(f"Ошибка при записи лога: {str(log_error)}")
+                conn.rollback()
+        raise
+
+    return {
+        "table_name": table_name,
+        "rows": row_count,
+        "rejected_rows": rejected_rows,
+        "skipped_rows": len(skip_lines),
+        "bytes": file_size,
+        "seconds": time.time() - start_time,
+        "resumed": bool(resumed),
+        "partitioned": partitioned,
+        "metrics": metrics.stages
+    }
+
+
+def main(file_path, schema_name, checksum=False, workers=PARALLEL_WORKERS, staging=STAGING_MODE,
+         rejects=REJECTS_MODE, copy_format=None, duplicates_policy=DUPLICATES_POLICY, resume=False,
+         pipeline=PIPELINE_MODE, partitioned=PARTITION_MODE):
     """Основная функция для загрузки данных из файла в новую таблицу.
 
     Args:
         file_path (str): Путь к файлу с данными.
         schema_name (str): Имя схемы в БД.
+        checksum (bool): Дополнительно сверить сумму debt после загрузки.
+        workers (int): Число параллельных потоков COPY (1 - обычная загрузка).
+        staging (bool): Загружать в UNLOGGED-таблицу и публиковать её после всех этапов.
+        rejects (str): Режим ошибочных строк: None, 'report' или 'divert' (см. REJECTS_MODE).
+        copy_format (str): Формат COPY; по умолчанию - настройка организации (COPY_FORMAT_BY_SCHEMA).
+        duplicates_policy (str): Обработка повторяющихся счетов: 'reject', 'keep_last' или 'divert'.
+        resume (bool): Продолжить незавершённую загрузку этого файла с первого невыполненного этапа.
+        pipeline (bool): Проверять строки во время COPY в отдельном потоке вместо предварительного прохода.
+        partitioned (bool): Загружать в секцию таблицы t_<ORG>; None - если она уже есть в схеме.
 
     Returns:
         int: 0 при успешном выполнении, 1 при ошибке.
     """
     total_start_time = time.time()
     print_system_info()
-    validate_file(file_path)
+    metrics = LoadMetrics()
+    file_info = validate_file(file_path, metrics, rejects, duplicates_policy, pipeline)
 
     conn = None
     try:
-        conn = psycopg2.connect(
-            user=user,
-            password=password,
-            host=host,
-            port=port,
-            database=database
-        )
+        conn = psycopg2.connect(**DB_PARAMS)
         conn.autocommit = False
 
         ensure_log_tables_exist(conn, schema_name)
         print_db_info(conn)
-        base_table_name = "t_GAZ"
 
         try:
-            # 1. Создание таблицы
-            print("\n=== 1. СОЗДАНИЕ ТАБЛИЦЫ ===")
-            table_name = create_new_table(conn, schema_name, base_table_name)
-            stage_log_id = create_load_stage_log(conn, schema_name, table_name)
-            update_stage_status(conn, schema_name, stage_log_id, 'create_table')
-            conn.commit()
-
-            # 2. Загрузка данных
-            print("\n=== 2. ЗАГРУЗКА ДАННЫХ ===")
-            success = load_data_to_new_table(conn, file_path, schema_name, table_name)
-            update_stage_status(conn, schema_name, stage_log_id, 'copy_data', success)
-            conn.commit()
-
-            # 3. Финализация
-            print("\n=== 3. ФИНАЛИЗАЦИЯ ===")
-            if success:
-                update_stage_status(conn, schema_name, stage_log_id, 'finalize', success)
-                conn.commit()
-            print("Все этапы завершены успешно")
-
-        except Exception as e:
-            print(f"\nОШИБКА: {str(e)}")
-            if 'stage_log_id' in locals():
-                try:
-                    update_stage_status(conn, schema_name, stage_log_id, 'finalize', False, str(e))
-                    conn.commit()
-                except Exception as log_error:
-                    print(f"Ошибка при записи лога: {str(log_error)}")
-            if conn.status == psycopg2.extensions.STATUS_IN_TRANSACTION:
-                conn.rollback()
+            load_file(conn, file_path, schema_name, file_info=file_info, checksum=checksum, workers=workers,
+                      staging=staging, metrics=metrics, copy_format=copy_format, resume=resume,
+                      partitioned=partitioned)
+        except Exception:
+            # Ошибка уже выведена и записана в лог этапов
             return 1
 
     except Exception as e:
@@ -547,4 +2565,4 @@ def main(file_path, schema_name):
 if __name__ == "__main__":
     file_path = "GAZ.tsv"
     schema_name = "GAZ"
-    main(file_path, schema_name)
\ No newline at end of file
+    main(file_path, schema_name)
@@ -0,0 +1,218 @@
+import os
+import time
+import psycopg2
+from psycopg2 import sql
+from db_copy7 import (
+    ACCOUNT_NUMBER_LENGTH, DATA_COLUMNS, DB_PARAMS,
+    CopySourceStream, LoadMetrics, build_copy_sql, copy_from_stream, create_load_stage_log, ensure_log_tables_exist,
+    get_base_table_name, print_db_info, print_system_info, save_load_metrics, update_stage_status, validate_file,
+    with_transaction
+)
+
+DELTA_TEMP_TABLE = 't_delta_upload'  # Временная таблица для строк дельта-выгрузки
+
+
+def get_current_table_name(schema_name):
+    """Возвращает имя таблицы текущего состояния счетов организации (t_<ORG>_current)."""
+    return f"{get_base_table_name(schema_name)}_current"
+
+
+@with_transaction
+def ensure_current_table(conn, schema_name):
+    """Создаёт таблицу текущего состояния счетов с уникальным ключом по account_number.
+
+    Типы и порядок столбцов те же, что у таблиц t_<ORG>_N (create_new_table).
+    """
+    table_name = get_current_table_name(schema_name)
+    seq_name = f"s_{table_name}_id"
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(sql.SQL("""
+                CREATE SEQUENCE IF NOT EXISTS {schema}.{seq_name}
+            """).format(
+                schema=sql.Identifier(schema_name),
+                seq_name=sql.Identifier(seq_name)
+            ))
+
+            cursor.execute(sql.SQL("""
+                CREATE TABLE IF NOT EXISTS {schema}.{table_name} (
+                    id BIGINT NOT NULL DEFAULT nextval('{schema}.{seq_name}'::regclass),
+                    date_insert TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    date_update TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    debt BIGINT NOT NULL,
+                    status SMALLINT NOT NULL DEFAULT 0,
+                    period_year SMALLINT NOT NULL,
+                    period_month SMALLINT NOT NULL,
+                    account_number VARCHAR({account_length}) NOT NULL,
+                    meter_reading VARCHAR NOT NULL,
+                    full_name VARCHAR NOT NULL,
+                    address VARCHAR NOT NULL,
+                    CONSTRAINT {pk_name} PRIMARY KEY (id),
+                    CONSTRAINT {uq_name} UNIQUE (account_number)
+                )
+            """).format(
+                schema=sql.Identifier(schema_name),
+                table_name=sql.Identifier(table_name),
+                seq_name=sql.Identifier(seq_name),
+                account_length=sql.Literal(ACCOUNT_NUMBER_LENGTH),
+                pk_name=sql.Identifier(f"pk_{table_name}"),
+                uq_name=sql.Identifier(f"uq_{table_name}_account_number")
+            ))
+        print(f"Таблица текущего состояния {schema_name}.{table_name} проверена/создана")
+        return table_name
+    except Exception as e:
+        print(f"Ошибка при создании таблицы текущего состояния: {str(e)}")
+        raise
+
+
+def upsert_delta(conn, schema_name, table_name):
+    """Переносит изменившиеся строки из временной таблицы в таблицу текущего состояния.
+
+    Новые счета вставляются, существующие обновляются только при отличии хотя бы
+    одного поля. Счета, отсутствующие в выгрузке, не затрагиваются.
+
+    Returns:
+        tuple: (вставлено, обновлено).
+    """
+    update_columns = [column for column in DATA_COLUMNS if column != 'account_number']
+    with conn.cursor() as cursor:
+        cursor.execute(sql.SQL("""
+            WITH changed AS (
+                INSERT INTO {target} AS t ({columns})
+                SELECT {columns} FROM {source}
+                ON CONFLICT (account_number) DO UPDATE
+                SET {assignments}, date_update = CURRENT_TIMESTAMP
+                WHERE ({target_values}) IS DISTINCT FROM ({excluded_values})
+                RETURNING (xmax = 0) AS inserted
+            )
+            SELECT COUNT(*) FILTER (WHERE inserted), COUNT(*) FILTER (WHERE NOT inserted) FROM changed
+        """).format(
+            target=sql.Identifier(schema_name, table_name),
+            source=sql.Identifier(DELTA_TEMP_TABLE),
+            columns=sql.SQL(', ').join(map(sql.Identifier, DATA_COLUMNS)),
+            assignments=sql.SQL(', ').join(
+                sql.SQL("{column} = EXCLUDED.{column}").format(column=sql.Identifier(column))
+                for column in update_columns),
+            target_values=sql.SQL(', ').join(
+                sql.SQL("t.{column}").format(column=sql.Identifier(column)) for column in update_columns),
+            excluded_values=sql.SQL(', ').join(
+                sql.SQL("EXCLUDED.{column}").format(column=sql.Identifier(column)) for column in update_columns)
+        ))
+        return cursor.fetchone()
+
+
+def load_delta(conn, file_path, schema_name, file_info=None, metrics=None):
+    """Загружает файл в таблицу текущего состояния организации как дельту.
+
+    Данные копируются во временную таблицу, затем одним INSERT ... ON CONFLICT
+    применяются только изменившиеся строки. Загрузка и применение выполняются
+    в одной транзакции вместе с отметкой этапов в t_load_stages.
+
+    Returns:
+        dict: Число вставленных, обновлённых и неизменных строк и время загрузки.
+    """
+    start_time = time.time()
+    metrics = metrics or LoadMetrics()
+    if file_info is None:
+        file_info = validate_file(file_path, metrics)
+    stage_log_id = None
+
+    try:
+        # 1. Таблица текущего состояния
+        print("\n=== 1. ТАБЛИЦА ТЕКУЩЕГО СОСТОЯНИЯ ===")
+        table_name = ensure_current_table(conn, schema_name)
+        stage_log_id = create_load_stage_log(conn, schema_name, table_name)
+        update_stage_status(conn, schema_name, stage_log_id, 'create_table')
+        conn.commit()
+
+        # 2. Загрузка во временную таблицу
+        print("\n=== 2. ЗАГРУЗКА ДЕЛЬТЫ ===")
+        with metrics.stage('copy_data', os.path.getsize(file_path)) as record, conn.cursor() as cursor:
+            cursor.execute(sql.SQL("""
+                CREATE TEMP TABLE {temp_table} ON COMMIT DROP AS
+                SELECT {columns} FROM {target} WITH NO DATA
+            """).format(
+                temp_table=sql.Identifier(DELTA_TEMP_TABLE),
+                columns=sql.SQL(', ').join(map(sql.Identifier, DATA_COLUMNS)),
+                target=sql.Identifier(schema_name, table_name)
+            ))
+            with CopySourceStream(file_path, file_info['encoding']) as source:
+                loaded_rows = copy_from_stream(cursor, build_copy_sql(None, DELTA_TEMP_TABLE), source)
+            record['rows'] = loaded_rows
+        if loaded_rows != source.rows:
+            raise ValueError(
+                f"Несоответствие количества строк (ожидалось: {source.rows}, загружено: {loaded_rows})")
+        print(f"Строк в выгрузке: {loaded_rows}")
+
+        # 3. Применение изменений
+        print("\n=== 3. ПРИМЕНЕНИЕ ИЗМЕНЕНИЙ ===")
+        with metrics.stage('apply_delta', rows=loaded_rows):
+            inserted, updated = upsert_delta(conn, schema_name, table_name)
+        unchanged = loaded_rows - inserted - updated
+        for stage_name in ('copy_data', 'build_indexes', 'finalize'):
+            update_stage_status(conn, schema_name, stage_log_id, stage_name)
+        save_load_metrics(conn, schema_name, stage_log_id, metrics)
+        conn.commit()
+        print(f"Вставлено: {inserted}, обновлено: {updated}, без изменений: {unchanged}")
+
+    except Exception as e:
+        print(f"\nОШИБКА: {str(e)}")
+        conn.rollback()
+        if stage_log_id is not None:
+            try:
+                update_stage_status(conn, schema_name, stage_log_id, 'finalize', False, str(e))
+                save_load_metrics(conn, schema_name, stage_log_id, metrics)
+                conn.commit()
+            except Exception as log_error:
+                print(f"Ошибка при записи лога: {str(log_error)}")
+                conn.rollback()
+        raise
+
+    return {
+        "table_name": table_name,
+        "rows": loaded_rows,
+        "inserted": inserted,
+        "updated": updated,
+        "unchanged": unchanged,
+        "seconds": time.time() - start_time
+    }
+
+
+def main(file_path, schema_name):
+    """Загружает дельта-выгрузку организации в таблицу текущего состояния.
+
+    Returns:
+        int: 0 при успешном выполнении, 1 при ошибке.
+    """
+    total_start_time = time.time()
+    print_system_info()
+    metrics = LoadMetrics()
+    file_info = validate_file(file_path, metrics)
+
+    conn = None
+    try:
+        conn = psycopg2.connect(**DB_PARAMS)
+        conn.autocommit = False
+
+        ensure_log_tables_exist(conn, schema_name)
+        print_db_info(conn)
+
+        try:
+            load_delta(conn, file_path, schema_name, file_info=file_info, metrics=metrics)
+        except Exception:
+            return 1
+
+    except Exception as e:
+        print(f"\nКРИТИЧЕСКАЯ ОШИБКА: {str(e)}")
+        return 1
+    finally:
+        if conn:
+            conn.close()
+        print(f"\nОбщее время выполнения: {time.time() - total_start_time:.2f} сек.")
+    return 0
+
+
+if __name__ == "__main__":
+    file_path = "GAZ.tsv"
+    schema_name = "GAZ"
+    main(file_path, schema_name)
@@ -0,0 +1,367 @@
+import argparse
+import asyncio
+import os
+import shutil
+import signal
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import psycopg2
+from psycopg2 import pool
+from create_schema_helper import SchemaCreator
+from db_batch import DATA_FILE_EXTENSIONS
+from db_copy7 import (
+    COPY_FORMATS, DB_PARAMS, DUPLICATES_POLICIES, DUPLICATES_POLICY, PIPELINE_MODE, REJECTS_MODE, STAGING_MODE,
+    ensure_log_tables_exist, load_file, print_system_info
+)
+
+INGEST_INBOX_DIR = 'inbox'  # Входящий каталог: <каталог>/<мнемокод>/<файл>
+INGEST_DONE_DIR = 'done'  # Сюда переносятся загруженные файлы: <каталог>/<мнемокод>/<файл>
+INGEST_FAILED_DIR = 'failed'  # Сюда переносятся отвергнутые файлы (рядом - <файл>.error.txt с причиной)
+INGEST_MAX_CONCURRENT = 4  # Одновременных загрузок всего (и соединений в пуле для них)
+# Одновременных загрузок одной организации. Больше 1 безопасно для реестра: смена текущей таблицы
+# идёт под блокировкой реестра и только вперёд (set_registry_status). Но текущей станет таблица с большим
+# номером (созданная позже), а не обязательно из более нового файла, поэтому по умолчанию файлы
+# одной организации загружаются по очереди, в порядке поступления
+INGEST_MAX_PER_ORG = 1
+INGEST_QUEUE_LIMIT = 100  # Файлов в очередях всего; остальные ждут во входящем каталоге
+INGEST_ORG_QUEUE_LIMIT = 20  # Файлов в очереди одной организации
+INGEST_POLL_INTERVAL = 5.0  # Секунд между просмотрами входящего каталога
+INGEST_STABLE_SECONDS = 10.0  # Файл берётся в работу, если не изменялся столько секунд (дописан)
+INGEST_MNEMONIC_CACHE_SECONDS = 300.0  # Сколько секунд помнить результат проверки мнемокода
+INGEST_SHUTDOWN_TIMEOUT = 300.0  # Сколько ждать текущие загрузки при остановке, затем они отменяются
+
+
+def mnemonic_exists(conn, mnemonic):
+    """Проверяет мнемокод организации по main.t_organizations теми же правилами, что и SchemaCreator."""
+    if not SchemaCreator.is_valid_mnemonic(mnemonic):
+        return False
+    with conn.cursor() as cursor:
+        return SchemaCreator.find_mnemonic(cursor, mnemonic)
+
+
+def move_file(file_path, target_dir, schema_name, error_message=None):
+    """Переносит файл в <target_dir>/<схема>/ (при совпадении имени добавляет время) и записывает причину ошибки.
+
+    Returns:
+        str: Новый путь файла.
+    """
+    os.makedirs(os.path.join(target_dir, schema_name), exist_ok=True)
+    target_path = os.path.join(target_dir, schema_name, os.path.basename(file_path))
+    if os.path.exists(target_path):
+        target_path = f"{target_path}.{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    shutil.move(file_path, target_path)
+    if error_message:
+        with open(f"{target_path}.error.txt", 'w', encoding='utf-8') as f:
+            f.write(error_message + '\n')
+    return target_path
+
+
+class IngestDaemon:
+    """Служба загрузки файлов, которые организации кладут во входящий каталог.
+
+    Каталог просматривается каждые poll_interval секунд; файлы <мнемокод>/<файл> проверенных
+    по t_organizations организаций ставятся в очередь своей организации (FIFO по времени изменения).
+    Загрузки (load_file) выполняются в пуле потоков на соединениях общего пула: не более
+    max_concurrent всего и max_per_org на организацию. Организации обслуживаются по кругу,
+    поэтому организация с большим числом файлов не задерживает остальные. Очереди ограничены
+    (queue_limit всего, org_queue_limit на организацию): лишние файлы остаются во входящем каталоге.
+
+    При остановке (SIGINT/SIGTERM) новые загрузки не запускаются, текущие дорабатывают
+    shutdown_timeout секунд, затем их запросы отменяются: транзакция откатывается, этап
+    отмечается ошибкой в t_load_stages, файл остаётся во входящем каталоге и при следующем
+    запуске загрузка продолжается с первого невыполненного этапа (resume).
+    """
+
+    def __init__(self, inbox=INGEST_INBOX_DIR, done_dir=INGEST_DONE_DIR, failed_dir=INGEST_FAILED_DIR,
+                 max_concurrent=INGEST_MAX_CONCURRENT, max_per_org=INGEST_MAX_PER_ORG,
+                 queue_limit=INGEST_QUEUE_LIMIT, org_queue_limit=INGEST_ORG_QUEUE_LIMIT,
+                 poll_interval=INGEST_POLL_INTERVAL, stable_seconds=INGEST_STABLE_SECONDS,
+                 shutdown_timeout=INGEST_SHUTDOWN_TIMEOUT, load_options=None):
+        self.inbox = inbox
+        self.done_dir = done_dir
+        self.failed_dir = failed_dir
+        self.max_concurrent = max_concurrent
+        self.max_per_org = max_per_org
+        self.queue_limit = queue_limit
+        self.org_queue_limit = org_queue_limit
+        self.poll_interval = poll_interval
+        self.stable_seconds = stable_seconds
+        self.shutdown_timeout = shutdown_timeout
+        self.load_options = load_options or {}
+        self.queues = {}  # Мнемокод -> очередь путей файлов
+        self.order = deque()  # Порядок обхода организаций при выборе следующей загрузки
+        self.active = {}  # Мнемокод -> число текущих загрузок
+        self.tasks = set()
+        self.known = set()  # Файлы в очередях и в работе
+        self.connections = {}  # Путь файла -> соединение текущей загрузки (для отмены)
+        self.checked_schemas = set()
+        self._schema_lock = threading.Lock()
+        self.mnemonics = {}  # Мнемокод -> (существует, время проверки)
+        self.stats = {"loaded": 0, "failed": 0, "interrupted": 0}
+        self._stopping = False
+        self._wakeup = None
+        self._pool = None
+        self._executor = None
+
+    def queued_count(self):
+        return sum(len(files) for files in self.queues.values())
+
+    def request_stop(self):
+        """Запрашивает плавную остановку (обработчик сигналов)."""
+        if self._stopping:
+            print("\nПовторный сигнал остановки: отмена текущих загрузок")
+            self.cancel_running()
+            return
+        print("\nОстановка: новые загрузки не запускаются, ожидание текущих...")
+        self._stopping = True
+        self._wakeup.set()
+
+    def cancel_running(self):
+        """Отменяет запросы текущих загрузок; load_file откатывает их и записывает ошибку этапа."""
+        for file_path, conn in list(self.connections.items()):
+            print(f"Отмена загрузки {file_path}")
+            conn.cancel()
+
+    def check_mnemonic(self, mnemonic):
+        """Проверяет мнемокод с кешированием результата на INGEST_MNEMONIC_CACHE_SECONDS."""
+        cached = self.mnemonics.get(mnemonic)
+        if cached and time.time() - cached[1] < INGEST_MNEMONIC_CACHE_SECONDS:
+            return cached[0]
+        conn = self._pool.getconn()
+        try:
+            exists = mnemonic_exists(conn, mnemonic)
+        finally:
+            self.release_connection(conn)
+        if not exists:
+            print(f"Мнемокод {mnemonic} не найден в t_organizations")
+        self.mnemonics[mnemonic] = (exists, time.time())
+        return exists
+
+    def scan(self):
+        """Просматривает входящий каталог и ставит готовые файлы в очереди (выполняется в потоке).
+
+        Returns:
+            int: Число поставленных в очередь файлов.
+        """
+        added = 0
+        now = time.time()
+        for org_entry in sorted(os.scandir(self.inbox), key=lambda entry: entry.name):
+            if not org_entry.is_dir():
+                continue
+            schema_name = org_entry.name
+            files = []
+            for entry in os.scandir(org_entry.path):
+                if (entry.is_file() and entry.name.lower().endswith(DATA_FILE_EXTENSIONS)
+                        and entry.path not in self.known):
+                    mtime = entry.stat().st_mtime
+                    if now - mtime >= self.stable_seconds:  # Файл ещё может дописываться
+                        files.append((mtime, entry.path))
+            if not files:
+                continue
+            if not self.check_mnemonic(schema_name):
+                for _, file_path in files:
+                    move_file(file_path, self.failed_dir, schema_name,
+                              f"Мнемокод {schema_name} не найден в t_organizations")
+                    self.stats['failed'] += 1
+                continue
+
+            org_queue = self.queues.setdefault(schema_name, deque())
+            if schema_name not in self.order:
+                self.order.append(schema_name)
+            for _, file_path in sorted(files):
+                # Ограничение очередей: остальные файлы подождут во входящем каталоге
+                if len(org_queue) >= self.org_queue_limit or self.queued_count() >= self.queue_limit:
+                    break
+                org_queue.append(file_path)
+                self.known.add(file_path)
+                added += 1
+        return added
+
+    def next_file(self):
+        """Выбирает следующую загрузку по кругу организаций с учётом лимита на организацию.
+
+        Returns:
+            tuple: (мнемокод, путь файла) или None, если запускать нечего.
+        """
+        for _ in range(len(self.order)):
+            schema_name = self.order[0]
+            self.order.rotate(-1)
+            if self.queues[schema_name] and self.active.get(schema_name, 0) < self.max_per_org:
+                return schema_name, self.queues[schema_name].popleft()
+        return None
+
+    def dispatch(self):
+        """Запускает загрузки, пока есть свободные места и подходящие файлы."""
+        loop = asyncio.get_running_loop()
+        while not self._stopping and len(self.tasks) < self.max_concurrent:
+            item = self.next_file()
+            if item is None:
+                return
+            schema_name, file_path = item
+            self.active[schema_name] = self.active.get(schema_name, 0) + 1
+            task = asyncio.ensure_future(loop.run_in_executor(self._executor, self.run_load, schema_name, file_path))
+            task.add_done_callback(lambda done, schema_name=schema_name, file_path=file_path:
+                                   self.on_load_done(done, schema_name, file_path))
+            self.tasks.add(task)
+
+    def release_connection(self, conn):
+        """Возвращает соединение в пул после отката; соединение, на котором откат не удался
+        (разорвано или отменено посреди COPY), закрывается, чтобы пул не выдал его снова."""
+        try:
+            conn.rollback()
+        except psycopg2.Error as e:
+            print(f"Соединение закрыто после ошибки отката: {str(e)}")
+            self._pool.putconn(conn, close=True)
+        else:
+            self._pool.putconn(conn)
+
+    def run_load(self, schema_name, file_path):
+        """Загружает файл через соединение общего пула (выполняется в потоке)."""
+        conn = self._pool.getconn()
+        self.connections[file_path] = conn
+        try:
+            conn.autocommit = False
+            with self._schema_lock:
+                if schema_name not in self.checked_schemas:
+                    ensure_log_tables_exist(conn, schema_name)
+                    self.checked_schemas.add(schema_name)
+            return load_file(conn, file_path, schema_name, resume=True, **self.load_options)
+        finally:
+            del self.connections[file_path]
+            self.release_connection(conn)
+
+    def on_load_done(self, task, schema_name, file_path):
+        """Разбирает результат загрузки: переносит файл или оставляет его для продолжения."""
+        self.tasks.discard(task)
+        self.active[schema_name] -= 1
+        error = task.exception()
+        try:
+            if error is None:
+                result = task.result()
+                move_file(file_path, self.done_dir, schema_name)
+                self.stats['loaded'] += 1
+                print(f"Загружен {file_path}: {schema_name}.{result['table_name']}, {result['rows']} строк, "
+                      f"{result['seconds']:.2f} сек.")
+            elif self._stopping:
+                # Прервана остановкой: этап отмечен в t_load_stages, файл продолжится при следующем запуске
+                self.stats['interrupted'] += 1
+                print(f"Загрузка {file_path} прервана остановкой и будет продолжена при следующем запуске")
+            else:
+                self.stats['failed'] += 1
+                print(f"Файл {file_path} не загружен: {str(error)}")
+                move_file(file_path, self.failed_dir, schema_name, str(error))
+        except OSError as e:
+            print(f"Ошибка переноса файла {file_path}: {str(e)}")
+        finally:
+            self.known.discard(file_path)
+            self._wakeup.set()
+
+    async def shutdown(self):
+        """Дожидается текущих загрузок, по таймауту отменяет их запросы."""
+        if not self.tasks:
+            return
+        _, pending = await asyncio.wait(set(self.tasks), timeout=self.shutdown_timeout)
+        if pending:
+            print(f"Загрузки не завершились за {self.shutdown_timeout:.0f} сек., отмена")
+            self.cancel_running()
+            await asyncio.wait(pending)
+
+    async def run(self, once=False):
+        """Основной цикл службы; при once=True завершается, когда входящий каталог обработан."""
+        loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.request_stop)
+            except (NotImplementedError, RuntimeError):
+                pass  # Windows: остановка по Ctrl+C через KeyboardInterrupt
+        # Соединения пула: по одному на загрузку и одно для проверки мнемокодов
+        self._pool = pool.ThreadedConnectionPool(1, self.max_concurrent + 1, **DB_PARAMS)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix='ingest')
+        os.makedirs(self.inbox, exist_ok=True)
+        print(f"\n=== СЛУЖБА ЗАГРУЗКИ: каталог {self.inbox}, загрузок до {self.max_concurrent} "
+              f"(на организацию до {self.max_per_org}) ===")
+        try:
+            while not self._stopping:
+                if self.queued_count() < self.queue_limit:
+                    try:
+                        added = await loop.run_in_executor(None, self.scan)
+                    except Exception as e:
+                        # Недоступность БД или каталога не останавливает службу: повтор через poll_interval
+                        print(f"Ошибка просмотра входящего каталога: {str(e)}")
+                        added = 0
+                    if added:
+                        print(f"В очередь поставлено файлов: {added}, в очередях: {self.queued_count()}")
+                self.dispatch()
+                if once and not self.tasks and not self.queued_count():
+                    break
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+            await self.shutdown()
+        finally:
+            self._executor.shutdown(wait=True)
+            self._pool.closeall()
+        print(f"\nСлужба остановлена. Загружено: {self.stats['loaded']}, с ошибкой: {self.stats['failed']}, "
+              f"прервано: {self.stats['interrupted']}")
+        return self.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Служба загрузки файлов задолженности из входящего каталога")
+    parser.add_argument("--inbox", default=INGEST_INBOX_DIR, help="Входящий каталог (<каталог>/<мнемокод>/<файл>)")
+    parser.add_argument("--done-dir", default=INGEST_DONE_DIR, help="Каталог загруженных файлов")
+    parser.add_argument("--failed-dir", default=INGEST_FAILED_DIR, help="Каталог отвергнутых файлов")
+    parser.add_argument("--max-concurrent", type=int, default=INGEST_MAX_CONCURRENT,
+                        help="Одновременных загрузок всего")
+    parser.add_argument("--max-per-org", type=int, default=INGEST_MAX_PER_ORG,
+                        help="Одновременных загрузок одной организации (больше 1 - файлы могут "
+                             "опубликоваться не в порядке поступления)")
+    parser.add_argument("--queue-limit", type=int, default=INGEST_QUEUE_LIMIT, help="Файлов в очередях всего")
+    parser.add_argument("--org-queue-limit", type=int, default=INGEST_ORG_QUEUE_LIMIT,
+                        help="Файлов в очереди одной организации")
+    parser.add_argument("--poll-interval", type=float, default=INGEST_POLL_INTERVAL,
+                        help="Секунд между просмотрами каталога")
+    parser.add_argument("--stable-seconds", type=float, default=INGEST_STABLE_SECONDS,
+                        help="Файл берётся в работу, если не изменялся столько секунд")
+    parser.add_argument("--shutdown-timeout", type=float, default=INGEST_SHUTDOWN_TIMEOUT,
+                        help="Секунд ожидания текущих загрузок при остановке")
+    parser.add_argument("--once", action="store_true", help="Обработать входящий каталог и завершиться")
+    parser.add_argument("--checksum", action="store_true", help="Сверять сумму debt после загрузки")
+    parser.add_argument("--staging", action="store_true", default=STAGING_MODE,
+                        help="Загружать через UNLOGGED-таблицу с публикацией")
+    parser.add_argument("--rejects", choices=('report', 'divert'), default=REJECTS_MODE,
+                        help="Собирать ошибочные строки в отчёт (report) или отводить их в таблицу отказов (divert)")
+    parser.add_argument("--copy-format", choices=COPY_FORMATS,
+                        help="Формат COPY (по умолчанию - настройка организации)")
+    parser.add_argument("--duplicates", choices=DUPLICATES_POLICIES, default=DUPLICATES_POLICY,
+                        help="Обработка повторяющихся счетов")
+    parser.add_argument("--pipeline", action="store_true", default=PIPELINE_MODE,
+                        help="Проверять строки во время COPY (конвейер)")
+    args = parser.parse_args()
+    if args.max_concurrent < 1 or args.max_per_org < 1:
+        parser.error("--max-concurrent и --max-per-org должны быть не меньше 1")
+
+    print_system_info()
+    daemon = IngestDaemon(args.inbox, args.done_dir, args.failed_dir, args.max_concurrent, args.max_per_org,
+                          args.queue_limit, args.org_queue_limit, args.poll_interval, args.stable_seconds,
+                          args.shutdown_timeout,
+                          load_options={
+                              "checksum": args.checksum,
+                              "staging": args.staging,
+                              "rejects": args.rejects,
+                              "copy_format": args.copy_format,
+                              "duplicates_policy": args.duplicates,
+                              "pipeline": args.pipeline
+                          })
+    stats = asyncio.run(daemon.run(once=args.once))
+    return 1 if stats['failed'] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
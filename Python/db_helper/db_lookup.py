@@ -0,0 +1,378 @@
+import argparse
+import csv
+import json
+import select
+import threading
+import time
+from collections import OrderedDict
+from itertools import islice
+import psycopg2
+from psycopg2 import sql
+from db_copy7 import (
+    DATA_COLUMNS, DB_PARAMS, LOOKUP_COLUMNS, PUBLISH_CHANNEL, REGISTRY_TABLE, UPLOAD_HEADER,
+    get_base_table_name, get_catalog_table_number, is_valid_account_number, sql_quote_ident, unquote_csv_field
+)
+
+LOOKUP_CACHE_SIZE = 100_000  # Сколько результатов поиска (включая "не найден") держать в LRU-кэше
+LOOKUP_CACHE_TTL = 300  # Срок жизни результата в кэше, сек.
+TABLE_CACHE_TTL = 600  # Срок жизни текущей таблицы схемы, сек. (страховка на случай потерянного уведомления)
+LOOKUP_BATCH_SIZE = 10_000  # Счетов в одном запросе пакетного поиска (account_number = ANY(массив))
+NOT_FOUND_SUFFIX = '.not_found.txt'  # Список ненайденных счетов пишется рядом с результатом: <файл><суффикс>
+PERIOD_MONTH_INDEX = DATA_COLUMNS.index('period_month')  # Месяц SMALLINT выводится двумя цифрами, как в выгрузке
+
+
+def normalize_account_number(account_number):
+    """Приводит номер счета к виду столбца account_number (поле выгрузки допускается в кавычках).
+
+    Raises:
+        ValueError: Номер счета не проходит is_valid_account_number.
+    """
+    account_number = unquote_csv_field(str(account_number))
+    if not is_valid_account_number(account_number):
+        raise ValueError(f"Некорректный номер счета: {account_number!r}")
+    return account_number
+
+
+def read_account_numbers(file_path, delimiter='\t'):
+    """Построчно читает номера счетов из файла: по одному в строке или первым полем выгрузки.
+
+    Пустые строки и строка заголовка выгрузки пропускаются.
+    """
+    with open(file_path, encoding='utf-8-sig') as f:
+        for line in f:
+            account_number = unquote_csv_field(line.split(delimiter, 1)[0])
+            if account_number and account_number != UPLOAD_HEADER[0]:
+                yield account_number
+
+
+class DebtLookup:
+    """Поиск задолженности по номеру счета в текущей таблице организации.
+
+    Текущая таблица схемы определяется по реестру один раз и кэшируется; кэш
+    сбрасывается уведомлением загрузчика в канале PUBLISH_CHANNEL (LISTEN на
+    собственном соединении). Результаты поиска хранятся в LRU-кэше с TTL по ключу
+    (схема, номер таблицы, счет), поэтому после публикации новой таблицы старые
+    записи не используются и вытесняются. Счетчики попаданий - в атрибуте stats.
+    """
+
+    def __init__(self, conn=None, cache_size=LOOKUP_CACHE_SIZE, ttl=LOOKUP_CACHE_TTL,
+                 table_ttl=TABLE_CACHE_TTL, listen=True):
+        self.conn = conn or psycopg2.connect(**DB_PARAMS)
+        self.own_conn = conn is None
+        # LISTEN работает только вне транзакции: уведомления приходят между запросами.
+        # Режим переданного соединения восстанавливается в close()
+        self.saved_autocommit = self.conn.autocommit
+        self.conn.autocommit = True
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self.table_ttl = table_ttl
+        self.listen = listen
+        self.cache = OrderedDict()  # (схема, номер таблицы, счет) -> (строка или None, срок)
+        self.tables = {}  # схема -> (имя таблицы, номер таблицы, срок)
+        self.stats = {"hits": 0, "misses": 0, "table_hits": 0, "table_misses": 0, "invalidations": 0}
+        self.lock = threading.Lock()
+        if listen:
+            with self.conn.cursor() as cursor:
+                cursor.execute(sql.SQL("LISTEN {channel}").format(channel=sql.Identifier(PUBLISH_CHANNEL)))
+
+    def close(self):
+        """Закрывает собственное соединение; переданное возвращает в прежнее состояние (UNLISTEN, autocommit)."""
+        if self.own_conn:
+            self.conn.close()
+        elif not self.conn.closed:
+            if self.listen:
+                with self.conn.cursor() as cursor:
+                    cursor.execute(sql.SQL("UNLISTEN {channel}").format(channel=sql.Identifier(PUBLISH_CHANNEL)))
+                self.conn.notifies.clear()
+            self.conn.autocommit = self.saved_autocommit
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def invalidate(self, schema_name=None):
+        """Сбрасывает текущую таблицу схемы (или всех схем при schema_name=None)."""
+        with self.lock:
+            if schema_name is None:
+                self.tables.clear()
+            else:
+                self.tables.pop(schema_name, None)
+            self.stats["invalidations"] += 1
+
+    def poll_notifications(self, timeout=0):
+        """Разбирает пришедшие уведомления о публикации и сбрасывает кэш их схем.
+
+        Args:
+            timeout (float): Сколько секунд ждать уведомления (0 - только проверить).
+
+        Returns:
+            int: Число обработанных уведомлений.
+        """
+        if not self.listen:
+            return 0
+        if timeout and not self.conn.notifies:
+            select.select([self.conn], [], [], timeout)
+        self.conn.poll()
+        count = 0
+        while self.conn.notifies:
+            notify = self.conn.notifies.pop(0)
+            try:
+                schema_name = json.loads(notify.payload)["schema"]
+            except (ValueError, KeyError, TypeError):
+                schema_name = None
+            self.invalidate(schema_name)
+            count += 1
+        return count
+
+    def resolve_table(self, schema_name):
+        """Определяет текущую таблицу схемы по реестру.
+
+        Для схем без реестра (загружены до его появления) берётся таблица
+        t_<ORG>_N с максимальным номером по каталогу.
+
+        Returns:
+            tuple: (имя таблицы, номер таблицы) или None, если таблиц нет.
+        """
+        with self.conn.cursor() as cursor:
+            cursor.execute("SELECT to_regclass(%s)",
+                           (f'{sql_quote_ident(schema_name)}.{sql_quote_ident(REGISTRY_TABLE)}',))
+            if cursor.fetchone()[0] is not None:
+                cursor.execute(sql.SQL("""
+                    SELECT table_name, table_number FROM {schema}.{registry} WHERE is_current
+                """).format(
+                    schema=sql.Identifier(schema_name),
+                    registry=sql.Identifier(REGISTRY_TABLE)
+                ))
+                row = cursor.fetchone()
+                return tuple(row) if row else None
+
+        base_table_name = get_base_table_name(schema_name)
+        table_number = get_catalog_table_number(self.conn, schema_name, base_table_name)
+        return (f"{base_table_name}_{table_number}", table_number) if table_number else None
+
+    def get_current_table(self, schema_name):
+        """Возвращает (имя, номер) текущей таблицы схемы из кэша или из реестра."""
+        self.poll_notifications()
+        now = time.monotonic()
+        with self.lock:
+            cached = self.tables.get(schema_name)
+            if cached and cached[2] > now:
+                self.stats["table_hits"] += 1
+                return cached[:2]
+            self.stats["table_misses"] += 1
+            table = self.resolve_table(schema_name)
+            if table is None:
+                self.tables.pop(schema_name, None)
+                return None
+            self.tables[schema_name] = (*table, now + self.table_ttl)
+            return table
+
+    def query_account(self, schema_name, table_name, account_number):
+        """Читает строку счета из таблицы (покрывающий индекс по account_number)."""
+        with self.conn.cursor() as cursor:
+            cursor.execute(sql.SQL("""
+                SELECT account_number, {columns} FROM {schema}.{table_name}
+                WHERE account_number = %s
+                LIMIT 1
+            """).format(
+                columns=sql.SQL(', ').join(map(sql.Identifier, LOOKUP_COLUMNS)),
+                schema=sql.Identifier(schema_name),
+                table_name=sql.Identifier(table_name)
+            ), (account_number,))
+            row = cursor.fetchone()
+        return dict(zip(('account_number',) + LOOKUP_COLUMNS, row)) if row else None
+
+    def lookup(self, schema_name, account_number):
+        """Ищет счет в текущей таблице организации.
+
+        Returns:
+            dict: Номер счета и LOOKUP_COLUMNS или None, если счет (или таблица) не найден.
+
+        Raises:
+            ValueError: Номер счета не проходит is_valid_account_number.
+        """
+        account_number = normalize_account_number(account_number)
+        table = self.get_current_table(schema_name)
+        if table is None:
+            return None
+        table_name, table_number = table
+        key = (schema_name, table_number, account_number)
+        now = time.monotonic()
+        with self.lock:
+            cached = self.cache.get(key)
+            if cached and cached[1] > now:
+                self.cache.move_to_end(key)
+                self.stats["hits"] += 1
+                return cached[0]
+            self.stats["misses"] += 1
+            row = self.query_account(schema_name, table_name, account_number)
+            self.cache[key] = (row, now + self.ttl)
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+            return row
+
+    def query_accounts(self, schema_name, table_name, account_numbers):
+        """Читает строки счетов пакета одним запросом по индексу account_number.
+
+        Returns:
+            dict: Номер счета -> строка в порядке DATA_COLUMNS (первая найденная на счет).
+        """
+        with self.conn.cursor() as cursor:
+            cursor.execute(sql.SQL("""
+                SELECT {columns} FROM {schema}.{table_name}
+                WHERE account_number = ANY(%s::VARCHAR[])
+            """).format(
+                columns=sql.SQL(', ').join(map(sql.Identifier, DATA_COLUMNS)),
+                schema=sql.Identifier(schema_name),
+                table_name=sql.Identifier(table_name)
+            ), (account_numbers,))
+            rows = {}
+            for row in cursor:
+                rows.setdefault(row[0], row)
+        return rows
+
+    def lookup_many(self, schema_name, account_numbers, batch_size=LOOKUP_BATCH_SIZE):
+        """Ищет множество счетов в текущей таблице организации пакетами по batch_size.
+
+        Номера читаются из итерируемого источника по мере обработки, повторы
+        пропускаются, некорректные номера возвращаются как ненайденные без запроса.
+        Все пакеты ищутся в одной и той же таблице, определённой до
+        первого запроса, даже если во время поиска опубликована новая. Кэш
+        результатов не используется и не заполняется, чтобы сверка не вытесняла
+        горячие счета.
+
+        Yields:
+            tuple: (номер счета, строка в порядке DATA_COLUMNS или None, если не найден)
+            в порядке входных номеров.
+
+        Raises:
+            ValueError: В схеме нет загруженных таблиц.
+        """
+        table = self.get_current_table(schema_name)
+        if table is None:
+            raise ValueError(f"В схеме {schema_name} нет загруженных таблиц")
+        table_name = table[0]
+        seen = set()
+        account_numbers = iter(account_numbers)
+        exhausted = False
+        while not exhausted:
+            batch = []
+            # Повторы не занимают места в пакете: добираем до batch_size новых номеров
+            while len(batch) < batch_size:
+                chunk = list(islice(account_numbers, batch_size - len(batch)))
+                if not chunk:
+                    exhausted = True
+                    break
+                for account_number in chunk:
+                    account_number = unquote_csv_field(str(account_number))
+                    if account_number not in seen:
+                        seen.add(account_number)
+                        batch.append(account_number)
+            if not batch:
+                break
+            valid = [account_number for account_number in batch if is_valid_account_number(account_number)]
+            rows = self.query_accounts(schema_name, table_name, valid) if valid else {}
+            for account_number in batch:
+                yield account_number, rows.get(account_number)
+
+    def hit_ratio(self):
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / total if total else 0.0
+
+
+def get_not_found_path(output_path):
+    """Путь к списку ненайденных счетов для файла результата."""
+    return output_path + NOT_FOUND_SUFFIX
+
+
+def export_lookup(lookup, schema_name, account_numbers, output_path, not_found_path=None,
+                  batch_size=LOOKUP_BATCH_SIZE):
+    """Пакетно ищет счета и пишет найденные строки в TSV в формате выгрузки.
+
+    Найденные строки выводятся по мере обработки пакетов с заголовком UPLOAD_HEADER,
+    все поля в кавычках, месяц двумя цифрами, как в файле выгрузки (в таблицах с текстовыми
+    столбцами, созданных до типизации, значения выводятся как хранятся); ненайденные (и некорректные) номера
+    записываются по одному в строке в not_found_path.
+
+    Returns:
+        dict: Число запрошенных (без повторов), найденных и ненайденных счетов, время поиска.
+    """
+    start_time = time.time()
+    not_found_path = not_found_path or get_not_found_path(output_path)
+    found = not_found = 0
+    with open(output_path, 'w', encoding='utf-8', newline='') as output, \
+            open(not_found_path, 'w', encoding='utf-8') as not_found_file:
+        writer = csv.writer(output, delimiter='\t', quoting=csv.QUOTE_ALL, lineterminator='\n')
+        writer.writerow(UPLOAD_HEADER)
+        for account_number, row in lookup.lookup_many(schema_name, account_numbers, batch_size):
+            if row is None:
+                not_found_file.write(account_number + '\n')
+                not_found += 1
+            else:
+                row = list(row)
+                if isinstance(row[PERIOD_MONTH_INDEX], int):
+                    row[PERIOD_MONTH_INDEX] = f'{row[PERIOD_MONTH_INDEX]:02d}'
+                writer.writerow(row)
+                found += 1
+    return {
+        "requested": found + not_found,
+        "found": found,
+        "not_found": not_found,
+        "not_found_path": not_found_path,
+        "seconds": time.time() - start_time
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Поиск задолженности по номерам счетов в текущей таблице организации")
+    parser.add_argument("schema", help="Схема (мнемоника) организации")
+    parser.add_argument("accounts", nargs='*', help="Номера счетов")
+    parser.add_argument("--file", help="Файл номеров счетов: по одному в строке или выгрузка (первое поле)")
+    parser.add_argument("--output", help="Пакетный поиск: записать найденные строки в TSV в формате выгрузки, "
+                                         f"ненайденные счета - в <output>{NOT_FOUND_SUFFIX}")
+    parser.add_argument("--batch-size", type=int, default=LOOKUP_BATCH_SIZE, help="Счетов в одном запросе")
+    parser.add_argument("--cache-size", type=int, default=LOOKUP_CACHE_SIZE, help="Размер LRU-кэша результатов")
+    parser.add_argument("--ttl", type=float, default=LOOKUP_CACHE_TTL, help="Срок жизни результата в кэше, сек.")
+    args = parser.parse_args()
+    if not args.accounts and not args.file:
+        parser.error("Укажите номера счетов или --file")
+    if args.file and not args.output:
+        parser.error("Для --file укажите --output")
+
+    try:
+        with DebtLookup(cache_size=args.cache_size, ttl=args.ttl) as lookup:
+            if args.output:
+                account_numbers = read_account_numbers(args.file) if args.file else args.accounts
+                result = export_lookup(lookup, args.schema, account_numbers, args.output,
+                                       batch_size=args.batch_size)
+                print(f"Запрошено счетов: {result['requested']}, найдено: {result['found']}, "
+                      f"не найдено: {result['not_found']} ({result['not_found_path']}). "
+                      f"Время: {result['seconds']:.2f} сек.")
+                return 0
+            table = lookup.get_current_table(args.schema)
+            if table is None:
+                print(f"В схеме {args.schema} нет загруженных таблиц")
+                return 1
+            print(f"Текущая таблица: {args.schema}.{table[0]}")
+            for account_number in args.accounts:
+                try:
+                    row = lookup.lookup(args.schema, account_number)
+                except ValueError as e:
+                    print(str(e))
+                    continue
+                if row is None:
+                    print(f"{account_number}: не найден")
+                else:
+                    print('\t'.join(str(row[column]) for column in ('account_number',) + LOOKUP_COLUMNS))
+            print(f"Кэш: попаданий {lookup.stats['hits']}, промахов {lookup.stats['misses']}")
+    except Exception as e:
+        print(f"\nОШИБКА: {str(e)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
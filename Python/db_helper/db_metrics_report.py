@@ -0,0 +1,83 @@
+import argparse
+import psycopg2
+from psycopg2 import sql
+from db_copy7 import DB_PARAMS
+
+REPORT_PERIODS = ('day', 'week', 'month')  # Допустимые интервалы группировки отчёта
+
+
+def list_schemas_with_metrics(conn):
+    """Возвращает схемы, в таблице логов которых есть столбец metrics."""
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT table_schema FROM information_schema.columns
+            WHERE table_name = 't_load_stages' AND column_name = 'metrics'
+            ORDER BY table_schema
+        """)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def get_throughput_report(conn, schema_name, period='week', days=90, stage=None):
+    """Считает p50/p95 скорости (строк/сек и МБ/сек) по этапам загрузок схемы за интервалы.
+
+    Returns:
+        list: Кортежи (начало интервала, этап, число загрузок, p50 строк/сек, p95 строк/сек,
+              p50 МБ/сек, p95 МБ/сек).
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(sql.SQL("""
+            SELECT
+                date_trunc(%(period)s, s.start_time) AS period_start,
+                m->>'stage' AS stage,
+                COUNT(*) AS loads,
+                percentile_cont(0.5) WITHIN GROUP (ORDER BY (m->>'rows_per_sec')::FLOAT),
+                percentile_cont(0.95) WITHIN GROUP (ORDER BY (m->>'rows_per_sec')::FLOAT),
+                percentile_cont(0.5) WITHIN GROUP (ORDER BY (m->>'mb_per_sec')::FLOAT),
+                percentile_cont(0.95) WITHIN GROUP (ORDER BY (m->>'mb_per_sec')::FLOAT)
+            FROM {schema}.t_load_stages s
+            CROSS JOIN LATERAL jsonb_array_elements(s.metrics) m
+            WHERE s.status_code = 1
+                AND s.start_time >= CURRENT_TIMESTAMP - make_interval(days => %(days)s)
+                AND (%(stage)s IS NULL OR m->>'stage' = %(stage)s)
+            GROUP BY 1, 2
+            ORDER BY 1, 2
+        """).format(schema=sql.Identifier(schema_name)), {'period': period, 'days': days, 'stage': stage})
+        return cursor.fetchall()
+
+
+def format_rate(value, digits):
+    return f"{value:.{digits}f}" if value is not None else "-"
+
+
+def print_report(schema_name, rows):
+    print(f"\n=== СКОРОСТЬ ЗАГРУЗКИ СХЕМЫ {schema_name} ===")
+    if not rows:
+        print("Нет завершённых загрузок с показателями")
+        return
+    print(f"{'Интервал':<12}{'Этап':<20}{'Загрузок':>9}{'p50 стр/с':>13}{'p95 стр/с':>13}"
+          f"{'p50 МБ/с':>11}{'p95 МБ/с':>11}")
+    for period_start, stage, loads, p50_rows, p95_rows, p50_mb, p95_mb in rows:
+        print(f"{period_start:%Y-%m-%d}  {stage:<20}{loads:>9}{format_rate(p50_rows, 0):>13}"
+              f"{format_rate(p95_rows, 0):>13}{format_rate(p50_mb, 2):>11}{format_rate(p95_mb, 2):>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Отчёт о скорости загрузок по организациям (p50/p95)")
+    parser.add_argument("--schema", action="append",
+                        help="Схема организации (можно указать несколько раз); по умолчанию все схемы")
+    parser.add_argument("--period", choices=REPORT_PERIODS, default='week', help="Интервал группировки")
+    parser.add_argument("--days", type=int, default=90, help="Глубина отчёта в днях")
+    parser.add_argument("--stage", help="Только указанный этап (например copy_data)")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(**DB_PARAMS)
+    try:
+        for schema_name in args.schema or list_schemas_with_metrics(conn):
+            print_report(schema_name, get_throughput_report(conn, schema_name, args.period, args.days, args.stage))
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,291 @@
+import argparse
+import gzip
+import os
+import time
+from datetime import datetime
+import psycopg2
+from psycopg2 import sql
+from db_copy7 import (
+    DB_PARAMS, REGISTRY_TABLE, detach_partition, ensure_log_tables_exist, rejects_table_name, set_registry_status,
+    staging_table_name
+)
+
+RETENTION_KEEP = 3  # Сколько последних загруженных таблиц оставлять в схеме
+RETENTION_MODE = 'export'  # export - выгрузка в .tsv.gz и удаление, history - перенос в схему <ORG>_history
+ARCHIVE_DIR = 'archive'  # Каталог для архивных выгрузок
+STALE_AGE_HOURS = 24  # Через сколько часов удаляются таблицы ошибочных и брошенных (статус 0) загрузок
+
+
+def get_history_schema_name(schema_name):
+    """Возвращает имя схемы для архивных таблиц организации."""
+    return f"{schema_name}_history"
+
+
+def list_schemas_with_loads(conn):
+    """Возвращает схемы, в которых есть таблица логов загрузки."""
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT table_schema FROM information_schema.tables
+            WHERE table_name = 't_load_stages'
+            ORDER BY table_schema
+        """)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def has_registry(conn, schema_name):
+    """Проверяет по каталогу, есть ли в схеме реестр таблиц (без его создания)."""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(format('%%I.%%I', %s, %s))", (schema_name, REGISTRY_TABLE))
+        return cursor.fetchone()[0] is not None
+
+
+def find_expired_tables(conn, schema_name, keep=RETENTION_KEEP):
+    """Находит по реестру загруженные таблицы схемы сверх keep последних (по номеру).
+
+    Учитываются только существующие успешно загруженные таблицы (ошибочные и
+    незавершённые убирает find_stale_tables); текущая таблица не архивируется никогда.
+
+    Returns:
+        list: Имена таблиц от старых к новым.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(sql.SQL("""
+            SELECT table_name FROM {schema}.{registry}
+            WHERE status = 1 AND NOT is_current
+                AND to_regclass(format('%%I.%%I', %s, table_name)) IS NOT NULL
+            ORDER BY table_number DESC
+            OFFSET %s
+        """).format(
+            schema=sql.Identifier(schema_name),
+            registry=sql.Identifier(REGISTRY_TABLE)
+        ), (schema_name, max(keep - 1, 0)))
+        tables = [row[0] for row in cursor.fetchall()]
+    return list(reversed(tables))
+
+
+def find_stale_tables(conn, schema_name, age_hours=STALE_AGE_HOURS):
+    """Находит по реестру таблицы ошибочных (статус 2) и брошенных (статус 0) загрузок старше age_hours.
+
+    Таблица учитывается, если существует она сама или её промежуточная таблица (_stage).
+    Более свежие оставлены для продолжения загрузки (load_file с resume=True).
+
+    Returns:
+        list: Имена таблиц от старых к новым.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(sql.SQL("""
+            SELECT table_name FROM {schema}.{registry}
+            WHERE status IN (0, 2) AND NOT is_current
+                AND date_insert < CURRENT_TIMESTAMP - make_interval(hours => %s)
+                AND (to_regclass(format('%%I.%%I', %s, table_name)) IS NOT NULL
+                     OR to_regclass(format('%%I.%%I', %s, table_name || %s)) IS NOT NULL)
+            ORDER BY table_number
+        """).format(
+            schema=sql.Identifier(schema_name),
+            registry=sql.Identifier(REGISTRY_TABLE)
+        ), (age_hours, schema_name, schema_name, staging_table_name('')))
+        return [row[0] for row in cursor.fetchall()]
+
+
+def drop_stale_table(conn, schema_name, table_name):
+    """Удаляет таблицу неудачной загрузки вместе с промежуточной таблицей, таблицей отказов
+    и последовательностью одной транзакцией; в реестре таблица отмечается архивированной.
+    """
+    try:
+        with conn.cursor() as cursor:
+            for name in (table_name, staging_table_name(table_name), rejects_table_name(table_name)):
+                cursor.execute(sql.SQL("DROP TABLE IF EXISTS {schema}.{table}").format(
+                    schema=sql.Identifier(schema_name),
+                    table=sql.Identifier(name)
+                ))
+            cursor.execute(sql.SQL("DROP SEQUENCE IF EXISTS {schema}.{seq_name}").format(
+                schema=sql.Identifier(schema_name),
+                seq_name=sql.Identifier(f"s_{table_name}_id")
+            ))
+            cursor.execute(sql.SQL("""
+                UPDATE {schema}.t_load_stages
+                SET archive_time = CURRENT_TIMESTAMP, archive_location = NULL
+                WHERE table_name = %s
+            """).format(schema=sql.Identifier(schema_name)), (table_name,))
+        set_registry_status(conn, schema_name, table_name, 3)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def export_table(conn, schema_name, table_name, archive_dir=ARCHIVE_DIR):
+    """Выгружает таблицу в сжатый файл TSV с заголовком.
+
+    Файл пишется под временным именем <архив>.part и переименовывается после выгрузки,
+    поэтому прерванная выгрузка не оставляет в каталоге архива обрезанный .gz.
+
+    Returns:
+        str: Путь к архивному файлу.
+    """
+    os.makedirs(os.path.join(archive_dir, schema_name), exist_ok=True)
+    archive_path = os.path.join(archive_dir, schema_name,
+                                f"{table_name}_{datetime.now().strftime('%Y%m%d%H%M%S')}.tsv.gz")
+    part_path = archive_path + '.part'
+    try:
+        with gzip.open(part_path, 'wt', encoding='utf-8') as f:
+            with conn.cursor() as cursor:
+                cursor.copy_expert(sql.SQL("""
+                    COPY {schema}.{table} TO STDOUT WITH (FORMAT csv, DELIMITER '\t', HEADER)
+                """).format(
+                    schema=sql.Identifier(schema_name),
+                    table=sql.Identifier(table_name)
+                ), f)
+        os.replace(part_path, archive_path)
+    except BaseException:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+    return archive_path
+
+
+def archive_table(conn, schema_name, table_name, mode=RETENTION_MODE, archive_dir=ARCHIVE_DIR):
+    """Архивирует таблицу и убирает её из схемы организации одной транзакцией.
+
+    В режиме export таблица выгружается в .tsv.gz и удаляется вместе с последовательностью
+    и таблицей отведённых строк, в режиме history переносится в схему <ORG>_history вместе с ними.
+    Секция секционированной таблицы схемы предварительно отсоединяется (DETACH PARTITION).
+    Место архива записывается в t_load_stages; status_code загрузки не меняется, чтобы файл
+    по-прежнему считался загруженным и не принимался повторно.
+
+    Returns:
+        str: Путь к архивному файлу или полное имя таблицы в схеме истории.
+    """
+    seq_name = f"s_{table_name}_id"
+    location = None
+    try:
+        with conn.cursor() as cursor:
+            if detach_partition(conn, schema_name, table_name):
+                print(f"Секция {schema_name}.{table_name} отсоединена")
+            if mode == 'export':
+                location = export_table(conn, schema_name, table_name, archive_dir)
+                cursor.execute(sql.SQL("DROP TABLE {schema}.{table}").format(
+                    schema=sql.Identifier(schema_name),
+                    table=sql.Identifier(table_name)
+                ))
+                cursor.execute(sql.SQL("DROP SEQUENCE IF EXISTS {schema}.{seq_name}").format(
+                    schema=sql.Identifier(schema_name),
+                    seq_name=sql.Identifier(seq_name)
+                ))
+                cursor.execute(sql.SQL("DROP TABLE IF EXISTS {schema}.{rejects}").format(
+                    schema=sql.Identifier(schema_name),
+                    rejects=sql.Identifier(rejects_table_name(table_name))
+                ))
+            elif mode == 'history':
+                history_schema = get_history_schema_name(schema_name)
+                cursor.execute(sql.SQL("CREATE SCHEMA IF NOT EXISTS {history}").format(
+                    history=sql.Identifier(history_schema)))
+                cursor.execute(sql.SQL("ALTER TABLE {schema}.{table} SET SCHEMA {history}").format(
+                    schema=sql.Identifier(schema_name),
+                    table=sql.Identifier(table_name),
+                    history=sql.Identifier(history_schema)
+                ))
+                cursor.execute(sql.SQL("ALTER SEQUENCE IF EXISTS {schema}.{seq_name} SET SCHEMA {history}").format(
+                    schema=sql.Identifier(schema_name),
+                    seq_name=sql.Identifier(seq_name),
+                    history=sql.Identifier(history_schema)
+                ))
+                cursor.execute(sql.SQL("ALTER TABLE IF EXISTS {schema}.{rejects} SET SCHEMA {history}").format(
+                    schema=sql.Identifier(schema_name),
+                    rejects=sql.Identifier(rejects_table_name(table_name)),
+                    history=sql.Identifier(history_schema)
+                ))
+                location = f"{history_schema}.{table_name}"
+            else:
+                raise ValueError(f"Неизвестный режим хранения: {mode}")
+
+            cursor.execute(sql.SQL("""
+                UPDATE {schema}.t_load_stages
+                SET archive_time = CURRENT_TIMESTAMP, archive_location = %s
+                WHERE table_name = %s
+            """).format(schema=sql.Identifier(schema_name)), (location, table_name))
+        set_registry_status(conn, schema_name, table_name, 3)
+        conn.commit()
+        return location
+    except Exception:
+        conn.rollback()
+        if mode == 'export' and location and os.path.exists(location):
+            os.remove(location)
+        raise
+
+
+def apply_retention(conn, schema_name, keep=RETENTION_KEEP, mode=RETENTION_MODE, archive_dir=ARCHIVE_DIR,
+                    dry_run=False, stale_age_hours=STALE_AGE_HOURS):
+    """Оставляет в схеме keep последних загруженных таблиц, остальные архивирует;
+    отдельно удаляет таблицы ошибочных и брошенных загрузок старше stale_age_hours.
+
+    Returns:
+        list: Имена обработанных (при dry_run - подлежащих обработке) таблиц.
+    """
+    print(f"\n=== ХРАНЕНИЕ ТАБЛИЦ СХЕМЫ {schema_name} (оставить {keep}, режим {mode}) ===")
+    if dry_run:
+        # Пробный запуск не меняет схему: реестр и таблицы логов не создаются и не переносятся
+        if not has_registry(conn, schema_name):
+            conn.rollback()
+            print(f"[dry-run] В схеме {schema_name} нет реестра таблиц {REGISTRY_TABLE}")
+            return []
+    else:
+        ensure_log_tables_exist(conn, schema_name)
+    expired = find_expired_tables(conn, schema_name, keep)
+    stale = find_stale_tables(conn, schema_name, stale_age_hours)
+    conn.rollback()  # Закрываем читающую транзакцию перед DDL
+    if not expired:
+        print("Нет таблиц для архивирования")
+    if not stale:
+        print(f"Нет таблиц неудачных загрузок старше {stale_age_hours} ч.")
+    if dry_run:
+        for table_name in expired:
+            print(f"[dry-run] Будет архивирована таблица {schema_name}.{table_name}")
+        for table_name in stale:
+            print(f"[dry-run] Будет удалена таблица неудачной загрузки {schema_name}.{table_name}")
+        return expired + stale
+
+    for table_name in expired:
+        start_time = time.time()
+        location = archive_table(conn, schema_name, table_name, mode, archive_dir)
+        print(f"Таблица {schema_name}.{table_name} архивирована: {location}. "
+              f"Время: {time.time() - start_time:.2f} сек.")
+    for table_name in stale:
+        drop_stale_table(conn, schema_name, table_name)
+        print(f"Таблица неудачной загрузки {schema_name}.{table_name} удалена")
+    return expired + stale
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Хранение и архивирование загруженных таблиц t_<ORG>_N")
+    parser.add_argument("--schema", action="append",
+                        help="Схема организации (можно указать несколько раз); по умолчанию все схемы с загрузками")
+    parser.add_argument("--keep", type=int, default=RETENTION_KEEP, help="Сколько последних таблиц оставлять")
+    parser.add_argument("--mode", choices=('export', 'history'), default=RETENTION_MODE, help="Способ архивирования")
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR, help="Каталог архивных выгрузок (режим export)")
+    parser.add_argument("--stale-age-hours", type=float, default=STALE_AGE_HOURS,
+                        help="Через сколько часов удалять таблицы ошибочных и брошенных загрузок")
+    parser.add_argument("--dry-run", action="store_true", help="Только показать, что будет архивировано")
+    args = parser.parse_args()
+    if args.keep < 1:
+        parser.error("--keep должен быть не меньше 1")
+
+    conn = psycopg2.connect(**DB_PARAMS)
+    conn.autocommit = False
+    failed = 0
+    try:
+        for schema_name in args.schema or list_schemas_with_loads(conn):
+            try:
+                apply_retention(conn, schema_name, args.keep, args.mode, args.archive_dir, args.dry_run,
+                                args.stale_age_hours)
+            except Exception as e:
+                print(f"Ошибка хранения таблиц схемы {schema_name}: {str(e)}")
+                conn.rollback()
+                failed += 1
+    finally:
+        conn.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
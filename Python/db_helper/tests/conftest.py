@@ -0,0 +1,32 @@
+import os
+import sys
+
+import pytest
+
+# Модули db_helper импортируют друг друга по имени (from db_copy7 import ...)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_copy7 import UPLOAD_HEADER  # noqa: E402
+
+
+def make_line(account_number='123456789', full_name='Иванов Иван Иванович', address='г. Москва, ул. Ленина, д. 1',
+              period_year='2020', period_month='03', meter_reading='00123', debt='1500'):
+    """Строка выгрузки: все поля в кавычках через TAB, без перевода строки."""
+    fields = (account_number, full_name, address, period_year, period_month, meter_reading, debt)
+    return '\t'.join(f'"{field}"' for field in fields)
+
+
+HEADER_LINE = '\t'.join(f'"{field}"' for field in UPLOAD_HEADER)
+
+
+@pytest.fixture
+def upload_file(tmp_path):
+    """Записывает файл выгрузки (заголовок и строки) и возвращает путь к нему."""
+
+    def write(lines, encoding='utf-8', newline='\n', header=True, name='upload.tsv'):
+        path = tmp_path / name
+        text = newline.join(([HEADER_LINE] if header else []) + list(lines)) + newline
+        path.write_bytes(text.encode(encoding))
+        return str(path)
+
+    return write
@@ -0,0 +1,182 @@
+import struct
+import threading
+
+import pytest
+
+import db_copy7
+from conftest import make_line
+
+
+def read_all(source):
+    """Вычитывает источник как COPY: блоки до пустого."""
+    blocks = []
+    while True:
+        block = source.read()
+        if not block:
+            return blocks
+        blocks.append(block)
+
+
+def data_lines(count):
+    return [make_line(account_number=f'{100000000 + i}', debt=str(i)) for i in range(count)]
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 64, 1024 * 1024])
+def test_copy_source_stream_returns_whole_lines(upload_file, chunk_size):
+    lines = data_lines(20)
+    path = upload_file(lines)
+    with db_copy7.CopySourceStream(path, chunk_size=chunk_size, checksum=True, validate=True) as source:
+        blocks = read_all(source)
+    assert all(block.endswith('\n') for block in blocks)
+    assert ''.join(blocks) == ''.join(line + '\n' for line in lines)
+    assert source.rows == source.lines == 20
+    assert source.debt_sum == sum(range(20))
+
+
+def test_copy_source_stream_without_trailing_newline(upload_file, tmp_path):
+    lines = data_lines(3)
+    path = tmp_path / 'no_newline.tsv'
+    path.write_text('\n'.join([open(upload_file([]), encoding='utf-8').read().rstrip('\n')] + lines),
+                    encoding='utf-8')
+    with db_copy7.CopySourceStream(str(path), chunk_size=10) as source:
+        assert ''.join(read_all(source)) == '\n'.join(lines)
+    assert source.rows == 3
+
+
+def test_copy_source_stream_normalizes_crlf(upload_file):
+    lines = data_lines(3)
+    path = upload_file(lines, newline='\r\n')
+    with db_copy7.CopySourceStream(path, chunk_size=5, validate=True) as source:
+        assert ''.join(read_all(source)) == ''.join(line + '\n' for line in lines)
+
+
+def test_copy_source_stream_validation_error_keeps_line_number(upload_file):
+    path = upload_file(data_lines(5) + [make_line(period_year='40000')])
+    with db_copy7.CopySourceStream(path, chunk_size=50, validate=True) as source:
+        with pytest.raises(ValueError, match='Строка 7: поле period_year'):
+            read_all(source)
+    assert isinstance(source.error, ValueError)
+
+
+def test_copy_source_stream_byte_ranges_cover_file(upload_file):
+    lines = data_lines(50)
+    path = upload_file(lines)
+    loaded = []
+    for start, end in db_copy7.split_file_ranges(path, 3):
+        with db_copy7.CopySourceStream(path, chunk_size=100, skip_header=start == 0, start=start, end=end) as source:
+            loaded.extend(''.join(read_all(source)).splitlines())
+    assert loaded == lines
+
+
+def test_copy_source_stream_diverts_rejects(upload_file):
+    path = upload_file([make_line(), make_line(period_month='13'), make_line(account_number='987654321')])
+    with db_copy7.CopySourceStream(path, chunk_size=30, divert=True) as source:
+        assert ''.join(read_all(source)).count('\n') == 2
+        source.rejects_file.seek(0)
+        rejected = source.rejects_file.read().splitlines()
+    assert source.rejected == 1
+    assert rejected[0].startswith('3\tvalues\t')
+
+
+def field(value):
+    return struct.pack('!i', len(value)) + value
+
+
+def test_encode_binary_row_layout():
+    row = db_copy7.encode_binary_row(make_line(full_name='Иванов'), 2)
+    assert row == (
+        b'\x00\x07'
+        + field(b'123456789')
+        + field('Иванов'.encode('utf-8'))
+        + field('г. Москва, ул. Ленина, д. 1'.encode('utf-8'))
+        + b'\x00\x00\x00\x02' + struct.pack('!h', 2020)
+        + b'\x00\x00\x00\x02' + struct.pack('!h', 3)
+        + field(b'00123')
+        + b'\x00\x00\x00\x08' + struct.pack('!q', 1500)
+    )
+
+
+def test_encode_binary_row_text_encoding_and_escaped_quotes():
+    line = make_line(full_name='ООО ""Ромашка""').replace('\t"00123"', '\t00123')
+    row = db_copy7.encode_binary_row(line, 2, text_encoding='cp1251')
+    assert field('ООО "Ромашка"'.encode('cp1251')) in row
+    assert field(b'00123') in row
+
+
+@pytest.mark.parametrize('kwargs, message', [
+    ({'period_year': '40000'}, 'period_year'),
+    ({'debt': str(2 ** 63)}, 'debt'),
+])
+def test_encode_binary_row_checks_ranges(kwargs, message):
+    with pytest.raises(ValueError, match=f'Строка 5: поле {message}'):
+        db_copy7.encode_binary_row(make_line(**kwargs), 5)
+
+
+def test_copy_source_stream_binary_frame(upload_file):
+    lines = data_lines(3)
+    path = upload_file(lines)
+    with db_copy7.CopySourceStream(path, chunk_size=40, copy_format='binary') as source:
+        data = b''.join(read_all(source))
+    assert data.startswith(db_copy7.BINARY_COPY_HEADER)
+    assert data.endswith(db_copy7.BINARY_COPY_TRAILER)
+    rows = b''.join(db_copy7.encode_binary_row(line, num) for num, line in enumerate(lines, 2))
+    assert data == db_copy7.BINARY_COPY_HEADER + rows + db_copy7.BINARY_COPY_TRAILER
+
+
+def test_copy_source_stream_binary_empty_file(upload_file):
+    with db_copy7.CopySourceStream(upload_file([]), copy_format='binary') as source:
+        assert read_all(source) == [db_copy7.BINARY_COPY_HEADER + db_copy7.BINARY_COPY_TRAILER]
+
+
+class BlockSource:
+    """Источник для PipelinedSource: отдаёт блоки, затем ошибку или конец данных."""
+
+    chunk_size = 10
+
+    def __init__(self, blocks, error=None, endless=False):
+        self.blocks = list(blocks)
+        self.error = error
+        self.endless = endless
+        self.closed = False
+
+    def read(self):
+        if self.endless:
+            return 'x\n'
+        if self.blocks:
+            return self.blocks.pop(0)
+        if self.error is not None:
+            raise self.error
+        return ''
+
+    def close(self):
+        self.closed = True
+
+
+def test_pipelined_source_passes_blocks_in_order():
+    source = BlockSource(['a\n', 'b\n', 'c\n'])
+    with db_copy7.PipelinedSource(source, queue_size=1) as pipeline:
+        assert read_all(pipeline) == ['a\n', 'b\n', 'c\n']
+    assert source.closed
+
+
+def test_pipelined_source_propagates_producer_error():
+    error = ValueError('Строка 3: ошибка')
+    source = BlockSource(['a\n'], error=error)
+    with db_copy7.PipelinedSource(source) as pipeline:
+        assert pipeline.read() == 'a\n'
+        with pytest.raises(ValueError) as raised:
+            pipeline.read()
+    assert raised.value is error
+    assert pipeline.error is error
+    assert source.closed
+
+
+def test_pipelined_source_close_stops_blocked_producer():
+    source = BlockSource([], endless=True)
+    pipeline = db_copy7.PipelinedSource(source, queue_size=2)
+    assert pipeline.read() == 'x\n'
+    closer = threading.Thread(target=pipeline.close)
+    closer.start()
+    closer.join(timeout=5)
+    assert not closer.is_alive()
+    assert source.closed
@@ -0,0 +1,65 @@
+import pytest
+
+import db_copy7
+from conftest import make_line
+
+
+def find_duplicates(accounts, run_size=db_copy7.DUPLICATES_RUN_SIZE):
+    finder = db_copy7.AccountDuplicateFinder(run_size=run_size)
+    for line_num, account_number in enumerate(accounts, 2):
+        finder.add(make_line(account_number=account_number), line_num)
+    return finder, finder.finish()
+
+
+@pytest.mark.parametrize('run_size', [db_copy7.DUPLICATES_RUN_SIZE, 1, 2, 3])
+def test_finder_reports_repeated_accounts(run_size):
+    accounts = ['300000000', '100000000', '300000000', '200000000', '100000000', '300000000']
+    _, duplicates = find_duplicates(accounts, run_size)
+    assert duplicates == {'100000000': [3, 6], '300000000': [2, 4, 7]}
+
+
+def test_finder_spills_sorted_runs_to_files():
+    finder = db_copy7.AccountDuplicateFinder(run_size=4)
+    for line_num in range(2, 12):
+        finder.add(make_line(account_number=f'{100000000 + line_num % 3}'), line_num)
+    assert len(finder._runs) == 2 and len(finder._accounts) == 2
+    duplicates = finder.finish()
+    assert duplicates == {
+        '100000000': [3, 6, 9],
+        '100000001': [4, 7, 10],
+        '100000002': [2, 5, 8, 11],
+    }
+    assert finder._runs == [] and len(finder._accounts) == 0
+
+
+def test_finder_without_duplicates():
+    _, duplicates = find_duplicates([f'{100000000 + i}' for i in range(100)], run_size=7)
+    assert duplicates == {}
+
+
+def test_finder_keeps_leading_zeros():
+    _, duplicates = find_duplicates(['000000012', '12', '000000012', '0012', '12'])
+    assert duplicates == {'000000012': [2, 4], '12': [3, 6]}
+
+
+@pytest.mark.parametrize('length', [12, db_copy7.ACCOUNT_NUMBER_MAX_DIGITS])
+@pytest.mark.parametrize('run_size', [db_copy7.DUPLICATES_RUN_SIZE, 2])
+def test_finder_handles_long_accounts(monkeypatch, length, run_size):
+    monkeypatch.setattr(db_copy7, 'ACCOUNT_NUMBER_LENGTH', length)
+    longest = '9' * length
+    padded = '0' * (length - 1) + '1'
+    _, duplicates = find_duplicates([longest, padded, '1', longest, padded, '1'], run_size)
+    assert duplicates == {longest: [2, 5], padded: [3, 6], '1': [4, 7]}
+
+
+def test_finder_skips_invalid_accounts():
+    _, duplicates = find_duplicates(['abc', 'abc', '1' * 19, '1' * 19, ''])
+    assert duplicates == {}
+
+
+def test_duplicates_policy_line_sets():
+    duplicates = {'100000000': [2, 5, 9]}
+    assert db_copy7.get_duplicate_line_sets(duplicates, 'keep_last') == ({2, 5}, set())
+    assert db_copy7.get_duplicate_line_sets(duplicates, 'divert') == (set(), {5, 9})
+    with pytest.raises(ValueError, match='100000000'):
+        db_copy7.check_duplicates(duplicates, 'reject')
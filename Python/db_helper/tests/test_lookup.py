@@ -0,0 +1,75 @@
+import csv
+
+import db_lookup
+from db_copy7 import UPLOAD_HEADER
+
+
+class RowsLookup:
+    """Подмена DebtLookup для export_lookup: строки по счетам без базы данных."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def lookup_many(self, schema_name, account_numbers, batch_size):
+        for account_number in account_numbers:
+            yield account_number, self.rows.get(account_number)
+
+
+def read_tsv(path):
+    with open(path, encoding='utf-8', newline='') as f:
+        return list(csv.reader(f, delimiter='\t'))
+
+
+def test_export_lookup_pads_month_of_typed_table(tmp_path):
+    row = ('123456789', 'Иванов', 'г. Москва', 2020, 3, '00123', 1500)
+    output_path = str(tmp_path / 'out.tsv')
+    result = db_lookup.export_lookup(RowsLookup({'123456789': row}), 'ORG', ['123456789', '987654321'],
+                                     output_path)
+    assert result['found'] == 1 and result['not_found'] == 1
+    assert read_tsv(output_path) == [list(UPLOAD_HEADER),
+                                     ['123456789', 'Иванов', 'г. Москва', '2020', '03', '00123', '1500']]
+    with open(result['not_found_path'], encoding='utf-8') as f:
+        assert f.read() == '987654321\n'
+
+
+def test_export_lookup_keeps_values_of_varchar_table(tmp_path):
+    # Таблицы, загруженные до типизации столбцов: все значения - строки как в файле
+    row = ('123456789', 'Иванов', 'г. Москва', '2020', '3', '123', '1500')
+    output_path = str(tmp_path / 'out.tsv')
+    db_lookup.export_lookup(RowsLookup({'123456789': row}), 'ORG', ['123456789'], output_path)
+    assert read_tsv(output_path)[1] == list(row)
+
+
+class FakeConnection:
+    """Соединение вызывающего кода: запоминает запросы и режим autocommit."""
+
+    def __init__(self):
+        self.autocommit = False
+        self.closed = 0
+        self.notifies = []
+        self.queries = []
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, query):
+        self.queries.append(query)
+
+    def close(self):
+        self.closed = 1
+
+
+def test_lookup_restores_caller_connection():
+    conn = FakeConnection()
+    with db_lookup.DebtLookup(conn=conn):
+        assert conn.autocommit is True
+        conn.notifies.append('debt_table_published')
+    assert conn.autocommit is False
+    assert conn.notifies == [] and not conn.closed
+    assert len(conn.queries) == 2  # LISTEN и UNLISTEN
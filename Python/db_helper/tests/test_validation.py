@@ -0,0 +1,152 @@
+import os
+
+import pytest
+
+import db_copy7
+from conftest import make_line
+
+
+@pytest.mark.parametrize('kwargs', [
+    {},
+    {'debt': '-250'},
+    {'period_month': '12', 'meter_reading': '0'},
+])
+def test_check_line_values_accepts_valid_line(kwargs):
+    db_copy7.check_line_values(make_line(**kwargs), 2)
+
+
+@pytest.mark.parametrize('kwargs, message', [
+    ({'account_number': ''}, "номер счета ''"),
+    ({'account_number': '12345678a'}, "номер счета '12345678a'"),
+    ({'period_year': '40000'}, 'period_year'),
+    ({'account_number': '1' * 19}, 'номер счета'),
+    ({'period_month': '13'}, 'period_month'),
+    ({'meter_reading': '-1'}, 'meter_reading'),
+    ({'debt': '1.5'}, 'debt'),
+])
+def test_check_line_values_rejects_bad_value(kwargs, message):
+    with pytest.raises(ValueError, match=f'Строка 7: .*{message}'):
+        db_copy7.check_line_values(make_line(**kwargs), 7)
+
+
+def test_check_line_values_skips_wrong_field_count():
+    db_copy7.check_line_values('"123456789"\t"Иванов"', 2)
+
+
+def test_check_line_values_defaults_accept_old_uploads():
+    db_copy7.check_line_values(make_line(account_number='12345', period_year='1989'), 2)
+    db_copy7.check_line_values(make_line(account_number='1' * db_copy7.ACCOUNT_NUMBER_MAX_DIGITS), 2)
+
+
+def test_check_line_values_strict_rules(monkeypatch):
+    monkeypatch.setattr(db_copy7, 'ACCOUNT_NUMBER_LENGTH', 9)
+    monkeypatch.setattr(db_copy7, 'ACCOUNT_NUMBER_MIN_LENGTH', 9)
+    monkeypatch.setattr(db_copy7, 'PERIOD_YEAR_RANGE', (1990, 2100))
+    db_copy7.check_line_values(make_line(), 2)
+    for account_number in ('12345678', '1234567890'):
+        with pytest.raises(ValueError, match=f"номер счета '{account_number}' должен состоять из 9 цифр"):
+            db_copy7.check_line_values(make_line(account_number=account_number), 2)
+    with pytest.raises(ValueError, match='period_year'):
+        db_copy7.check_line_values(make_line(period_year='1989'), 2)
+
+
+def test_check_line_values_account_length_is_configurable(monkeypatch):
+    monkeypatch.setattr(db_copy7, 'ACCOUNT_NUMBER_LENGTH', 9)
+    monkeypatch.setattr(db_copy7, 'ACCOUNT_NUMBER_MIN_LENGTH', 6)
+    db_copy7.check_line_values(make_line(account_number='123456'), 2)
+    with pytest.raises(ValueError, match='6-9 цифр'):
+        db_copy7.check_line_values(make_line(account_number='12345'), 2)
+
+
+def test_check_file_lines_counts_lines(upload_file):
+    path = upload_file([make_line(account_number=f'10000000{i}') for i in range(5)])
+    assert db_copy7.check_file_lines(path, 'utf-8', chunk_size=16) == 6
+
+
+def test_check_file_lines_stops_on_first_error(upload_file):
+    path = upload_file([make_line(), make_line(period_month='0'), make_line(debt='x')])
+    with pytest.raises(ValueError, match='Строка 3: поле period_month'):
+        db_copy7.check_file_lines(path, 'utf-8')
+
+
+def test_check_file_lines_rejects_long_line_before_its_end(upload_file):
+    path = upload_file([make_line(address='д' * (db_copy7.MAX_LINE_LENGTH + 1))])
+    with pytest.raises(ValueError, match='Строка 2 превышает максимальную длину'):
+        db_copy7.check_file_lines(path, 'utf-8', chunk_size=1024)
+
+
+def test_check_file_lines_adds_accounts_to_duplicate_finder(upload_file):
+    path = upload_file([make_line(), make_line(account_number='987654321'), make_line()])
+    finder = db_copy7.AccountDuplicateFinder()
+    db_copy7.check_file_lines(path, 'utf-8', duplicates=finder)
+    assert finder.finish() == {'123456789': [2, 4]}
+
+
+def test_collect_file_errors_reports_all_errors(upload_file):
+    path = upload_file([make_line(), make_line(period_year='40000'), 'короткая', make_line(debt='x')])
+    result = db_copy7.collect_file_errors(path, 'utf-8')
+    assert result['line_count'] == 5
+    assert result['rejected_rows'] == 3
+    assert result['error_count'] == 4  # короткая строка нарушает длину и число полей
+    assert [(line_num, rule) for line_num, rule, _, _ in result['rejects']] == [
+        (3, 'values'), (4, 'line_length'), (4, 'field_count'), (5, 'values')]
+    assert result['report_path'] == db_copy7.get_rejects_report_path(path)
+    with open(result['report_path'], encoding='utf-8') as f:
+        assert len(f.read().splitlines()) == 1 + len(result['rejects'])
+
+
+def test_collect_file_errors_limits_report_and_removes_stale_one(upload_file):
+    path = upload_file([make_line(period_month='0')] * 5)
+    result = db_copy7.collect_file_errors(path, 'utf-8', max_errors=2)
+    assert result['error_count'] == 5
+    assert len(result['rejects']) == 2
+
+    path = upload_file([make_line()])
+    result = db_copy7.collect_file_errors(path, 'utf-8')
+    assert result['error_count'] == 0
+    assert result['report_path'] is None
+    assert not os.path.exists(db_copy7.get_rejects_report_path(path))
+
+
+def test_collect_file_errors_without_report(upload_file):
+    path = upload_file([make_line(period_month='0')])
+    result = db_copy7.collect_file_errors(path, 'utf-8', write_report=False)
+    assert result['rejects'] and result['report_path'] is None
+    assert not os.path.exists(db_copy7.get_rejects_report_path(path))
+
+
+@pytest.mark.parametrize('encoding, newline', [
+    ('utf-8', '\n'),
+    ('utf-8', '\r\n'),
+    ('cp1251', '\n'),
+    ('cp1251', '\r\n'),
+])
+def test_check_file_encoding_fast_path(upload_file, encoding, newline):
+    path = upload_file([make_line(account_number=f'10000000{i}') for i in range(10)], encoding, newline)
+    assert db_copy7.check_file_encoding(path) == (encoding, 1.0, 'fast')
+    assert db_copy7.check_file_lines(path, encoding) == 11
+
+
+def test_check_file_encoding_uses_samples_of_large_file(upload_file):
+    lines = [make_line(account_number=f'{100000000 + i}') for i in range(5000)]
+    path = upload_file(lines, 'cp1251')
+    samples = db_copy7.read_encoding_samples(path, sample_size=3000)
+    assert 0 < sum(map(len, samples)) <= 3000
+    assert all(sample.endswith(b'\n') for sample in samples)
+    assert db_copy7.check_file_encoding(path, sample_size=3000) == ('cp1251', 1.0, 'fast')
+
+
+def test_undecodable_bytes_outside_samples_report_line(upload_file):
+    lines = [make_line(account_number=f'{100000000 + i}') for i in range(5000)]
+    path = upload_file(lines)
+    with open(path, 'rb') as f:
+        data = f.read().split(b'\n')
+    data[2999] = data[2999].replace('Иванов'.encode(), b'\xff', 1)
+    with open(path, 'wb') as f:
+        f.write(b'\n'.join(data))
+
+    assert db_copy7.check_file_encoding(path, sample_size=3000)[0] == 'utf-8'
+    with pytest.raises(ValueError, match='Строка 3000 не декодируется в кодировке utf-8'):
+        db_copy7.check_file_lines(path, 'utf-8')
+    with pytest.raises(ValueError, match='Строка 3000 не декодируется'):
+        db_copy7.collect_file_errors(path, 'utf-8')
@@ -1,66 +1,155 @@
+import argparse
+import os
 import random
+import shutil
+import time
+from multiprocessing import Pool
 from faker import Faker
 
-# Инициализация Faker для генерации имен и адресов
-fake = Faker('ru_RU')  # 'ru_RU' для русских имен и адресов
+ACCOUNT_START = 100_000_000  # Номера счетов - девятизначные числа
+ACCOUNT_RANGE = 900_000_000
+POOL_SIZE = 5000  # Размер заранее сгенерированных пулов ФИО и адресов
+BATCH_SIZE = 50_000  # Строк в одном блоке записи
+HEADER = ("Счет", "ФИО", "Адрес", "Период год", "Период месяц", "Показание счетчика", "Задолженность")
+DEFECT_TYPES = ('bad_char', 'field_count', 'short_line', 'duplicate')  # Виды вносимых ошибок
 
-def generate_unique_account_number(existing_numbers):
+
+def build_pools(seed, size=POOL_SIZE, encoding='utf-8'):
+    """Заранее генерирует пулы ФИО и адресов через Faker (только представимые в кодировке)."""
+    fake = Faker('ru_RU')  # 'ru_RU' для русских имен и адресов
+    fake.seed_instance(seed)
+
+    def representable(value):
+        try:
+            value.encode(encoding)
+            return True
+        except UnicodeEncodeError:
+            return False
+
+    names = [name for name in (fake.name() for _ in range(size)) if representable(name)]
+    addresses = [address for address in (fake.address().replace("\n", ", ") for _ in range(size))
+                 if representable(address)]
+    return names, addresses
+
+
+def account_permutation(seed):
+    """Возвращает параметры перестановки диапазона номеров счетов: (шаг, смещение).
+
+    Номер i-й строки - ACCOUNT_START + (смещение + i * шаг) mod ACCOUNT_RANGE; шаг взаимно прост
+    с диапазоном, поэтому номера уникальны без хранения уже выданных.
+    """
+    rng = random.Random(seed)
     while True:
-        number = ''.join([str(random.randint(0, 9)) for _ in range(9)])
-        if number not in existing_numbers:
-            existing_numbers.add(number)
-            return number
-
-def generate_full_name():
-    return fake.name()
-
-def generate_address():
-    return fake.address().replace("\n", ", ")
-
-def generate_period_year():
-    return str(random.randint(2000, 2023))
-
-def generate_period_month():
-    return f"{random.randint(1, 12):02d}"
-
-def generate_meter_reading():
-    return ''.join([str(random.randint(0, 9)) for _ in range(5)])
-
-def generate_debt_in_kopecks():
-    return int(round(random.uniform(0, 10000) * 100))  # Сумма в копейках
-
-def generate_data(num_records):
-    data = []
-    existing_account_numbers = set()  # Множество для хранения уникальных номеров счетов
-    for _ in range(num_records):
-        record = {
-            "Счет": generate_unique_account_number(existing_account_numbers),
-            "ФИО": generate_full_name(),
-            "Адрес": generate_address(),
-            "Период год": generate_period_year(),
-            "Период месяц": generate_period_month(),
-            "Показание счетчика": generate_meter_reading(),
-            "Задолженность": generate_debt_in_kopecks()
-        }
-        data.append(record)
-    return data
-
-# Генерация 10 000 записей
-data = generate_data(100000)
-
-# Сохранение данных в файл с разделителем TAB
-filename = "data_100000.tsv"
-with open(filename, mode="w", encoding="utf-8", newline="") as file:
-    for record in data:
+        step = rng.randrange(ACCOUNT_RANGE // 3, ACCOUNT_RANGE)
+        if step % 2 and step % 3 and step % 5:  # ACCOUNT_RANGE = 2^8 * 3^2 * 5^8
+            return step, rng.randrange(ACCOUNT_RANGE)
+
+
+def generate_block(rng, names, addresses, start, count, step, offset, defect_rate):
+    """Формирует блок строк [start, start + count) с выборкой значений блоками."""
+    names_sample = rng.choices(names, k=count)
+    addresses_sample = rng.choices(addresses, k=count)
+    years = rng.choices(range(2000, 2024), k=count)
+    months = rng.choices(range(1, 13), k=count)
+    readings = rng.choices(range(100000), k=count)
+    debts = rng.choices(range(1000001), k=count)  # Сумма в копейках
+
+    lines = []
+    for j in range(count):
+        account_number = ACCOUNT_START + (offset + (start + j) * step) % ACCOUNT_RANGE
         line = (
-            f'"{record["Счет"]}"\t'
-            f'"{record["ФИО"]}"\t'
-            f'"{record["Адрес"]}"\t'
-            f'"{record["Период год"]}"\t'
-            f'"{record["Период месяц"]}"\t'
-            f'"{record["Показание счетчика"]}"\t'
-            f'"{record["Задолженность"]}"\n'
+            f'"{account_number}"\t"{names_sample[j]}"\t"{addresses_sample[j]}"\t"{years[j]}"\t'
+            f'"{months[j]:02d}"\t"{readings[j]:05d}"\t"{debts[j]}"\n'
         )
-        file.write(line)
+        if defect_rate and rng.random() < defect_rate:
+            line = inject_defect(rng, line, step, offset)
+        lines.append(line)
+    return ''.join(lines)
+
+
+def inject_defect(rng, line, step, offset):
+    """Портит строку одним из видов DEFECT_TYPES для проверки валидатора."""
+    defect = rng.choice(DEFECT_TYPES)
+    if defect == 'bad_char':
+        position = rng.randrange(1, len(line) - 1)
+        return line[:position] + '#' + line[position:]
+    if defect == 'field_count':
+        return line.rstrip('\n').rsplit('\t', 1)[0] + '\n'
+    if defect == 'short_line':
+        return line[:20] + '\n'
+    # duplicate: повторяем номер счёта первой строки файла
+    first_account = ACCOUNT_START + offset % ACCOUNT_RANGE
+    return f'"{first_account}"' + line[line.index('\t'):]
+
+
+def write_shard(args):
+    """Пишет в отдельный файл строки [start, end) (выполняется в процессе пула)."""
+    shard_path, start, end, seed, names, addresses, step, offset, encoding, defect_rate = args
+    with open(shard_path, 'w', encoding=encoding, newline='') as file:
+        for block_start in range(start, end, BATCH_SIZE):
+            count = min(BATCH_SIZE, end - block_start)
+            # Свой генератор на блок - результат не зависит от числа процессов
+            rng = random.Random(f"{seed}:{block_start}")
+            file.write(generate_block(rng, names, addresses, block_start, count, step, offset, defect_rate))
+    return shard_path
+
+
+def generate_file(filename, num_records, seed=0, encoding='utf-8', processes=None, defect_rate=0.0,
+                  header=True):
+    """Генерирует файл выгрузки num_records строк, распределяя работу по процессам.
+
+    Каждый процесс пишет свой фрагмент, затем фрагменты склеиваются по порядку.
+    Результат детерминирован для одинаковых seed и num_records при любом числе процессов.
+    """
+    processes = processes or os.cpu_count() or 1
+    names, addresses = build_pools(seed, encoding=encoding)
+    step, offset = account_permutation(seed)
+
+    shard_size = -(-num_records // processes)
+    shard_size = -(-shard_size // BATCH_SIZE) * BATCH_SIZE  # Границы фрагментов совпадают с границами блоков
+    tasks = []
+    for number, start in enumerate(range(0, num_records, shard_size)):
+        end = min(start + shard_size, num_records)
+        tasks.append((f"{filename}.part{number}", start, end, seed, names, addresses, step, offset,
+                      encoding, defect_rate))
+
+    try:
+        if len(tasks) > 1:
+            with Pool(len(tasks)) as pool:
+                shard_paths = pool.map(write_shard, tasks)
+        else:
+            shard_paths = [write_shard(task) for task in tasks]
+
+        with open(filename, 'wb') as output:
+            if header:
+                output.write(('\t'.join(f'"{title}"' for title in HEADER) + '\n').encode(encoding))
+            for shard_path in shard_paths:
+                with open(shard_path, 'rb') as shard:
+                    shutil.copyfileobj(shard, output)
+    finally:
+        for task in tasks:
+            if os.path.exists(task[0]):
+                os.remove(task[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генерация тестовых данных для загрузки в БД")
+    parser.add_argument("--rows", type=int, default=100000, help="Число строк данных")
+    parser.add_argument("--seed", type=int, default=0, help="Зерно генератора")
+    parser.add_argument("--encoding", choices=('utf-8', 'cp1251'), default='utf-8', help="Кодировка файла")
+    parser.add_argument("--processes", type=int, default=None, help="Число процессов (по умолчанию - число ядер)")
+    parser.add_argument("--defect-rate", type=float, default=0.0,
+                        help=f"Доля испорченных строк ({', '.join(DEFECT_TYPES)})")
+    parser.add_argument("--no-header", action="store_true", help="Не записывать строку заголовка")
+    parser.add_argument("--output", help="Имя файла (по умолчанию data_<rows>.tsv)")
+    args = parser.parse_args()
+
+    filename = args.output or f"data_{args.rows}.tsv"
+    start_time = time.time()
+    generate_file(filename, args.rows, args.seed, args.encoding, args.processes, args.defect_rate,
+                  not args.no_header)
+    print(f"Данные сохранены в файл {filename}. Время: {time.time() - start_time:.2f} сек.")
+
 
-print(f"Данные сохранены в файл {filename}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
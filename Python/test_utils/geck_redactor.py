@@ -1,63 +1,176 @@
+import argparse
+import json
+import os
 import random
-
-
-def generate_new_period_year():
-    return str(random.randint(2023, 2025))
-
-
-def generate_new_period_month():
-    return f"{random.randint(1, 3):02d}"
-
-
-def generate_new_meter_reading():
-    return ''.join([str(random.randint(0, 9)) for _ in range(7)])
-
-
-def generate_new_debt_in_kopecks():
-    return int(round(random.uniform(0, 10000) * 100))  # Сумма в копейках
-
-
-def modify_data(input_file):
-    # Чтение данных из файла
-    with open(input_file, mode="r", encoding="utf-8") as infile:
-        lines = infile.readlines()  # Читаем все строки
-
-    # Изменение данных
-    modified_lines = []
-    for line in lines:
-        # Разделяем строку по TAB
-        parts = line.strip().split("\t")
-
-        # Оставляем первые три поля (счет, ФИО, адрес) без изменений
-        account_number = parts[0]
-        full_name = parts[1]
-        address = parts[2]
-
-        # Генерируем новые значения для оставшихся полей
-        new_period_year = generate_new_period_year()
-        new_period_month = generate_new_period_month()
-        new_meter_reading = generate_new_meter_reading()
-        new_debt = generate_new_debt_in_kopecks()
-
-        # Формируем новую строку с кавычками вокруг каждого поля
-        new_line = (
-            f'"{account_number}"\t'
-            f'"{full_name}"\t'
-            f'"{address}"\t'
-            f'"{new_period_year}"\t'
-            f'"{new_period_month}"\t'
-            f'"{new_meter_reading}"\t'
-            f'"{new_debt}"\n'
-        )
-        modified_lines.append(new_line)
-
-    # Перезапись файла новыми данными
-    with open(input_file, mode="w", encoding="utf-8") as outfile:
-        outfile.writelines(modified_lines)
-
-    print(f"Данные изменены и сохранены в файл {input_file}")
-
-
-# Пример использования
-input_file = "data.tsv"  # Исходный файл
-modify_data(input_file)
\ No newline at end of file
+import shutil
+import time
+from multiprocessing import Pool
+
+WRITE_BATCH_LINES = 50_000  # Строк в одном блоке записи
+MIN_PARALLEL_SIZE = 64 * 1024 * 1024  # Файлы меньше обрабатываются в одном процессе
+
+# Правила изменения по умолчанию; переопределяются файлом --rules (JSON) и параметрами командной строки
+DEFAULT_RULES = {
+    "year_range": [2023, 2025],  # Новый период: год
+    "month_range": [1, 3],  # Новый период: месяц
+    "reading_digits": 7,  # Число цифр показания счетчика
+    "change_rate": 1.0,  # Доля изменяемых строк, остальные переносятся без изменений
+    "debt_mode": "uniform",  # uniform - заново в [0, debt_max]; drift - старый долг * (1 + N(0, debt_drift))
+    "debt_max": 1_000_000,  # Верхняя граница долга в копейках (uniform)
+    "debt_drift": 0.1,  # Относительное стандартное отклонение изменения долга (drift)
+    "debt_zero_rate": 0.0  # Доля изменяемых строк, долг по которым погашен полностью
+}
+DEBT_MODES = ('uniform', 'drift')
+
+
+def load_rules(rules_file=None, **overrides):
+    """Собирает правила изменения: значения по умолчанию, файл JSON, явные параметры."""
+    rules = dict(DEFAULT_RULES)
+    if rules_file:
+        with open(rules_file, 'r', encoding='utf-8') as f:
+            rules.update(json.load(f))
+    rules.update({key: value for key, value in overrides.items() if value is not None})
+
+    unknown = set(rules) - set(DEFAULT_RULES)
+    if unknown:
+        raise ValueError(f"Неизвестные правила: {', '.join(sorted(unknown))}")
+    if rules['debt_mode'] not in DEBT_MODES:
+        raise ValueError(f"Неизвестный способ изменения долга: {rules['debt_mode']}")
+    if not 0.0 <= rules['change_rate'] <= 1.0:
+        raise ValueError("Доля изменяемых строк должна быть от 0 до 1")
+    return rules
+
+
+def generate_new_debt_in_kopecks(rng, old_debt, rules):
+    if rules['debt_zero_rate'] and rng.random() < rules['debt_zero_rate']:
+        return 0
+    if rules['debt_mode'] == 'drift' and old_debt.isdigit():
+        return max(0, int(round(int(old_debt) * (1 + rng.gauss(0, rules['debt_drift'])))))
+    return rng.randint(0, rules['debt_max'])  # Сумма в копейках
+
+
+def modify_line(rng, line, rules):
+    """Возвращает строку с новым периодом, показанием и долгом (счет, ФИО и адрес не меняются).
+
+    Строки вне доли change_rate и строки не из семи полей возвращаются без изменений.
+    """
+    if rules['change_rate'] < 1.0 and rng.random() >= rules['change_rate']:
+        return line
+    parts = line.rstrip('\r\n').split('\t')
+    if len(parts) != 7:
+        return line
+
+    # Поля хранятся в кавычках: оставляем первые три как есть
+    account_number, full_name, address = parts[:3]
+    old_debt = parts[6].strip('"')
+    year = rng.randint(*rules['year_range'])
+    month = rng.randint(*rules['month_range'])
+    meter_reading = rng.randrange(10 ** rules['reading_digits'])
+    new_debt = generate_new_debt_in_kopecks(rng, old_debt, rules)
+    return (
+        f'{account_number}\t{full_name}\t{address}\t"{year}"\t"{month:02d}"\t'
+        f'"{meter_reading:0{rules["reading_digits"]}d}"\t"{new_debt}"\n'
+    )
+
+
+def split_line_ranges(input_file, parts):
+    """Делит файл на parts диапазонов байт, каждый начинается с начала строки."""
+    size = os.path.getsize(input_file)
+    bounds = [0]
+    with open(input_file, 'rb') as f:
+        for i in range(1, parts):
+            f.seek(max(size * i // parts, bounds[-1]))
+            f.readline()
+            position = f.tell()
+            if position >= size:
+                break
+            if position > bounds[-1]:
+                bounds.append(position)
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def redact_range(args):
+    """Обрабатывает строки диапазона [start, end) и пишет их в файл output_path."""
+    input_file, output_path, start, end, encoding, rules, seed = args
+    rng = random.Random(None if seed is None else f"{seed}:{start}")
+    lines = []
+    with open(input_file, 'rb') as infile, open(output_path, 'w', encoding=encoding, newline='') as outfile:
+        infile.seek(start)
+        position = start
+        while position < end:
+            raw_line = infile.readline()
+            if not raw_line:
+                break
+            line = raw_line.decode(encoding)
+            if position == 0 and not line.split('\t')[0].strip('"').isdigit():
+                lines.append(line)  # Заголовок переносится без изменений
+            else:
+                lines.append(modify_line(rng, line, rules))
+            position += len(raw_line)
+            if len(lines) >= WRITE_BATCH_LINES:
+                outfile.writelines(lines)
+                lines = []
+        outfile.writelines(lines)
+    return output_path
+
+
+def modify_data(input_file, rules=None, seed=None, processes=None, encoding='utf-8'):
+    """Потоково меняет период, показание и долг в файле выгрузки.
+
+    Результат пишется в соседний временный файл (при нескольких процессах - по фрагментам),
+    который затем атомарно заменяет исходный: при прерывании исходные данные не теряются.
+    """
+    rules = rules or load_rules()
+    processes = processes or os.cpu_count() or 1
+    if os.path.getsize(input_file) < MIN_PARALLEL_SIZE:
+        processes = 1
+    start_time = time.time()
+
+    tmp_file = f"{input_file}.tmp"
+    ranges = split_line_ranges(input_file, processes)
+    tasks = [(input_file, tmp_file if len(ranges) == 1 else f"{tmp_file}.part{number}", start, end,
+              encoding, rules, seed) for number, (start, end) in enumerate(ranges)]
+    try:
+        if len(tasks) > 1:
+            with Pool(len(tasks)) as pool:
+                part_paths = pool.map(redact_range, tasks)
+            with open(tmp_file, 'wb') as outfile:
+                for part_path in part_paths:
+                    with open(part_path, 'rb') as part:
+                        shutil.copyfileobj(part, outfile)
+        else:
+            redact_range(tasks[0])
+        os.replace(tmp_file, input_file)
+    finally:
+        for path in [task[1] for task in tasks] + [tmp_file]:
+            if os.path.exists(path):
+                os.remove(path)
+
+    print(f"Данные изменены и сохранены в файл {input_file}. Время: {time.time() - start_time:.2f} сек.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Изменение периода, показаний и долга в тестовых данных")
+    parser.add_argument("input_file", nargs='?', default="data.tsv", help="Файл выгрузки (изменяется на месте)")
+    parser.add_argument("--rules", help="Файл JSON с правилами изменения")
+    parser.add_argument("--year-range", type=int, nargs=2, metavar=('FROM', 'TO'), help="Диапазон года")
+    parser.add_argument("--month-range", type=int, nargs=2, metavar=('FROM', 'TO'), help="Диапазон месяца")
+    parser.add_argument("--change-rate", type=float, help="Доля изменяемых строк (0..1)")
+    parser.add_argument("--debt-mode", choices=DEBT_MODES, help="Способ изменения долга")
+    parser.add_argument("--debt-max", type=int, help="Верхняя граница долга в копейках (uniform)")
+    parser.add_argument("--debt-drift", type=float, help="Относительное отклонение долга (drift)")
+    parser.add_argument("--debt-zero-rate", type=float, help="Доля строк с погашенным долгом")
+    parser.add_argument("--seed", type=int, help="Зерно генератора")
+    parser.add_argument("--processes", type=int, help="Число процессов (по умолчанию - число ядер)")
+    parser.add_argument("--encoding", choices=('utf-8', 'cp1251'), default='utf-8', help="Кодировка файла")
+    args = parser.parse_args()
+
+    rules = load_rules(args.rules, year_range=args.year_range, month_range=args.month_range,
+                       change_rate=args.change_rate, debt_mode=args.debt_mode, debt_max=args.debt_max,
+                       debt_drift=args.debt_drift, debt_zero_rate=args.debt_zero_rate)
+    modify_data(args.input_file, rules, args.seed, args.processes, args.encoding)
+
+
+if __name__ == "__main__":
+    main()